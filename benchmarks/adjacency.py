@@ -0,0 +1,71 @@
+import sys
+import time
+import argparse
+
+from src.model import SPQRisiko
+
+""" Cost of the neighbour queries and of a whole step of the game.
+
+    python -m benchmarks.adjacency --games 20 --turns 30
+
+The first part compares a full pass over the neighbours of every area through NetworkGrid
+(the way the model used to look them up) with the same pass on the AdjacencyIndex; the
+second one is the average time of SPQRisiko.step. Run it before and after a change to
+compare the per-step time """
+
+
+def time_neighbor_lookups(model, repeat: int):
+    grid, adjacency, areas = model.grid, model.adjacency, model.areas
+    nodes = range(len(areas))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for node in nodes:
+            for neighbor in grid.get_neighbors(node):
+                grid.get_cell_list_contents([neighbor])[0]
+    networkx_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for node in nodes:
+            for neighbor in adjacency.neighbors[node]:
+                areas[neighbor]
+    index_time = time.perf_counter() - start
+
+    return networkx_time / repeat, index_time / repeat
+
+
+def time_steps(games: int, turns: int, n_players: int):
+    # Average seconds per step over some games
+    steps, elapsed = 0, 0.0
+    for seed in range(games):
+        model = SPQRisiko(n_players, 50, "Random", "Random", seed=seed)
+        for _ in range(turns):
+            start = time.perf_counter()
+            finished = model.step()
+            elapsed += time.perf_counter() - start
+            steps += 1
+            if finished:
+                break
+    return elapsed / steps, steps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the neighbour queries and the steps of the model")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    model = SPQRisiko(args.players, 50, "Random", "Random", seed=0)
+    networkx_time, index_time = time_neighbor_lookups(model, args.repeat)
+    print("neighbours of every area: networkx {:.1f} us, adjacency index {:.1f} us ({:.1f}x)".format(
+        networkx_time * 1e6, index_time * 1e6, networkx_time / index_time))
+
+    per_step, steps = time_steps(args.games, args.turns, args.players)
+    print("step: {:.2f} ms on average over {} steps".format(per_step * 1e3, steps))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import sys
+import time
+import argparse
+
+from src.model import SPQRisiko
+
+""" Cost of creating a model.
+
+    python -m benchmarks.construction --models 200
+
+The first model of the process also pays for reading the configuration files and for
+the tables shared by every model, so it is timed apart from the average of the others,
+which is what every run of a sweep costs """
+
+
+def time_construction(models: int, n_players: int):
+    # Seconds for the first model and on average for the next ones
+    start = time.perf_counter()
+    SPQRisiko(n_players, 50, "Random", "Random", seed=0)
+    first = time.perf_counter() - start
+
+    elapsed = 0.0
+    for seed in range(1, models + 1):
+        start = time.perf_counter()
+        SPQRisiko(n_players, 50, "Random", "Random", seed=seed)
+        elapsed += time.perf_counter() - start
+    return first, elapsed / models
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the creation of the model")
+    parser.add_argument("--models", type=int, default=200)
+    parser.add_argument("--players", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    first, per_model = time_construction(args.models, args.players)
+    print("first model: {:.2f} ms".format(first * 1e3))
+    print("model: {:.3f} ms on average over {} models".format(per_model * 1e3, args.models))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import sys
+import time
+import argparse
+
+from src.model import SPQRisiko
+from src.rollout import Lookahead
+
+""" Throughput of the rollouts of the lookahead players.
+
+    python -m benchmarks.rollout --games 5 --turns 5 --rollouts 32
+
+Plays some turns of greedy games, then times the choices of the lookahead (where to put
+the reinforcements and how much to attack) of every player from those positions, and
+prints the rollouts played per second """
+
+
+def time_rollouts(games: int, turns: int, n_players: int, rollouts: int, rollout_turns: int):
+    lookahead = Lookahead(rollouts, rollout_turns)
+    elapsed = 0.0
+    for seed in range(games):
+        model = SPQRisiko(n_players, 50, "Random", "Random", seed=seed)
+        for _ in range(turns):
+            model.step()
+        for player in model.players:
+            if player.eliminated:
+                continue
+            start = time.perf_counter()
+            lookahead.put_reinforces(model, player, 3)
+            lookahead.choose_aggressivity(model, player, False)
+            elapsed += time.perf_counter() - start
+    return lookahead.n_rollouts, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the rollouts of the lookahead players")
+    parser.add_argument("--games", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--rollouts", type=int, default=32)
+    parser.add_argument("--rollout-turns", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    n_rollouts, elapsed = time_rollouts(args.games, args.turns, args.players, args.rollouts, args.rollout_turns)
+    print("rollouts: {} in {:.2f} s, {:.0f} per second".format(n_rollouts, elapsed, n_rollouts / elapsed))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
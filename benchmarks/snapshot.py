@@ -0,0 +1,43 @@
+import sys
+import copy
+import time
+import argparse
+
+from src.model import SPQRisiko
+
+""" Cost of forking a game in the middle.
+
+    python -m benchmarks.snapshot --turns 5 --repeat 2000
+
+Times SPQRisiko.snapshot, restore and clone on a game after some turns, next to
+copy.deepcopy of the same model (the only way to fork a game before snapshot.py) """
+
+
+def time_call(f, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter() - start) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark snapshot, restore and clone of the model")
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    model = SPQRisiko(args.players, 50, "Random", "Random", seed=0)
+    for _ in range(args.turns):
+        model.step()
+    snapshot = model.snapshot()
+
+    print("snapshot: {:.1f} us".format(time_call(model.snapshot, args.repeat) * 1e6))
+    print("restore: {:.1f} us".format(time_call(lambda: model.restore(snapshot), args.repeat) * 1e6))
+    print("clone: {:.1f} us".format(time_call(model.clone, args.repeat) * 1e6))
+    repeat = max(1, args.repeat // 100)
+    print("deepcopy: {:.1f} us".format(time_call(lambda: copy.deepcopy(model), repeat) * 1e6))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
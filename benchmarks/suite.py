@@ -0,0 +1,278 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import statistics
+import subprocess
+import tracemalloc
+import collections
+import numpy
+
+from src import markov, strategies
+from src.model import SPQRisiko
+from src.cards import load_cards
+from src.tris import TrisTable
+
+""" Benchmark suite of the hot paths of the model, on fixed seeds.
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --output after.json --compare before.json --threshold 0.1
+
+Every scenario builds its position from a fixed seed and is then run `repeat` times, set
+back to the same position before every run (out of the timings). For every scenario the
+results file has the median and the minimum wall time of the runs, and from one more run
+under tracemalloc its peak memory and the memory (bytes and blocks) still allocated at the
+end of it. With --compare, the scenarios whose median time or peak memory grew more than
+the threshold over those of the other results file are reported as regressions, and the
+exit status is 1. Scenarios that can't be set up here (the server needs the mesa of the
+visualization) are recorded as skipped """
+
+RESULTS_VERSION = 1
+# Default results file, in the directory of the results (not tracked)
+RESULTS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'results', 'benchmark_results.json'))
+SEED = 0
+N_PLAYERS = 4
+# High enough that no game of the scenarios ends before its late turns
+POINTS_LIMIT = 150
+TURNS = {"early": 0, "mid": 10, "late": 20}
+
+# setup() returns the function to time and the one setting the position back (or None)
+Scenario = collections.namedtuple("Scenario", ["name", "setup", "repeat"])
+
+
+def new_game(turns: int = 0):
+    model = SPQRisiko(N_PLAYERS, POINTS_LIMIT, "Random", "Random", seed=SEED)
+    for _ in range(turns):
+        model.step()
+    return model
+
+
+def setup_init():
+    def run():
+        SPQRisiko(N_PLAYERS, POINTS_LIMIT, "Random", "Random", seed=SEED)
+    return run, None
+
+
+def setup_step(turns: int):
+    def setup():
+        model = new_game(turns)
+        snapshot = model.snapshot()
+        return model.step, lambda: model.restore(snapshot)
+    return setup
+
+
+def battle(model):
+    # The first ground area of player 0 with a neighbour of another owner, and that neighbour,
+    # with armies enough for a long battle that the attacker is likely to win
+    player = model.players[0]
+    for area in model.get_territories_by_player(player):
+        for neighbor in model.adjacency.ground_neighbors[area.unique_id]:
+            defender = model.ground_areas[neighbor]
+            if defender.owner is not player:
+                area.armies, defender.armies = 40, 15
+                return player, area, defender
+    raise RuntimeError("player 0 has no neighbour to attack")
+
+
+def setup_combact(name: str, by_sea: bool = False):
+    def setup():
+        model = new_game()
+        player, attacker, defender = battle(model)
+        model.fast_combact = name.startswith("fast")
+        combact = getattr(player, name)
+        if by_sea:
+            kwargs = {"by_sea": True} if model.fast_combact else {}
+        else:
+            kwargs = {"aggressivity": player.get_aggressivity()}
+        snapshot = model.snapshot()
+
+        def run():
+            combact(attacker, defender, attacker.armies - 1, **kwargs)
+        return run, lambda: model.restore(snapshot)
+    return setup
+
+
+def setup_naval_combact(name: str):
+    def setup():
+        model = new_game()
+        player = model.players[0]
+        sea_area = model.sea_areas[0]
+        sea_area.trireme[0], sea_area.trireme[1] = 30, 20
+        model.fast_combact = name.startswith("fast")
+        combact = getattr(player, name)
+        snapshot = model.snapshot()
+
+        def run():
+            combact(sea_area, 1, sea_area.trireme[0], 0.0)
+        return run, lambda: model.restore(snapshot)
+    return setup
+
+
+def setup_tris_table():
+    cards = load_cards()
+    goals = {goal: {"tris": list(value["tris"])} for goal, value in strategies.strategies.items()}
+    return lambda: TrisTable(cards, goals), None
+
+
+def setup_markov(f, size: int):
+    def setup():
+        return lambda: f(size, size, "sparse"), None
+    return setup
+
+
+def setup_battle_outcomes(size: int):
+    def setup():
+        return lambda: markov.BattleOutcomes(size, size), None
+    return setup
+
+
+def setup_network_portrayal():
+    from src.server import network_portrayal
+    model = new_game(TURNS["mid"])
+    G = model.G
+    return lambda: network_portrayal(G), None
+
+
+SCENARIOS = [
+    Scenario("init", setup_init, 50),
+    *(Scenario("step_" + phase, setup_step(turns), 20) for phase, turns in TURNS.items()),
+    Scenario("combact", setup_combact("combact"), 50),
+    Scenario("combact_by_sea", setup_combact("combact_by_sea", by_sea=True), 50),
+    Scenario("naval_combact", setup_naval_combact("naval_combact"), 50),
+    Scenario("fast_combact", setup_combact("fast_combact"), 200),
+    Scenario("fast_combact_by_sea", setup_combact("fast_combact", by_sea=True), 200),
+    Scenario("fast_naval_combact", setup_naval_combact("fast_naval_combact"), 200),
+    Scenario("tris_table", setup_tris_table, 50),
+    *(Scenario("markov_ground_{}".format(size), setup_markov(markov.get_probabilities_ground_combact, size), 5)
+      for size in (10, 50, 150)),
+    *(Scenario("markov_by_sea_{}".format(size), setup_markov(markov.get_probabilities_combact_by_sea, size), 5)
+      for size in (10, 50, 150)),
+    Scenario("battle_outcomes_40", setup_battle_outcomes(40), 5),
+    Scenario("network_portrayal", setup_network_portrayal, 50),
+]
+
+
+def measure(run, reset, repeat: int):
+    # Wall times of repeat runs, then one run under tracemalloc
+    if reset is not None:
+        reset()
+    run()  # warm up caches (tables of the odds, outcomes...)
+    times = []
+    for _ in range(repeat):
+        if reset is not None:
+            reset()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    if reset is not None:
+        reset()
+    tracemalloc.start()
+    try:
+        run()
+        allocated, peak = tracemalloc.get_traced_memory()
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    finally:
+        tracemalloc.stop()
+    return {
+        "repeat": repeat,
+        "time_median": statistics.median(times),
+        "time_min": min(times),
+        "peak_bytes": peak,
+        "allocated_bytes": allocated,
+        "allocated_blocks": blocks
+    }
+
+
+def run_suite(scenarios: list, scale: float = 1.0):
+    results = {}
+    for scenario in scenarios:
+        try:
+            run, reset = scenario.setup()
+        except Exception as e:
+            results[scenario.name] = {"skipped": "{}: {}".format(type(e).__name__, e)}
+            print("{:<24} skipped ({})".format(scenario.name, results[scenario.name]["skipped"]))
+            continue
+        result = measure(run, reset, max(1, int(scenario.repeat * scale)))
+        results[scenario.name] = result
+        print("{:<24} {:>10.3f} ms {:>10.1f} KiB peak".format(
+            scenario.name, result["time_median"] * 1e3, result["peak_bytes"] / 1024))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path: str, results: dict):
+    document = {
+        "version": RESULTS_VERSION,
+        "commit": git_commit(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "machine": platform.machine(),
+        "scenarios": results
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    # Lines of the report and names of the regressed scenarios
+    lines, regressions = [], []
+    lines.append("{:<24} {:>12} {:>12} {:>8} {:>8}".format("scenario", "base ms", "ms", "time", "peak"))
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or "skipped" in base or "skipped" in result:
+            lines.append("{:<24} {:>12} {:>12}".format(name, "-" if base is None or "skipped" in base else "",
+                                                       "skipped" if "skipped" in result else ""))
+            continue
+        time_ratio = result["time_median"] / base["time_median"]
+        peak_ratio = result["peak_bytes"] / base["peak_bytes"] if base["peak_bytes"] else 1.0
+        regressed = time_ratio > 1 + threshold or peak_ratio > 1 + threshold
+        if regressed:
+            regressions.append(name)
+        lines.append("{:<24} {:>12.3f} {:>12.3f} {:>7.2f}x {:>7.2f}x{}".format(
+            name, base["time_median"] * 1e3, result["time_median"] * 1e3, time_ratio, peak_ratio,
+            "  REGRESSION" if regressed else ""))
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of the model on fixed seeds")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--compare", help="results file of another commit to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative growth of time or peak memory reported as a regression")
+    parser.add_argument("--only", nargs="+", help="run only the scenarios whose name starts with one of these")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the repetitions of every scenario")
+    args = parser.parse_args(argv)
+
+    scenarios = SCENARIOS
+    if args.only:
+        scenarios = [s for s in SCENARIOS if any(s.name.startswith(prefix) for prefix in args.only)]
+    results = run_suite(scenarios, args.scale)
+    write_results(args.output, results)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(results, baseline["scenarios"], args.threshold)
+        print("\ncompared with {} ({})".format(args.compare, baseline.get("commit")))
+        print("\n".join(lines))
+        if regressions:
+            print("{} regression(s) over {:.0%}: {}".format(len(regressions), args.threshold, ", ".join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
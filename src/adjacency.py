@@ -0,0 +1,50 @@
+import numpy
+
+""" Adjacency of the map in CSR form, built once per map and shared by every model:
+the neighbours of node i are indices[indptr[i]:indptr[i + 1]], in the same order of
+networkx (the order of the edges in territories.json). The neighbours are also split into
+ground and sea neighbours, both as CSR arrays (for whole-board numpy queries) and as
+tuples (for the loops of the strategies, where a tuple is faster than a slice).
+The map never changes during a game, so the arrays are read-only """
+
+
+def to_csr(rows):
+    indptr = numpy.zeros(len(rows) + 1, dtype=numpy.int64)
+    indptr[1:] = numpy.cumsum([len(row) for row in rows])
+    indices = numpy.fromiter((n for row in rows for n in row), dtype=numpy.int64, count=indptr[-1])
+    indptr.setflags(write=False)
+    indices.setflags(write=False)
+    return indptr, indices
+
+
+class AdjacencyIndex(object):
+
+    def __init__(self, neighbors: list, ground_nodes):
+        # neighbors: list of neighbours of every node, ground_nodes: ids of the ground areas
+        self.n_nodes = len(neighbors)
+        self.is_ground = numpy.zeros(self.n_nodes, dtype=bool)
+        self.is_ground[list(ground_nodes)] = True
+        self.is_ground.setflags(write=False)
+
+        self.neighbors = tuple(tuple(row) for row in neighbors)
+        self.ground_neighbors = tuple(tuple(n for n in row if self.is_ground[n]) for row in self.neighbors)
+        self.sea_neighbors = tuple(tuple(n for n in row if not self.is_ground[n]) for row in self.neighbors)
+
+        self.indptr, self.indices = to_csr(self.neighbors)
+        self.ground_indptr, self.ground_indices = to_csr(self.ground_neighbors)
+        self.sea_indptr, self.sea_indices = to_csr(self.sea_neighbors)
+
+    @classmethod
+    def from_graph(cls, graph, ground_nodes):
+        # Nodes must be 0, ..., n - 1
+        return cls([list(graph.neighbors(node)) for node in range(graph.number_of_nodes())], ground_nodes)
+
+
+_indexes = {}
+
+def get_adjacency_index(graph, ground_nodes):
+    # One index per map, shared by every model
+    key = (tuple(graph.edges), tuple(sorted(ground_nodes)))
+    if key not in _indexes:
+        _indexes[key] = AdjacencyIndex.from_graph(graph, ground_nodes)
+    return _indexes[key]
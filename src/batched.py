@@ -0,0 +1,717 @@
+import sys
+import time
+import argparse
+import collections
+import numpy
+
+from . import constants, strategies, registry
+from .cards import load_cards, full_deck
+from .tris import get_tris_table
+from .odds import get_combat_odds, GROUND, BY_SEA, NAVAL
+from .markov import get_battle_outcomes
+
+""" K games played in lockstep on arrays: owner[K, 45], armies[K, 45], power_place[K, 45],
+trireme[K, 12, P], victory points, cards, deck and trash of every game. Every turn the
+players play in order as in SPQRisiko.step, and every phase of the turn of a player is
+played in all the games at once: scores (empires by label propagation on the ground
+edges), reinforcements and tris, naval combacts, attacks by sea and ground attacks (one
+battle per game at every round, until no game has an attack left), eliminations, moves
+and cards. Games are retired from the arrays as soon as somebody wins.
+
+The rules and the choices of the players are those of SPQRisiko and Player (the greedy
+strategies), with these differences:
+- battles always end in a state drawn from the absorption distribution of the battle, as
+  with SPQRisiko(fast_combact=True), instead of rolling the dice one round at a time
+  (the end states have the same distribution);
+- the random draws (shuffle of the map, random areas, cards) come from a numpy generator
+  for the whole batch, so a game can't be replayed on its own with SPQRisiko;
+- there is no lookahead (rollouts) player, no journal, no events and no DataCollector:
+  results are the winner, its strategy and goal and the turn of every game.
+Ties between areas are broken as the reference does (lowest id, first neighbour, order of
+discovery of the attacks), so the two engines only differ in their random numbers.
+
+    python -m src.batched --games 1000 --n-players 3 --points-limit 50 --reference 200
+
+also plays some games with SPQRisiko and prints the statistics of both """
+
+STRATEGIES = ["Aggressive", "Passive", "Neutral"]
+GOALS = ["BE", "LA", "PP"]
+# Larger than any number of armies, to take minimums over masked arrays
+BIG = 1 << 40
+
+
+class BatchMap(object):
+
+    # The map as arrays, shared by every batch
+    def __init__(self, map_config):
+        adjacency = map_config.adjacency
+        territories = map_config.territories_dict["territories"]
+        self.n_ground = len(map_config.ground_nodes)
+        self.sea_nodes = list(map_config.sea_nodes)
+        n_ground = self.n_ground
+        ground_neighbors = [list(adjacency.ground_neighbors[node]) for node in range(n_ground)]
+        # Ground neighbours of every ground area, padded with the area itself
+        degree = max(len(neighbors) for neighbors in ground_neighbors)
+        self.neighbors = numpy.array(
+            [neighbors + [node] * (degree - len(neighbors)) for node, neighbors in enumerate(ground_neighbors)])
+        self.neighbor_mask = numpy.array(
+            [[i < len(neighbors) for i in range(degree)] for neighbors in ground_neighbors])
+        # Directed ground edges in the order of AttackFrontier: attacker, position of the defender
+        self.attackers = numpy.array([node for node in range(n_ground) for _ in ground_neighbors[node]])
+        self.defenders = numpy.array([neighbor for node in range(n_ground) for neighbor in ground_neighbors[node]])
+        # Attacks by sea (attacker, sea area, defender) in the order of get_attackable_ground_areas_by_sea
+        by_sea = [
+            (node, self.sea_nodes.index(sea), neighbor)
+            for node in range(n_ground)
+            for sea in adjacency.sea_neighbors[node]
+            for neighbor in adjacency.ground_neighbors[sea]
+            if neighbor != node]
+        self.sea_attackers, self.sea_areas, self.sea_defenders = (numpy.array(column) for column in zip(*by_sea))
+        # Ground areas on the coast of every sea area
+        self.coast = numpy.zeros((len(self.sea_nodes), n_ground), dtype=numpy.int64)
+        for s, sea in enumerate(self.sea_nodes):
+            self.coast[s, list(adjacency.ground_neighbors[sea])] = 1
+        self.isle = numpy.array([t["type"] != "ground" for t in territories])
+        self.nearest_rank = self.get_nearest_ranks(adjacency.neighbors, ~self.isle)
+
+    def get_nearest_ranks(self, neighbors, ground_type):
+        # Order in which SPQRisiko.find_nearest, starting from every ground area, finds the
+        # ground areas (isles excluded), BIG for those it doesn't reach
+        n_ground = self.n_ground
+        ranks = numpy.full((n_ground, n_ground), BIG, dtype=numpy.int64)
+        for source in range(n_ground):
+            found = [False] * len(neighbors)
+            found[source] = True
+            distances = [0] * len(neighbors)
+            visited = [source]
+            order = 0
+            while visited:
+                t = visited.pop(0)
+                if distances[t] > 4:
+                    break
+                for neighbor in neighbors[t]:
+                    if not found[neighbor]:
+                        found[neighbor] = True
+                        distances[neighbor] = distances[t] + 1
+                        visited.append(neighbor)
+                        if neighbor < n_ground and ground_type[neighbor]:
+                            ranks[source, neighbor] = order
+                        order += 1
+        return ranks
+
+
+_maps = {}
+
+def get_batch_map(path: str = registry.MAP_PATH):
+    map_config = registry.get_map(path)
+    if map_config not in _maps:
+        _maps[map_config] = BatchMap(map_config)
+    return _maps[map_config]
+
+
+def single_max(values):
+    # Column of the maximum of every row if only that column has it, -1 otherwise
+    is_max = values == values.max(axis=1)[:, None]
+    return numpy.where(is_max.sum(axis=1) == 1, is_max.argmax(axis=1), -1)
+
+
+def spread(amount, n):
+    # Armies given to the n areas of a sorted list by the "Passive" loops of put_reinforces,
+    # for every position (columns) of every game (rows)
+    positions = numpy.arange(n.max() if len(n) else 0)[None, :]
+    n = numpy.maximum(n, 1)[:, None]
+    amount = amount[:, None]
+    per = numpy.maximum(amount // n, 1)
+    rounds = amount // per
+    rest = amount - rounds * per
+    given = per * (rounds // n + (positions < rounds % n)) + rest * (positions == rounds % n)
+    return numpy.where(positions < n, given, 0)
+
+
+def first_per_game(games, score):
+    # Index of the candidate with the highest score of every game, the first one on ties.
+    # games: game of every candidate, by increasing game
+    order = numpy.lexsort((-score, games))
+    first = numpy.ones(len(order), dtype=bool)
+    first[1:] = games[order[1:]] != games[order[:-1]]
+    return order[first]
+
+
+class BatchedGames(object):
+
+    def __init__(self, n_games: int, n_players: int, points_limit: int, strategy: str, goal: str, seed=None):
+        self.map = get_batch_map()
+        self.odds = get_combat_odds()
+        self.rng = numpy.random.default_rng(seed)
+        self.n_players = n_players if n_players <= constants.MAX_PLAYERS else constants.MAX_PLAYERS
+        self.n_computers = constants.MAX_PLAYERS - self.n_players
+        self.points_limit = points_limit
+        P = self.n_players
+        # Strategy and goal of every player, as in SPQRisiko
+        self.strategies = [STRATEGIES[i % 3] if strategy == "Random" else strategy for i in range(P)]
+        self.goals = [GOALS[i % 3] if goal == "Random" else goal for i in range(P)]
+        self.cards = load_cards()
+        self.tris_table = get_tris_table()
+        self.current_turn = 0
+
+        K, n_ground = n_games, self.map.n_ground
+        # Original index of every game in the arrays
+        self.ids = numpy.arange(K)
+        self.owner = numpy.zeros((K, n_ground), dtype=numpy.int64)
+        self.armies = numpy.zeros((K, n_ground), dtype=numpy.int64)
+        self.power_place = numpy.zeros((K, n_ground), dtype=bool)
+        self.trireme = numpy.zeros((K, len(self.map.sea_nodes), P), dtype=numpy.int64)
+        self.victory_points = numpy.zeros((K, P), dtype=numpy.int64)
+        self.eliminated = numpy.zeros((K, P), dtype=bool)
+        self.hands = numpy.zeros((K, P, len(self.cards)), dtype=numpy.int64)
+        self.deck = numpy.tile(full_deck(self.cards), (K, 1))
+        self.trash = numpy.zeros((K, len(self.cards)), dtype=numpy.int64)
+        # Results by original index: winner (-1 if nobody) and turn
+        self.winners = numpy.full(K, -1, dtype=numpy.int64)
+        self.turns = numpy.zeros(K, dtype=numpy.int64)
+        self.setup()
+
+    def setup(self):
+        # Areas dealt as in SPQRisiko.__init__, on a different shuffle in every game
+        K, P = len(self.ids), self.n_players
+        nodes = numpy.arange(self.map.n_ground)
+        if P == 4:
+            # Italia is owned by the only computer player
+            nodes = nodes[nodes != 15]
+            self.owner[:, 15] = P
+            self.armies[:, 15] = 3
+        order = nodes[self.rng.random((K, len(nodes))).argsort(axis=1)]
+        i = numpy.arange(len(nodes))
+        players = i < 9 * P
+        owners = numpy.where(players, i % P, P + i % max(self.n_computers, 1))
+        rows = numpy.arange(K)[:, None]
+        self.owner[rows, order] = owners
+        self.armies[rows, order] = numpy.where(players, 2, 3)
+
+    def retire(self, finished):
+        # Drop the finished games from the arrays
+        keep = ~finished
+        for name in ("ids", "owner", "armies", "power_place", "trireme", "victory_points",
+                     "eliminated", "hands", "deck", "trash"):
+            setattr(self, name, getattr(self, name)[keep])
+
+    def run(self, max_steps: int = 1000):
+        while len(self.ids) > 0 and self.current_turn < max_steps:
+            self.step()
+        self.turns[self.ids] = self.current_turn
+        return self
+
+    def step(self):
+        self.current_turn += 1
+        for player in range(self.n_players):
+            if len(self.ids) == 0:
+                return
+            self.play_turn(player)
+
+    def play_turn(self, player: int):
+        # 1) Scores, and the games that player wins
+        empires, territories, labels, sizes = self.scores()
+        playing = ~self.eliminated[:, player]
+        self.victory_points[:, player] += playing * self.scoring_points(player, empires, territories)
+        won = playing & (self.victory_points[:, player] >= self.points_limit)
+        if won.any():
+            self.winners[self.ids[won]] = player
+            self.turns[self.ids[won]] = self.current_turn
+            self.retire(won)
+            playing, labels, sizes = playing[~won], labels[~won], sizes[~won]
+            territories = territories[~won]
+            if len(self.ids) == 0:
+                return
+        # 2) Reinforcements
+        n_territories = territories[:, player]
+        reinforces = numpy.where(n_territories > 11, n_territories // 3, numpy.where(n_territories >= 3, 3, 1))
+        self.put_legionaries(player, reinforces * playing, labels, sizes)
+        self.play_tris(player, playing, labels, sizes)
+        # 4) Naval combact
+        self.naval_combact(player, playing)
+        # 5) Attacks by sea
+        conquered = self.combact_by_sea(player, playing)
+        # 6) Ground attacks
+        conquered |= self.ground_combact(player, playing)
+        # Eliminations, moves and cards
+        self.eliminate(player, playing)
+        if self.goals[player] == "PP":
+            self.move_to_power_place(player, playing)
+        self.draw_cards(player, playing & conquered)
+
+    def scores(self):
+        # Largest empire, ground areas and power places of every player, sea areas are in
+        # sea_areas. Also the component of every area (the lowest area in it) and its size
+        K, P, n_ground = len(self.ids), self.n_players, self.map.n_ground
+        owner = self.owner
+        offsets = (numpy.arange(K) * constants.MAX_PLAYERS)[:, None]
+        territories = numpy.bincount((owner + offsets).ravel(), minlength=K * constants.MAX_PLAYERS)
+        territories = territories.reshape(K, constants.MAX_PLAYERS)[:, :P]
+
+        # Labels spread along the edges between areas of the same owner (a neighbour of another
+        # owner is replaced by the area itself), with pointer jumping, in flat indices
+        nodes = numpy.arange(n_ground)
+        offsets = (numpy.arange(K) * n_ground)[:, None]
+        same = [numpy.where(owner[:, column] == owner, column, nodes) + offsets for column in self.map.neighbors.T]
+        labels = numpy.arange(K * n_ground).reshape(K, n_ground)
+        while True:
+            flat = labels.ravel()
+            new = flat[same[0]]
+            for column in same[1:]:
+                numpy.minimum(new, flat[column], out=new)
+            new = new.ravel()[new]
+            if numpy.array_equal(new, labels):
+                break
+            labels = new
+        sizes = numpy.bincount(labels.ravel(), minlength=K * n_ground)[labels]
+        labels = labels - offsets
+        empires = numpy.stack([numpy.where(owner == p, sizes, 0).max(axis=1) for p in range(P)], axis=1)
+        return empires, territories, labels, sizes
+
+    def sea_areas(self):
+        # Sea areas in which every player has more trireme than anyone else, by player
+        majority = single_max(self.trireme.reshape(-1, self.n_players)).reshape(self.trireme.shape[:2])
+        return numpy.stack([(majority == p).sum(axis=1) for p in range(self.n_players)], axis=1)
+
+    def scoring_points(self, player: int, empires, territories):
+        # Victory points of Player.update_victory_points
+        power_places = (self.power_place & (self.owner == player)).sum(axis=1)
+        points = power_places
+        points += (empires.max(axis=1) >= 4) & (single_max(empires) == player)
+        points += single_max(territories) == player
+        points += single_max(self.sea_areas()) == player
+        return points
+
+    def attackable(self, player: int):
+        # Areas of player with a ground neighbour that is not of player (the neighbours are
+        # padded with the area itself)
+        owner = self.owner
+        adversary = owner[:, self.map.neighbors[:, 0]] != player
+        for column in self.map.neighbors.T[1:]:
+            adversary |= owner[:, column] != player
+        return adversary
+
+    def choose(self, mask):
+        # A random area among those of mask in every game (uniform, as random.randint on a list)
+        n = mask.sum(axis=1)
+        r = numpy.floor(self.rng.random(len(n)) * n).astype(numpy.int64)
+        return (numpy.cumsum(mask, axis=1) > r[:, None]).argmax(axis=1)
+
+    def sorted_areas(self, mask):
+        # Areas of mask by increasing armies (then id) in every game, and how many they are
+        key = numpy.where(mask, self.armies * 64 + numpy.arange(mask.shape[1]), BIG)
+        return key.argsort(axis=1, kind="stable"), mask.sum(axis=1)
+
+    def put_on_sorted(self, rows, order, n, amount, strategy: str, pick=None):
+        # Armies on the areas of order (sorted by armies) as put_reinforces does by strategy:
+        # all on the strongest (Aggressive, or pick), all on the weakest (Neutral) or spread (Passive)
+        has = (n > 0) & (amount > 0)
+        rows, order, n, amount = rows[has], order[has], n[has], amount[has]
+        if len(rows) == 0:
+            return
+        if strategy == "Passive":
+            given = spread(amount, n)
+            self.armies[rows[:, None], order[:, :given.shape[1]]] += given
+            return
+        if strategy == "Aggressive":
+            position = n - 1 if pick is None else pick[has]
+        else:
+            position = numpy.zeros(len(rows), dtype=numpy.int64)
+        self.armies[rows, order[numpy.arange(len(rows)), position]] += amount
+
+    def put_legionaries(self, player: int, amount, labels, sizes):
+        # Player.put_reinforces of legionaries, in every game
+        goal, strategy = self.goals[player], self.strategies[player]
+        K = len(self.ids)
+        rows = numpy.arange(K)
+        own = self.owner == player
+        amount = numpy.where(own.any(axis=1), amount, 0)
+        if goal == "PP":
+            own_power_places = own & self.power_place
+            has_power_place = own_power_places.any(axis=1)
+            weakest = numpy.where(own_power_places, self.armies, BIG).argmin(axis=1)
+            on_weakest = numpy.round(numpy.maximum(
+                strategies.strategies["PP"]["armies_on_weakest_power_place"] * amount, 1)).astype(numpy.int64)
+            on_weakest = numpy.where(has_power_place & (amount > 0), on_weakest, 0)
+            self.armies[rows, weakest] += on_weakest
+            amount = amount - on_weakest
+            adversary_power_places = ~own & self.power_place
+            has_adversary = adversary_power_places.any(axis=1)
+            weakest_adversary = numpy.where(adversary_power_places, self.armies, BIG).argmin(axis=1)
+            # No adversary's power place: on the weakest power place, or on a random area
+            on_own = ~has_adversary & has_power_place
+            self.armies[rows[on_own], weakest[on_own]] += amount[on_own]
+            at_random = ~has_adversary & ~has_power_place & (amount > 0)
+            if at_random.any():
+                self.armies[rows[at_random], self.choose(own[at_random])] += amount[at_random]
+            # Otherwise on the area nearest to the weakest adversary's power place (if near enough)
+            ranks = numpy.where(own, self.map.nearest_rank[weakest_adversary], BIG)
+            nearest = ranks.argmin(axis=1)
+            near = has_adversary & (ranks[rows, nearest] < BIG)
+            self.armies[rows[near], nearest[near]] += amount[near]
+        elif goal == "LA":
+            order, n = self.sorted_areas(own)
+            pick = None
+            if strategy == "Aggressive":
+                # The strongest area that can be attacked, looking down to the second weakest one
+                attackable = self.attackable(player)[rows[:, None], order]
+                positions = numpy.arange(order.shape[1])[None, :]
+                candidates = attackable & (positions >= 2) & (positions < n[:, None])
+                pick = numpy.where(candidates, positions, -1).max(axis=1)
+                pick = numpy.where(pick >= 0, pick, numpy.where(n >= 2, 1, 0))
+            self.put_on_sorted(rows, order, n, amount, strategy, pick)
+        else:  # goal == "BE"
+            border = self.largest_empire(player, labels, sizes) & self.attackable(player)
+            order, n = self.sorted_areas(border)
+            self.put_on_sorted(rows, order, n, amount, strategy)
+
+    def largest_empire(self, player: int, labels, sizes):
+        # Areas of the largest empire of player (isles excluded), the one with the lowest area on ties
+        n_ground = self.map.n_ground
+        candidates = (self.owner == player) & ~self.map.isle
+        key = numpy.where(candidates, sizes * 64 - labels, -1)
+        best = key.argmax(axis=1)
+        rows = numpy.arange(len(self.ids))
+        chosen = numpy.where(key[rows, best] >= 0, labels[rows, best], -1)
+        return (labels == chosen[:, None]) & (self.owner == player)
+
+    def put_power_places(self, player: int, playing):
+        # Player.put_reinforces of centers: a power place on an area, if there are less than 12
+        own = self.owner == player
+        games = playing & own.any(axis=1) & (self.power_place.sum(axis=1) < 12)
+        if not games.any():
+            return
+        rows = numpy.flatnonzero(games)
+        own = own[rows]
+        if self.goals[player] != "PP":
+            self.power_place[rows, self.choose(own)] = True
+            return
+        # The first area that can't be attacked, with more than one army
+        safe = own & ~self.attackable(player)[rows] & (self.armies[rows] > 1)
+        has_safe = safe.any(axis=1)
+        self.power_place[rows[has_safe], safe[has_safe].argmax(axis=1)] = True
+        rows, own = rows[~has_safe], own[~has_safe]
+        # Otherwise the scan of put_reinforces over the areas of player
+        highest = numpy.full(len(rows), -1)
+        high = numpy.zeros(len(rows), dtype=numpy.int64)
+        for node in range(own.shape[1]):
+            armies = self.armies[rows, node]
+            replaced = (highest >= 0) & ~self.power_place[rows, numpy.maximum(highest, 0)]
+            take = own[:, node] & ((armies > high) | replaced)
+            high = numpy.where(take, armies, high)
+            highest = numpy.where(take, node, highest)
+        found = highest >= 0
+        self.power_place[rows[found], highest[found]] = True
+
+    def put_triremes(self, player: int, amount):
+        # Player.put_reinforces of triremes: on a sea area near the areas of player, one entry
+        # for every area of player on its coast
+        coast = (self.owner == player).astype(numpy.int64) @ self.map.coast.T
+        games = (amount > 0) & (coast.sum(axis=1) > 0)
+        if not games.any():
+            return
+        rows = numpy.flatnonzero(games)
+        coast, amount = coast[rows], amount[rows]
+        trireme = self.trireme[rows, :, player]
+        if self.goals[player] != "LA":
+            total = coast.sum(axis=1)
+            draws = numpy.floor(self.rng.random(len(rows)) * total)
+            sea = (numpy.cumsum(coast, axis=1) > draws[:, None]).argmax(axis=1)
+            self.trireme[rows, sea, player] += amount
+            return
+        key = numpy.where(coast > 0, trireme * 64 + numpy.arange(coast.shape[1]), BIG)
+        strategy = self.strategies[player]
+        if strategy == "Aggressive":
+            sea = numpy.where(coast > 0, key, -1).argmax(axis=1)
+            self.trireme[rows, sea, player] += amount
+        elif strategy == "Neutral":
+            sea = key.argmin(axis=1)
+            self.trireme[rows, sea, player] += amount
+        else:
+            # Spread over the sorted list, in which every sea area is repeated
+            order = key.argsort(axis=1, kind="stable")
+            counts = coast[numpy.arange(len(rows))[:, None], order]
+            n = counts.sum(axis=1)
+            given = spread(amount, n)
+            ends = numpy.cumsum(counts, axis=1)
+            starts = ends - counts
+            cumulative = numpy.concatenate([numpy.zeros((len(rows), 1), dtype=numpy.int64), numpy.cumsum(given, axis=1)], axis=1)
+            per_sea = cumulative[numpy.arange(len(rows))[:, None], ends] - cumulative[numpy.arange(len(rows))[:, None], starts]
+            self.trireme[rows[:, None], order, player] += per_sea
+
+    def play_tris(self, player: int, playing, labels, sizes):
+        # Player.get_best_tris and play_tris, then the reinforcements of the tris
+        table = self.tris_table
+        names = table.tris_by_goal[self.goals[player]]
+        counts = numpy.array([table.counts[name] for name in names])
+        hands = self.hands[:, player]
+        feasible = (hands[:, None, :] >= counts[None, :, :]).all(axis=2)
+        first = feasible.argmax(axis=1)
+        games = playing & (hands.sum(axis=1) >= 3) & feasible.any(axis=1) & (first <= len(names) / 2)
+        if not games.any():
+            return
+        rows = numpy.flatnonzero(games)
+        played = counts[first[rows]]
+        self.hands[rows, player] -= played
+        self.trash[rows] += played
+        reinforces = [table.reinforces[name] for name in names]
+        amount = numpy.zeros(len(self.ids), dtype=numpy.int64)
+        amount[rows] = [reinforces[i]["legionaries"] for i in first[rows]]
+        self.put_legionaries(player, amount, labels, sizes)
+        self.put_power_places(player, games)
+        amount[rows] = [reinforces[i]["triremes"] for i in first[rows]]
+        self.put_triremes(player, numpy.where(games, amount, 0))
+
+    def naval_combact(self, player: int, playing):
+        # Every sea area where all players have trireme, against the one with the fewest
+        trireme = self.trireme
+        aggressivity = strategies.probs_win[self.strategies[player]]
+        adversary = trireme.argmin(axis=2)
+        own = trireme[:, :, player]
+        defender = numpy.take_along_axis(trireme, adversary[:, :, None], axis=2)[:, :, 0]
+        battles = playing[:, None] & (trireme.min(axis=2) > 0) & (adversary != player)
+        battles &= self.odds.prob_win_batch(NAVAL, own, defender) >= aggressivity
+        if not battles.any():
+            return
+        rows, seas = numpy.nonzero(battles)
+        outcomes = get_battle_outcomes(aggressivity=aggressivity)
+        atta_end, defe_end = outcomes.sample_batch(own[rows, seas], defender[rows, seas], self.rng.random(len(rows)))
+        self.trireme[rows, seas, player] = atta_end
+        self.trireme[rows, seas, adversary[rows, seas]] = defe_end
+
+    def conquer(self, player: int, rows, attackers, defenders, atta_end, to_leave):
+        # Areas whose defender has no armies left change owner, and the nomads move there
+        percentage = strategies.nomads_percentage[self.strategies[player]]
+        self.owner[rows, defenders] = player
+        minimum = numpy.minimum(3, atta_end)
+        maximum = self.armies[rows, attackers] - to_leave
+        nomads = numpy.round((maximum - minimum) * percentage + minimum).astype(numpy.int64)
+        self.armies[rows, attackers] -= nomads
+        self.armies[rows, defenders] = nomads
+
+    def combact_by_sea(self, player: int, playing):
+        # SPQRisiko.combact_by_sea_phase: candidate attacks (game, attack) found at the beginning
+        # and updated after every battle as update_attacks_by_sea does. True for the games in
+        # which player conquers
+        conquered = numpy.zeros(len(self.ids), dtype=bool)
+        m = self.map
+        P = self.n_players
+        aggressivity = strategies.probs_win[self.strategies[player]]
+        games, attacks = numpy.nonzero(
+            playing[:, None] & (self.owner[:, m.sea_attackers] == player) & (self.owner[:, m.sea_defenders] != player))
+        trireme = self.trireme[games, m.sea_areas[attacks]]
+        own = trireme[:, player]
+        defender_owner = self.owner[games, m.sea_defenders[attacks]]
+        defender_trireme = trireme[numpy.arange(len(games)), numpy.minimum(defender_owner, P - 1)]
+        valid = (own > trireme.min(axis=1)) & ((defender_owner >= P) | (own > defender_trireme))
+        games, attacks = games[valid], attacks[valid]
+        if len(games) == 0:
+            return conquered
+        to_leave = 1 + self.attackable(player)[games, m.sea_attackers[attacks]]
+        attacker_armies = self.armies[games, m.sea_attackers[attacks]] - to_leave
+        defender_armies = self.armies[games, m.sea_defenders[attacks]]
+        prob = self.odds.prob_win_batch(BY_SEA, attacker_armies, defender_armies)
+        valid = (attacker_armies >= numpy.minimum(3, defender_armies)) & (prob >= aggressivity)
+        games, attacks, to_leave, prob = games[valid], attacks[valid], to_leave[valid], prob[valid]
+        if self.goals[player] == "PP":
+            priority = self.power_place[games, m.sea_defenders[attacks]] * 2.0
+        else:
+            priority = numpy.zeros(len(games))
+        attacked = numpy.zeros(self.owner.shape, dtype=bool)
+        last = numpy.full(len(self.ids), -1)
+        outcomes = get_battle_outcomes(by_sea=True)
+        while len(games) > 0:
+            best = first_per_game(games, prob + priority)
+            rows = games[best]
+            attackers, defenders = m.sea_attackers[attacks[best]], m.sea_defenders[attacks[best]]
+            leave = to_leave[best]
+            attacked[rows, defenders] = True
+            armies = self.armies[rows, attackers] - leave
+            atta_end, defe_end = outcomes.sample_batch(armies, self.armies[rows, defenders], self.rng.random(len(rows)))
+            self.armies[rows, attackers] -= armies - atta_end
+            self.armies[rows, defenders] = defe_end
+            won = defe_end <= 0
+            self.conquer(player, rows[won], attackers[won], defenders[won], atta_end[won], leave[won])
+            conquered[rows[won]] = True
+            # Drop the attacks to the areas of player or already attacked, score the attacks
+            # of the last attacker again (with its stale armies to leave, as the reference)
+            defenders = m.sea_defenders[attacks]
+            valid = (self.owner[games, defenders] != player) & ~attacked[games, defenders]
+            last[rows] = attackers
+            attackers = m.sea_attackers[attacks]
+            again = numpy.flatnonzero(valid & (attackers == last[games]))
+            if len(again) > 0:
+                g, a = games[again], attackers[again]
+                leave_now = 1 + ((self.owner[g[:, None], m.neighbors[a]] != player) & m.neighbor_mask[a]).any(axis=1)
+                armies_now = self.armies[g, a] - leave_now
+                defenders_now = self.armies[g, defenders[again]]
+                prob_now = self.odds.prob_win_batch(BY_SEA, armies_now, defenders_now)
+                valid[again] = (armies_now >= numpy.minimum(3, defenders_now)) & (prob_now >= aggressivity)
+                prob[again] = prob_now
+            last[rows] = -1
+            games, attacks, to_leave, prob, priority = (
+                games[valid], attacks[valid], to_leave[valid], prob[valid], priority[valid])
+        return conquered
+
+    def ground_combact(self, player: int, playing):
+        # SPQRisiko.ground_combact_phase, one battle per game at every round.
+        # True for the games in which player conquers
+        conquered = numpy.zeros(len(self.ids), dtype=bool)
+        m = self.map
+        aggressivity = strategies.probs_win[self.strategies[player]]
+        by_power_place = self.goals[player] == "PP"
+        outcomes = get_battle_outcomes(aggressivity=aggressivity)
+        rows = numpy.flatnonzero(playing)
+        while len(rows) > 0:
+            # Candidate attacks (game, edge) of the games still attacking
+            owner = self.owner[rows]
+            i, edges = numpy.nonzero((owner[:, m.attackers] == player) & (owner[:, m.defenders] != player))
+            games = rows[i]
+            attacker_armies = self.armies[games, m.attackers[edges]] - 1
+            defender_armies = self.armies[games, m.defenders[edges]]
+            valid = (attacker_armies > 0) & (attacker_armies >= numpy.minimum(3, defender_armies))
+            games, edges = games[valid], edges[valid]
+            prob = self.odds.prob_win_batch(GROUND, attacker_armies[valid], defender_armies[valid])
+            valid = prob >= aggressivity
+            games, edges, prob = games[valid], edges[valid], prob[valid]
+            if len(games) == 0:
+                break
+            if by_power_place:
+                prob = prob + 2.0 * self.power_place[games, m.defenders[edges]]
+            best = first_per_game(games, prob)
+            rows, edges = games[best], edges[best]
+            attackers, defenders = m.attackers[edges], m.defenders[edges]
+            armies = self.armies[rows, attackers] - 1
+            atta_end, defe_end = outcomes.sample_batch(armies, self.armies[rows, defenders], self.rng.random(len(rows)))
+            self.armies[rows, attackers] -= armies - atta_end
+            self.armies[rows, defenders] = defe_end
+            won = defe_end <= 0
+            self.conquer(player, rows[won], attackers[won], defenders[won], atta_end[won], 1)
+            conquered[rows[won]] = True
+        return conquered
+
+    def eliminate(self, player: int, playing):
+        # Players left without areas lose their cards to player and their trireme
+        for adversary in range(self.n_players):
+            if adversary == player:
+                continue
+            out = playing & ~self.eliminated[:, adversary] & ~(self.owner == adversary).any(axis=1)
+            if out.any():
+                self.hands[out, player] += self.hands[out, adversary]
+                self.hands[out, adversary] = 0
+                self.eliminated[out, adversary] = True
+                self.trireme[out, :, adversary] = 0
+
+    def move_to_power_place(self, player: int, playing):
+        # Player.move_armies_by_goal of the PP goal: armies from the strongest neighbour to the
+        # weakest power place, if it can be attacked (the other goals never move)
+        m = self.map
+        own_power_places = (self.owner == player) & self.power_place
+        weakest = numpy.where(own_power_places, self.armies, BIG).argmin(axis=1)
+        rows = numpy.arange(len(self.ids))
+        games = playing & own_power_places.any(axis=1) & self.attackable(player)[rows, weakest]
+        rows, weakest = rows[games], weakest[games]
+        if len(rows) == 0:
+            return
+        neighbors = m.neighbors[weakest]
+        armies = numpy.where(m.neighbor_mask[weakest], self.armies[rows[:, None], neighbors], -1)
+        strongest = neighbors[numpy.arange(len(rows)), armies.argmax(axis=1)]
+        armies = armies.max(axis=1)
+        moving = armies > 1
+        rows, weakest, strongest, armies = rows[moving], weakest[moving], strongest[moving], armies[moving]
+        moved = numpy.round(numpy.maximum(
+            (armies - 1) * strategies.strategies["PP"]["armies_on_weakest_power_place"], 1)).astype(numpy.int64)
+        self.armies[rows, strongest] -= moved
+        self.armies[rows, weakest] += moved
+
+    def draw_cards(self, player: int, games):
+        # A card for player in games, refilling the deck from the trash when it is empty
+        rows = numpy.flatnonzero(games)
+        if len(rows) == 0:
+            return
+        empty = self.deck[rows].sum(axis=1) == 0
+        refill = rows[empty]
+        self.deck[refill] = self.trash[refill]
+        self.trash[refill] = 0
+        deck = self.deck[rows]
+        left = deck.sum(axis=1)
+        rows, deck, left = rows[left > 0], deck[left > 0], left[left > 0]
+        draws = numpy.floor(self.rng.random(len(rows)) * left)
+        card = (numpy.cumsum(deck, axis=1) > draws[:, None]).argmax(axis=1)
+        self.deck[rows, card] -= 1
+        self.hands[rows, player, card] += 1
+
+    def results(self):
+        # Winner (None if nobody has won), its strategy and goal and the turn of every game
+        return [
+            {
+                "Winner": int(winner) if winner >= 0 else None,
+                "Turn": int(turn),
+                "Strategy": self.strategies[winner] if winner >= 0 else None,
+                "Goal": self.goals[winner] if winner >= 0 else None
+            }
+            for winner, turn in zip(self.winners, self.turns)]
+
+
+def play_reference(n_games: int, n_players: int, points_limit: int, strategy: str, goal: str, max_steps: int, seed: int):
+    # The same statistics from games of SPQRisiko
+    from .model import SPQRisiko
+    rows = []
+    for i in range(n_games):
+        model = SPQRisiko(n_players, points_limit, strategy, goal, fast_combact=True, seed=seed + i)
+        while model.running and model.current_turn < max_steps:
+            if model.step():
+                break
+        winner = model.datacollector.model_vars["Winner"][-1] if model.datacollector.model_vars["Winner"] else None
+        rows.append({
+            "Winner": winner.unique_id if winner is not None else None,
+            "Turn": model.current_turn,
+            "Strategy": winner.strategy if winner is not None else None,
+            "Goal": winner.goal if winner is not None else None
+        })
+    return rows
+
+
+def summary(rows: list):
+    turns = numpy.array([row["Turn"] for row in rows if row["Winner"] is not None])
+    n = len(rows)
+    return {
+        "games": n,
+        "finished": len(turns),
+        "turn_mean": float(turns.mean()) if len(turns) else None,
+        "turn_std": float(turns.std()) if len(turns) else None,
+        "winner": {k: v / n for k, v in sorted(collections.Counter(row["Winner"] for row in rows).items(), key=str)},
+        "strategy": {k: v / n for k, v in sorted(collections.Counter(row["Strategy"] for row in rows).items(), key=str)},
+        "goal": {k: v / n for k, v in sorted(collections.Counter(row["Goal"] for row in rows).items(), key=str)},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play SPQRisiko games in lockstep batches")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--n-players", type=int, default=3)
+    parser.add_argument("--points-limit", type=int, default=50)
+    parser.add_argument("--strategy", default="Random")
+    parser.add_argument("--goal", default="Random")
+    parser.add_argument("--max-steps", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reference", type=int, default=0, help="games of SPQRisiko to compare with")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    games = BatchedGames(args.games, args.n_players, args.points_limit, args.strategy, args.goal, seed=args.seed)
+    games.run(args.max_steps)
+    elapsed = time.perf_counter() - start
+    print("batched: {} games in {:.2f} s, {:.1f} games per second".format(args.games, elapsed, args.games / elapsed))
+    print(summary(games.results()))
+    if args.reference:
+        start = time.perf_counter()
+        rows = play_reference(args.reference, args.n_players, args.points_limit, args.strategy, args.goal,
+                              args.max_steps, args.seed)
+        elapsed = time.perf_counter() - start
+        print("SPQRisiko: {} games in {:.2f} s, {:.1f} games per second".format(args.reference, elapsed, args.reference / elapsed))
+        print(summary(rows))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
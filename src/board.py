@@ -0,0 +1,143 @@
+import numpy
+
+from .empires import EmpireTracker, NO_OWNER
+from .scoreboard import Scoreboard
+
+""" State of the board in contiguous arrays indexed by node id: owner (the unique_id of
+the owner, -1 if none), armies, power places, sea attacks of the current turn and the
+trireme of every player. GroundArea and SeaArea are views of a row of these arrays, so the
+strategies and the server keep on reading and writing area.armies, area.owner and
+area.trireme[player], while the whole-board queries (how many territories, power places,
+sea areas or armies every player has) are single numpy operations. Every change of owner
+also updates the empires of the players (see empires.py) and every change of owner,
+power places or trireme the victory point counters (see scoreboard.py) """
+
+
+class BoardState(object):
+
+    def __init__(self, n_nodes: int, n_players: int, owners: list, adjacency):
+        # owners: players and computers, indexed by unique_id
+        self.n_nodes = n_nodes
+        self.n_players = n_players
+        self.owners = owners
+        self.owner = numpy.full(n_nodes, NO_OWNER, dtype=numpy.int64)
+        self.armies = numpy.zeros(n_nodes, dtype=numpy.int64)
+        self.power_place = numpy.zeros(n_nodes, dtype=bool)
+        self.already_attacked_by_sea = numpy.zeros(n_nodes, dtype=bool)
+        self.trireme = numpy.zeros((n_nodes, n_players), dtype=numpy.int64)
+        # Whether a node is a ground area
+        self.ground = numpy.zeros(n_nodes, dtype=bool)
+        self.empires = EmpireTracker(adjacency.ground_neighbors, self.owner)
+        self.scoreboard = Scoreboard(len(owners), n_players, self.empires)
+
+    def get_owner(self, node: int):
+        owner = self.owner.item(node)
+        return self.owners[owner] if owner != NO_OWNER else None
+
+    def set_owner(self, node: int, owner):
+        old_owner = self.owner.item(node)
+        new_owner = owner.unique_id if owner is not None else NO_OWNER
+        self.owner[node] = new_owner
+        if old_owner != new_owner:
+            self.empires.move(node, old_owner, new_owner)
+            self.scoreboard.move(old_owner, new_owner, self.power_place.item(node))
+
+    def set_armies(self, node: int, armies: int):
+        self.armies[node] = armies
+
+    def set_power_place(self, node: int, power_place: bool):
+        old = self.power_place.item(node)
+        self.power_place[node] = power_place
+        self.scoreboard.set_power_place(self.owner.item(node), old, self.power_place.item(node))
+
+    def set_trireme(self, node: int, player: int, trireme: int):
+        self.trireme[node, player] = trireme
+        self.scoreboard.update_sea_area(node, self.trireme[node].tolist())
+
+    def set_trireme_row(self, node: int, trireme):
+        for player, n in enumerate(trireme):
+            self.set_trireme(node, player, n)
+
+    def snapshot(self):
+        # Copy of the state of the board (areas, empires and counters), for restore
+        return (
+            self.owner.copy(), self.armies.copy(), self.power_place.copy(),
+            self.already_attacked_by_sea.copy(), self.trireme.copy(),
+            self.empires.snapshot(), self.scoreboard.snapshot())
+
+    def restore(self, state):
+        # Written in place: the areas, the empires and the counters keep their references to the arrays
+        owner, armies, power_place, already_attacked_by_sea, trireme, empires, scoreboard = state
+        self.owner[:] = owner
+        self.armies[:] = armies
+        self.power_place[:] = power_place
+        self.already_attacked_by_sea[:] = already_attacked_by_sea
+        self.trireme[:] = trireme
+        self.empires.restore(empires)
+        self.scoreboard.restore(scoreboard)
+
+    def territories_per_player(self):
+        # Ground areas owned by every player (computers excluded)
+        owner = self.owner[self.ground]
+        return numpy.bincount(owner[(owner >= 0) & (owner < self.n_players)], minlength=self.n_players).tolist()
+
+    def power_places_per_player(self):
+        owner = self.owner[self.ground & self.power_place]
+        return numpy.bincount(owner[(owner >= 0) & (owner < self.n_players)], minlength=self.n_players).tolist()
+
+    def armies_per_owner(self):
+        # Armies on the ground areas of every player and computer
+        owned = self.ground & (self.owner != NO_OWNER)
+        armies = numpy.bincount(self.owner[owned], weights=self.armies[owned], minlength=len(self.owners))
+        return armies.astype(numpy.int64).tolist()
+
+    def sea_areas_per_player(self, sea_nodes):
+        # Sea areas in which a single player has the most trireme
+        trireme = self.trireme[sea_nodes]
+        is_max = trireme == trireme.max(axis=1)[:, None]
+        single = is_max.sum(axis=1) == 1
+        return numpy.bincount(trireme[single].argmax(axis=1), minlength=self.n_players).tolist()
+
+    def nodes_of(self, player: int):
+        # Ground areas owned by player, by increasing id
+        return numpy.flatnonzero(self.ground & (self.owner == player))
+
+    def n_power_places(self):
+        return int(numpy.count_nonzero(self.power_place))
+
+
+class TriremeRow(object):
+
+    # The trireme of every player in a sea area, read and written like a list
+    def __init__(self, board: BoardState, node: int):
+        self.board = board
+        self.node = node
+
+    def __getitem__(self, player):
+        if isinstance(player, slice):
+            return self.tolist()[player]
+        return self.board.trireme.item(self.node, player)
+
+    def __setitem__(self, player, trireme):
+        self.board.set_trireme(self.node, player, trireme)
+
+    def __len__(self):
+        return self.board.n_players
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __eq__(self, other):
+        return self.tolist() == list(other)
+
+    def index(self, trireme):
+        return self.tolist().index(trireme)
+
+    def tolist(self):
+        return self.board.trireme[self.node].tolist()
+
+    def __str__(self):
+        return str(self.tolist())
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,47 @@
+from .registry import CARDS_PATH, get_cards
+
+""" Cards as counts: the deck, the trash and the hand of every player are lists with the
+number of cards of every type, in the order of config/cards.json. Drawing a card takes
+a type with a probability proportional to the cards of that type left in the deck, the
+same of drawing the last card of a shuffled deck. The card dicts of cards.json are only
+built to show a hand (see materialize) """
+
+
+def load_cards(path: str = CARDS_PATH):
+    # The types of cards, read-only and shared with every other model (see registry.py)
+    return get_cards(path)
+
+
+def full_deck(cards: list):
+    # Number of cards of every type in a new deck
+    return [card["number_in_deck"] for card in cards]
+
+
+def empty_hand(cards: list):
+    return [0] * len(cards)
+
+
+def draw(deck: list, rng):
+    # Index of the type of a card drawn from deck (which loses it), None if the deck is empty
+    left = sum(deck)
+    if left == 0:
+        return None
+    r = rng.randrange(left)
+    for i, n in enumerate(deck):
+        if r < n:
+            deck[i] -= 1
+            return i
+        r -= n
+
+
+def add(counts: list, other: list):
+    # Put the cards of other into counts
+    for i, n in enumerate(other):
+        counts[i] += n
+
+
+def materialize(counts: list, cards: list):
+    # The hand as a list of card dicts
+    return [
+        {"type": card["type"], "adds_on_tris": dict(card["adds_on_tris"]), "image": card["image"]}
+        for card, n in zip(cards, counts) for _ in range(n)]
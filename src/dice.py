@@ -0,0 +1,72 @@
+import numpy
+
+""" The dice of the combacts of a model (see Player.combact). Every draw of a game comes
+from its own generator (model.random, seeded by SPQRisiko(seed=...)), so a game is
+identified by its parameters and its seed, whatever else runs in the same process.
+Dice rolls them one at a time with model.random; DiceBuffer draws them with numpy, a block
+of many at a time, from a generator seeded by model.random (a different stream of dice,
+just as reproducible). Both give the dice of a throw sorted from the highest and can be
+saved and set back with the snapshots of the game (see snapshot.py) """
+
+DICE_BUFFER_SIZE = 4096
+
+
+class Dice(object):
+
+    # Not buffered (see make_dice)
+    size = 0
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def roll(self, n: int):
+        randint = self.rng.randint
+        return sorted([randint(1, 6) for _ in range(n)], reverse=True)
+
+    def getstate(self):
+        # Its state is the one of the generator of the model
+        return None
+
+    def setstate(self, state):
+        pass
+
+    def copy(self, rng):
+        # The same dice, for a model whose generator is rng
+        return Dice(rng)
+
+
+class DiceBuffer(object):
+
+    def __init__(self, rng, size: int = DICE_BUFFER_SIZE):
+        self.generator = numpy.random.default_rng(rng.getrandbits(64))
+        self.size = size
+        # Dice drawn and not rolled yet, from position on
+        self.block = ()
+        self.position = 0
+
+    def roll(self, n: int):
+        if self.position + n > len(self.block):
+            self.block = self.block[self.position:] + tuple(self.generator.integers(1, 7, self.size).tolist())
+            self.position = 0
+        dice = sorted(self.block[self.position:self.position + n], reverse=True)
+        self.position += n
+        return dice
+
+    def getstate(self):
+        return self.generator.bit_generator.state, self.block, self.position
+
+    def setstate(self, state):
+        bit_generator_state, self.block, self.position = state
+        self.generator.bit_generator.state = bit_generator_state
+
+    def copy(self, rng):
+        other = object.__new__(DiceBuffer)
+        other.generator = numpy.random.default_rng()
+        other.size = self.size
+        other.setstate(self.getstate())
+        return other
+
+
+def make_dice(rng, buffer_size: int = 0):
+    # Dice rolled with rng, or buffered by numpy if buffer_size > 0
+    return DiceBuffer(rng, buffer_size) if buffer_size > 0 else Dice(rng)
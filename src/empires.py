@@ -0,0 +1,112 @@
+from .profiling import NODES_VISITED
+
+""" Connected components of the ground areas of every owner (the empires), kept up to date
+as the areas change owner instead of being searched again at every turn. Areas joining
+an owner are merged with the components of their neighbours (union-find, by size and with
+path halving); an area leaving its owner can split its component, so only the areas of
+that component are visited again to find the new ones. Every root keeps the list of
+the members of its component, so the largest empire is found among the roots of
+a player, without walking the board """
+
+NO_OWNER = -1
+
+
+class EmpireTracker(object):
+
+    def __init__(self, ground_neighbors, owner):
+        # ground_neighbors: ground neighbours of every node, owner: owner of every node
+        self.ground_neighbors = ground_neighbors
+        self.owner = owner
+        self.parent = list(range(len(ground_neighbors)))
+        # Members of the component of every root
+        self.members = {}
+        # Roots of the components of every owner
+        self.roots = {}
+        # Counts the areas visited by the splits, if set (see profiling.py)
+        self.profile = None
+
+    def find(self, node: int):
+        parent = self.parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(self, owner: int, a: int, b: int):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if len(self.members[a]) < len(self.members[b]):
+            a, b = b, a
+        self.parent[b] = a
+        self.members[a].extend(self.members.pop(b))
+        self.roots[owner].discard(b)
+
+    def add(self, node: int, owner: int):
+        # node has just been taken by owner
+        self.parent[node] = node
+        self.members[node] = [node]
+        self.roots.setdefault(owner, set()).add(node)
+        for neighbor in self.ground_neighbors[node]:
+            if self.owner[neighbor] == owner:
+                self.union(owner, node, neighbor)
+
+    def remove(self, node: int, owner: int):
+        # node has just been lost by owner: split what is left of its component
+        root = self.find(node)
+        self.roots[owner].discard(root)
+        left = set(self.members.pop(root))
+        left.discard(node)
+        self.parent[node] = node
+        while left:
+            start = left.pop()
+            component = [start]
+            for member in component:
+                for neighbor in self.ground_neighbors[member]:
+                    if neighbor in left:
+                        left.discard(neighbor)
+                        component.append(neighbor)
+            for member in component:
+                self.parent[member] = start
+            self.members[start] = component
+            self.roots[owner].add(start)
+            if self.profile is not None:
+                self.profile.count(NODES_VISITED, len(component))
+
+    def move(self, node: int, old_owner: int, new_owner: int):
+        if old_owner == new_owner:
+            return
+        if old_owner != NO_OWNER:
+            self.remove(node, old_owner)
+        if new_owner != NO_OWNER:
+            self.add(node, new_owner)
+
+    def snapshot(self):
+        # Copy of the components, for restore
+        return (
+            list(self.parent),
+            {root: list(members) for root, members in self.members.items()},
+            {owner: set(roots) for owner, roots in self.roots.items()})
+
+    def restore(self, state):
+        parent, members, roots = state
+        self.parent[:] = parent
+        self.members = {root: list(component) for root, component in members.items()}
+        self.roots = {owner: set(owner_roots) for owner, owner_roots in roots.items()}
+
+    def largest_size(self, owner: int):
+        # Number of areas of the largest empire of owner, 0 if it has none
+        return max((len(self.members[root]) for root in self.roots.get(owner, ())), default=0)
+
+    def largest_empire(self, owner: int, ignored=frozenset()):
+        # Areas of the largest empire of owner by increasing id, the one with
+        # the lowest area among the largest ones. Empires made only of ignored areas don't count
+        best = None
+        for root in self.roots.get(owner, ()):
+            members = self.members[root]
+            if ignored and all(member in ignored for member in members):
+                continue
+            key = (len(members), -min(members))
+            if best is None or key > best[0]:
+                best = (key, members)
+        return sorted(best[1]) if best is not None else []
@@ -0,0 +1,115 @@
+import sys
+import json
+import collections
+
+""" Structured events of a game, in place of print(). An event has a category and a level
+and is only built if some sink consumes that category at that level: the message is a
+format string whose arguments are formatted by the sinks that need text. Hot loops ask
+once whether their events are enabled (EventLog.enabled) and skip them altogether.
+A model logs nothing unless it's given an EventLog with some sink, like the server does """
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+SILENT = 100
+
+# Categories
+GAME = "game"
+COMBACT = "combact"
+REINFORCEMENT = "reinforcement"
+SCORING = "scoring"
+MOVEMENT = "movement"
+CATEGORIES = (GAME, COMBACT, REINFORCEMENT, SCORING, MOVEMENT)
+
+Event = collections.namedtuple("Event", ["turn", "category", "level", "message", "args"])
+
+
+def format_event(event: Event):
+    return event.message.format(*event.args) if event.args else event.message
+
+
+class ConsoleSink(object):
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def __call__(self, event: Event):
+        print(format_event(event), file=self.stream or sys.stdout)
+
+
+class RingBufferSink(object):
+
+    # Keeps the last `size` events, unformatted
+    def __init__(self, size: int = 1000):
+        self.events = collections.deque(maxlen=size)
+
+    def __call__(self, event: Event):
+        self.events.append(event)
+
+    def messages(self):
+        return [format_event(event) for event in self.events]
+
+
+class FileSink(object):
+
+    # One JSON object per line
+    def __init__(self, path: str):
+        self.file = open(path, "a")
+
+    def __call__(self, event: Event):
+        self.file.write(json.dumps({
+            "turn": event.turn,
+            "category": event.category,
+            "level": event.level,
+            "message": format_event(event)
+        }) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class EventLog(object):
+
+    def __init__(self, level: int = SILENT, sinks=(), levels: dict = None):
+        # levels overrides the level of single categories
+        self.sinks = list(sinks)
+        self.turn = 0
+        self.set_level(level, levels)
+
+    def set_level(self, level: int, levels: dict = None):
+        self.level = level
+        self.category_levels = dict(levels or {})
+        self.update_levels()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        self.update_levels()
+
+    def update_levels(self):
+        # Without sinks every category is silent
+        self.levels = {
+            category: self.category_levels.get(category, self.level) if self.sinks else SILENT
+            for category in CATEGORIES}
+
+    def enabled(self, category: str, level: int = DEBUG):
+        return level >= self.levels[category]
+
+    def emit(self, category: str, level: int, message: str, *args):
+        if level < self.levels[category]:
+            return
+        event = Event(self.turn, category, level, message, args)
+        for sink in self.sinks:
+            sink(event)
+
+    def debug(self, category: str, message: str, *args):
+        if DEBUG >= self.levels[category]:
+            self.emit(category, DEBUG, message, *args)
+
+    def info(self, category: str, message: str, *args):
+        if INFO >= self.levels[category]:
+            self.emit(category, INFO, message, *args)
+
+
+def console_log(level: int = DEBUG):
+    # The prints of the old days
+    return EventLog(level, [ConsoleSink()])
@@ -0,0 +1,185 @@
+import heapq
+
+from . import strategies
+from .odds import GROUND, BY_SEA
+from .events import COMBACT
+
+""" Candidate ground attacks of a player during its ground combact phase, kept in a heap
+instead of being searched again after every battle. An attack is an edge (attacker,
+defender) between two neighbours, and its key is the same order of
+SPQRisiko.get_attackable_ground_areas: power place first (PP goal only), then decreasing
+probability to win, then the order in which the attacks are found (attacker id and
+position of the defender among its neighbours). A battle only changes the armies and
+the owners of its two areas, so only the edges touching them are scored again: the old
+entries of the heap are left there and skipped when they come on top """
+
+
+class AttackFrontier(object):
+
+    def __init__(self, model, player, aggressivity=None):
+        # aggressivity: lowest probability to win of an attack, the one of the strategy if None
+        self.model = model
+        self.player = player
+        self.aggressivity = aggressivity if aggressivity is not None else strategies.probs_win[player.strategy]
+        self.by_power_place = player.goal == "PP"
+        self.heap = []
+        # Current entry of every valid edge
+        self.entries = {}
+        # Edges scored so far (see profiling.py)
+        self.scored = 0
+        for node in model.board.nodes_of(player.unique_id).tolist():
+            for position, neighbor in enumerate(model.adjacency.ground_neighbors[node]):
+                self.score(node, position, neighbor)
+            self.scored += len(model.adjacency.ground_neighbors[node])
+
+    def score(self, attacker_id: int, position: int, defender_id: int):
+        # (Re)compute the entry of an edge, as in get_attackable_ground_areas_from
+        # Read from the arrays of the board, not through the areas (this is the hot loop of
+        # the ground combact phase and of the rollouts)
+        self.entries.pop((attacker_id, defender_id), None)
+        board = self.model.board
+        owner = board.owner.item(attacker_id)
+        attacker_armies = board.armies.item(attacker_id)
+        defender_armies = board.armies.item(defender_id)
+        if owner != self.player.unique_id or \
+           attacker_armies <= 1 or \
+           board.owner.item(defender_id) == owner or \
+           attacker_armies - 1 < min(3, defender_armies):
+            return
+        prob_win = self.model.odds.prob_win(GROUND, attacker_armies - 1, defender_armies)
+        if prob_win < self.aggressivity:
+            return
+        power_place = self.by_power_place and board.power_place.item(defender_id)
+        entry = (not power_place, -prob_win, attacker_id, position, defender_id)
+        self.entries[(attacker_id, defender_id)] = entry
+        heapq.heappush(self.heap, entry)
+
+    def update(self, *nodes):
+        # The armies or the owner of nodes have changed
+        ground_neighbors = self.model.adjacency.ground_neighbors
+        for node in nodes:
+            for position, neighbor in enumerate(ground_neighbors[node]):
+                self.score(node, position, neighbor)
+            for neighbor in ground_neighbors[node]:
+                self.score(neighbor, ground_neighbors[neighbor].index(node), node)
+            self.scored += 2 * len(ground_neighbors[node])
+
+    def best(self):
+        # Next attack as (attacker id, defender id), None if there is none
+        heap = self.heap
+        while heap:
+            entry = heap[0]
+            if self.entries.get((entry[2], entry[4])) is entry:
+                return entry[2], entry[4]
+            heapq.heappop(heap)
+        return None
+
+
+""" Candidate attacks by sea of a player, in the order in which SPQRisiko.update_attacks_by_sea
+would try them, without sorting them again after every battle. The attacks (the array of
+get_attackable_ground_areas_by_sea) are in a heap keyed by power place (PP goal only) and
+decreasing probability to win, then by a stamp which keeps the order of the stable sort:
+at first the position of the attack, then, for an attack whose key changes, a stamp above
+every other if it moves ahead (it comes after the attacks that already had its new key)
+or below every other if it moves back. A battle only changes its attacker and its
+defender: the attacks against the defender are evicted, those of the attacker are scored
+again (their armies_to_leave are left as they were, as update_attacks_by_sea does) """
+
+
+class SeaAttackQueue(object):
+
+    def __init__(self, model, player, attacks):
+        self.model = model
+        self.player = player
+        self.attacks = attacks
+        self.aggressivity = strategies.probs_win[player.strategy]
+        self.by_power_place = player.goal == "PP"
+        # Current entry of every attack still in the queue
+        self.entries = {}
+        self.by_attacker, self.by_defender = {}, {}
+        self.heap = []
+        for i, attack in enumerate(attacks):
+            self.push(i, self.key(attack["power_place"], attack["prob_win"]), i)
+            self.by_attacker.setdefault(int(attack["attacker"]), set()).add(i)
+            self.by_defender.setdefault(int(attack["defender"]), set()).add(i)
+        # Next stamps below and above every other
+        self.lo, self.hi = -1, len(attacks)
+        # Attacks scored so far (see profiling.py)
+        self.scored = len(attacks)
+
+    def key(self, power_place, prob_win):
+        return (self.by_power_place and not power_place, -float(prob_win))
+
+    def push(self, i: int, key, stamp: int):
+        entry = key + (stamp, i)
+        self.entries[i] = entry
+        heapq.heappush(self.heap, entry)
+
+    def evict(self, i: int):
+        del self.entries[i]
+        self.by_attacker[int(self.attacks[i]["attacker"])].discard(i)
+        self.by_defender[int(self.attacks[i]["defender"])].discard(i)
+
+    def first(self):
+        # Index in attacks of the next attack, None if there is none
+        heap = self.heap
+        while heap:
+            entry = heap[0]
+            if self.entries.get(entry[-1]) is entry:
+                return entry[-1]
+            heapq.heappop(heap)
+        return None
+
+    def update(self):
+        # The first attack has been fought
+        model, events = self.model, self.model.events
+        verbose = events.enabled(COMBACT)
+        first = self.first()
+        attacker_id, defender_id = int(self.attacks[first]["attacker"]), int(self.attacks[first]["defender"])
+        self.evict(first)
+
+        # Its defender has been conquered or, anyway, already attacked by sea
+        for i in list(self.by_defender[defender_id]):
+            if verbose:
+                events.debug(COMBACT, 'Since the defender has already been attacked by sea, I delete it')
+            self.evict(i)
+
+        # The attacker may attack again, with another probability to win
+        attacker = model.ground_areas[attacker_id]
+        # Maybe it could change the armies to leave due to garrisons
+        armies_to_leave = model.get_armies_to_leave(attacker)
+        moved_ahead, moved_back = [], []
+        for i in sorted(self.by_attacker[attacker_id], key=self.entries.get):
+            defender = model.ground_areas[int(self.attacks[i]["defender"])]
+            if defender.owner.unique_id == self.player.unique_id or defender.already_attacked_by_sea:
+                self.evict(i)
+                continue
+            if attacker.armies - armies_to_leave < min(3, defender.armies):
+                if verbose:
+                    events.debug(COMBACT, 'Since the attacker hasn\'t the min required armies, I delete it')
+                self.evict(i)
+                continue
+            prob_win = model.odds.prob_win(BY_SEA, attacker.armies - armies_to_leave, defender.armies)
+            self.scored += 1
+            if prob_win < self.aggressivity:
+                if verbose:
+                    events.debug(COMBACT, 'Since the attacker has a lower prob to win, I delete it')
+                self.evict(i)
+                continue
+            if verbose:
+                events.debug(COMBACT, 'The attacker can attack again')
+            self.attacks[i]["prob_win"] = prob_win
+            old_key = self.entries[i][:-2]
+            key = self.key(self.attacks[i]["power_place"], prob_win)
+            if key < old_key:
+                moved_ahead.append((i, key))
+            elif key > old_key:
+                moved_back.append((i, key))
+
+        # In the order they had before
+        for i, key in moved_ahead:
+            self.push(i, key, self.hi)
+            self.hi += 1
+        for stamp, (i, key) in zip(range(self.lo - len(moved_back) + 1, self.lo + 1), moved_back):
+            self.push(i, key, stamp)
+        self.lo -= len(moved_back)
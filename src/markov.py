@@ -1,7 +1,7 @@
-import os
+import sys
 import copy
 import numpy
-import pickle
+import functools
 from pandas import pandas
 
 
@@ -24,9 +24,180 @@ probs = {
     '33': [17871/46656, 12348/46656, 10017/46656, 6420/46656]
 }
 
-def get_probabilities_combact_by_sea(A: int, D: int):
+# Backends that compute the atta_wins tables, they must agree up to floating point errors
+SOLVERS = ("dense", "sparse")
+
+def _get_transition_tables():
+
+    """ Lay the probs dict out as arrays indexed by the dice combination, so that the
+    transitions of a whole set of states can be gathered at once.
+    combo = 3 * (atta_dice - 1) + (defe_dice - 1), the defender loses k armies with
+    probability trans_probs[combo, k] while the attacker loses min_dice[combo] - k """
+
+    trans_probs = numpy.zeros((9, 4))
+    min_dice = numpy.zeros(9, dtype=int)
+    for atta_dice in range(1, 4):
+        for defe_dice in range(1, 4):
+            combo = 3 * (atta_dice - 1) + (defe_dice - 1)
+            p = probs[str(atta_dice) + '' + str(defe_dice)]
+            trans_probs[combo, :len(p)] = p
+            min_dice[combo] = min(atta_dice, defe_dice)
+    return trans_probs, min_dice
+
+_TRANSITION_TABLES = _get_transition_tables()
+
+def _get_transitions(a, d):
+
+    # Dice thrown, transition probabilities and armies lost per roll in the states (a, d)
+
+    trans_probs, min_dice = _TRANSITION_TABLES
+    atta_dice = numpy.minimum(3, a)
+    defe_dice = numpy.minimum(3, d)
+    combo = 3 * (atta_dice - 1) + (defe_dice - 1)
+    return trans_probs[combo], min_dice[combo], atta_dice, defe_dice
+
+def _get_transient_states(A: int, D: int, by_sea: bool = False, aggressivity=None, atta_wins=None):
+
+    """ Boolean (A+1)x(D+1) grid of the states from which the battle goes on.
+    On a combact by sea the attacker throws until one of the two sides has no armies left,
+    on a ground (or naval) combact it must also throw at least as many dice as the defender.
+    If an aggressivity is given, the attacker also stops as soon as its probability to
+    win drops below it, like Player.combact does """
+
+    a = numpy.arange(A + 1)[:, None]
+    d = numpy.arange(D + 1)[None, :]
+    transient = (a > 0) & (d > 0)
+    if not by_sea:
+        transient &= numpy.minimum(3, a) >= numpy.minimum(3, d)
+    if aggressivity is not None:
+        if atta_wins is None:
+            atta_wins = get_atta_wins_by_recurrence(A, D, by_sea=by_sea)
+        transient[1:, 1:] &= atta_wins[:A, :D] >= aggressivity
+    return transient
+
+def get_atta_wins_by_recurrence(A: int, D: int, by_sea: bool = False):
+
+    # A is the initial number of attacker's armies, while D is the defender's ones
+
+    """ Sparse solver for the same absorbing chain solved with the dense inverse below.
+    Every dice roll removes at least one army, so the chain is acyclic and the probability
+    that the attacker wins from (a, d) only depends on states with a smaller a + d:
+
+        W(a, d) = sum_k p_k * W(a - min_dice + k, d - k)
+
+    with W(a, 0) = 1 and W(0, d) = 0. On a ground combact the states in which the attacker
+    throws fewer dice than the defender are absorbing too, and the attacker has lost.
+    The states are visited by anti-diagonals (a + d = s), each one gathered with a single
+    numpy operation from the three previous ones, so the cost is O(A*D) in both time and
+    memory. """
+
+    return extend_atta_wins_by_recurrence(numpy.zeros((0, 0)), A, D, by_sea)
+
+def extend_atta_wins_by_recurrence(atta_wins, A: int, D: int, by_sea: bool = False):
+
+    """ Grow an A0xD0 atta_wins table computed by get_atta_wins_by_recurrence to AxD.
+    W(a, d) doesn't depend on the size of the table, so only the new rows and columns
+    are computed, again by anti-diagonals """
+
+    A0, D0 = atta_wins.shape
+    W = numpy.zeros((A + 1, D + 1))
+    W[1:, 0] = 1
+    W[1:A0 + 1, 1:D0 + 1] = atta_wins
+    for s in range(2, A + D + 1):
+        a = numpy.arange(max(1, s - D), min(A, s - 1) + 1)
+        d = s - a
+        new = (a > A0) | (d > D0)
+        a, d = a[new], d[new]
+        if len(a) == 0:
+            continue
+        p, m, atta_dice, defe_dice = _get_transitions(a, d)
+        w = numpy.zeros(len(a))
+        for k in range(4):
+            # Indexes are clipped where p[:, k] == 0, so they never contribute
+            w += p[:, k] * W[numpy.clip(a - m + k, 0, A), numpy.maximum(d - k, 0)]
+        if not by_sea:
+            w[atta_dice < defe_dice] = 0
+        W[a, d] = w
+
+    return W[1:, 1:]
+
+def get_absorption_distributions(A: int, D: int, by_sea: bool = False, aggressivity=None, atta_wins=None):
+
+    """ Absorption distributions of every battle starting from (a, d), 1 <= a <= A and
+    1 <= d <= D. The end states are listed once in (atta_end, defe_end), the attacker's and
+    defender's survivors, and F[a, d, i] is the probability that the battle started from
+    (a, d) ends in (atta_end[i], defe_end[i]). Only end states that can actually be reached
+    by a roll are listed: a battle that cannot start at all (see _get_transient_states)
+    ends where it is, and F[a, d] is zero everywhere.
+    It is the same recurrence of get_atta_wins_by_recurrence, where every state carries
+    a whole vector of absorption probabilities instead of the only win probability """
+
+    transient = _get_transient_states(A, D, by_sea, aggressivity, atta_wins)
+
+    # End states in which at least one transient state can fall
+    reached = numpy.zeros_like(transient)
+    a, d = numpy.nonzero(transient)
+    p, m, _, _ = _get_transitions(a, d)
+    for k in range(4):
+        mask = p[:, k] > 0
+        reached[a[mask] - m[mask] + k, d[mask] - k] = True
+    reached &= ~transient
+    atta_end, defe_end = numpy.nonzero(reached)
+    n_ends = len(atta_end)
+
+    F = numpy.zeros((A + 1, D + 1, n_ends))
+    F[atta_end, defe_end, numpy.arange(n_ends)] = 1
+    for s in range(2, A + D + 1):
+        a = numpy.arange(max(1, s - D), min(A, s - 1) + 1)
+        d = s - a
+        keep = transient[a, d]
+        a, d = a[keep], d[keep]
+        if len(a) == 0:
+            continue
+        p, m, _, _ = _get_transitions(a, d)
+        f = numpy.zeros((len(a), n_ends))
+        for k in range(4):
+            f += p[:, k, None] * F[numpy.clip(a - m + k, 0, A), numpy.maximum(d - k, 0)]
+        F[a, d] = f
+    # A battle that doesn't start isn't absorbed in any of the listed end states
+    F[~transient] = 0
+
+    return atta_end, defe_end, F
+
+def get_absorption_distribution(A: int, D: int, by_sea: bool = False, aggressivity=None, atta_wins=None):
+
+    """ Absorption distribution of the only battle starting from (A, D), as the list of the
+    end states (atta_end, defe_end) that have a positive probability and their probabilities.
+    The probability mass is pushed forward from (A, D) one anti-diagonal at a time, so it
+    costs O(A*D) without the O(A*D*(A+D)) memory of get_absorption_distributions """
+
+    transient = _get_transient_states(A, D, by_sea, aggressivity, atta_wins)
+    M = numpy.zeros((A + 1, D + 1))
+    M[A, D] = 1
+    for s in range(A + D, 1, -1):
+        a = numpy.arange(max(1, s - D), min(A, s - 1) + 1)
+        d = s - a
+        keep = transient[a, d] & (M[a, d] > 0)
+        a, d = a[keep], d[keep]
+        if len(a) == 0:
+            continue
+        p, m, _, _ = _get_transitions(a, d)
+        mass = M[a, d]
+        M[a, d] = 0
+        for k in range(4):
+            numpy.add.at(M, (numpy.clip(a - m + k, 0, A), numpy.maximum(d - k, 0)), p[:, k] * mass)
+    atta_end, defe_end = numpy.nonzero(M > 0)
+    return atta_end, defe_end, M[atta_end, defe_end]
+
+def get_probabilities_combact_by_sea(A: int, D: int, solver: str = "dense"):
     
     # A is the initial number of attacker's armies, while D is the defender's ones
+    # solver is one of SOLVERS: "dense" inverts the fundamental matrix, "sparse" runs the recurrence
+
+    if solver == "sparse":
+        return get_atta_wins_by_recurrence(A, D, by_sea=True)
+    elif solver != "dense":
+        raise ValueError("Unknown solver {}, expected one of {}".format(solver, SOLVERS))
     
     """ Compute the absorbing and transient states.
     In our case the absorbing states are all those states with a < d, where a and d represent
@@ -124,9 +295,15 @@ def get_probabilities_combact_by_sea(A: int, D: int):
 
     return atta_wins
 
-def get_probabilities_ground_combact(A: int, D: int):
+def get_probabilities_ground_combact(A: int, D: int, solver: str = "dense"):
     
     # A is the initial number of attacker's armies, while D is the defender's ones
+    # solver is one of SOLVERS: "dense" inverts the fundamental matrix, "sparse" runs the recurrence
+
+    if solver == "sparse":
+        return get_atta_wins_by_recurrence(A, D, by_sea=False)
+    elif solver != "dense":
+        raise ValueError("Unknown solver {}, expected one of {}".format(solver, SOLVERS))
     
     """ Compute the absorbing and transient states.
     In our case the absorbing states are all those states with a < d, where a and d represent
@@ -237,12 +414,118 @@ def get_probabilities_ground_combact(A: int, D: int):
     return atta_wins
 
 
+# Armies up to which the absorption distributions are precomputed by get_battle_outcomes
+OUTCOMES_CACHE_SIZE = 40
+# Battles beyond the precomputed ones whose distributions are kept, the least recently used go first
+BEYOND_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=BEYOND_CACHE_SIZE)
+def _get_beyond_distribution(a: int, d: int, by_sea: bool, aggressivity):
+    # Shared by every BattleOutcomes of the process, so it is read-only
+    distribution = get_absorption_distribution(a, d, by_sea, aggressivity)
+    for array in distribution:
+        array.setflags(write=False)
+    return distribution
+
+class BattleOutcomes(object):
+
+    """ Absorption distributions of all the battles up to A attacker's and D defender's
+    armies, computed once so that the end state of a battle, its expected survivors and
+    quantiles can be read in O(1) (the distribution is a view on a precomputed row).
+    Battles beyond the precomputed range are solved on demand with
+    get_absorption_distribution, the last BEYOND_CACHE_SIZE of them are kept """
+
+    def __init__(self, A: int, D: int, by_sea: bool = False, aggressivity=None):
+        self.A = A
+        self.D = D
+        self.by_sea = by_sea
+        self.aggressivity = aggressivity
+        self.transient = _get_transient_states(A, D, by_sea, aggressivity)
+        self.atta_end, self.defe_end, self.probs = get_absorption_distributions(A, D, by_sea, aggressivity)
+        self.cdf = numpy.cumsum(self.probs, axis=2)
+        self.wins = self.defe_end == 0
+        self.atta_order = numpy.argsort(self.atta_end, kind="stable")
+        self.defe_order = numpy.argsort(self.defe_end, kind="stable")
+
+    def distribution(self, a: int, d: int):
+        # End states (attacker's survivors, defender's survivors) and their probabilities
+        if a <= self.A and d <= self.D:
+            if self.transient[a, d]:
+                return self.atta_end, self.defe_end, self.probs[a, d]
+            return numpy.array([a]), numpy.array([d]), numpy.ones(1)
+        return _get_beyond_distribution(a, d, self.by_sea, self.aggressivity)
+
+    def win_probability(self, a: int, d: int):
+        atta_end, defe_end, probs = self.distribution(a, d)
+        return float(probs[defe_end == 0].sum())
+
+    def expected_survivors(self, a: int, d: int):
+        # Expected number of attacker's and defender's armies left when the battle ends
+        atta_end, defe_end, probs = self.distribution(a, d)
+        return float(probs @ atta_end), float(probs @ defe_end)
+
+    def quantile(self, a: int, d: int, q: float, side: str = "attacker"):
+        # Smallest number of survivors of `side` whose cumulative probability reaches q
+        atta_end, defe_end, probs = self.distribution(a, d)
+        ends = atta_end if side == "attacker" else defe_end
+        if ends is self.atta_end:
+            order = self.atta_order
+        elif ends is self.defe_end:
+            order = self.defe_order
+        else:
+            order = numpy.argsort(ends, kind="stable")
+        cdf = numpy.cumsum(probs[order])
+        i = min(numpy.searchsorted(cdf, q * cdf[-1]), len(order) - 1)
+        return int(ends[order[i]])
+
+    def sample(self, a: int, d: int, u: float):
+        # End state of the battle for a uniform draw u in [0, 1)
+        if a <= self.A and d <= self.D:
+            if not self.transient[a, d]:
+                return a, d
+            cdf = self.cdf[a, d]
+            i = min(numpy.searchsorted(cdf, u * cdf[-1], side="right"), len(cdf) - 1)
+            return int(self.atta_end[i]), int(self.defe_end[i])
+        atta_end, defe_end, probs = self.distribution(a, d)
+        i = min(numpy.searchsorted(numpy.cumsum(probs), u * probs.sum(), side="right"), len(probs) - 1)
+        return int(atta_end[i]), int(defe_end[i])
+
+    def sample_batch(self, a, d, u):
+        # End states of many battles at once, u: their uniform draws
+        a = numpy.asarray(a, dtype=numpy.int64)
+        d = numpy.asarray(d, dtype=numpy.int64)
+        u = numpy.asarray(u, dtype=numpy.float64)
+        atta_end, defe_end = a.copy(), d.copy()
+        inside = (a <= self.A) & (d <= self.D)
+        fight = numpy.zeros(a.shape, dtype=bool)
+        fight[inside] = self.transient[a[inside], d[inside]]
+        if fight.any():
+            cdf = self.cdf[a[fight], d[fight]]
+            i = numpy.minimum((cdf <= (u[fight] * cdf[:, -1])[:, None]).sum(axis=1), cdf.shape[1] - 1)
+            atta_end[fight] = self.atta_end[i]
+            defe_end[fight] = self.defe_end[i]
+        # Battles beyond the precomputed ones, one by one
+        for j in numpy.flatnonzero(~inside):
+            atta_end[j], defe_end[j] = self.sample(int(a[j]), int(d[j]), float(u[j]))
+        return atta_end, defe_end
+
+_battle_outcomes = {}
+
+def get_battle_outcomes(by_sea: bool = False, aggressivity=None, size: int = OUTCOMES_CACHE_SIZE):
+    # BattleOutcomes are shared by every model in the process, one per kind of battle
+    key = (by_sea, aggressivity, size)
+    if key not in _battle_outcomes:
+        _battle_outcomes[key] = BattleOutcomes(size, size, by_sea, aggressivity)
+    return _battle_outcomes[key]
+
+
 if __name__ == "__main__":
-    atta_wins_combact_by_sea = get_probabilities_combact_by_sea(150, 150)
-    atta_wins_combact = get_probabilities_ground_combact(150, 150)
-    if not os.path.exists('spqrisiko-abm/matrices'):
-        os.makedirs('spqrisiko-abm/matrices')
-    with open('spqrisiko-abm/matrices/atta_wins_combact_by_sea.pkl', 'wb') as f:
-        pickle.dump(atta_wins_combact_by_sea, f)
-    with open('spqrisiko-abm/matrices/atta_wins_combact.pkl', 'wb') as f:
-        pickle.dump(atta_wins_combact, f)
\ No newline at end of file
+    # Usage: python -m src.markov [dense|sparse] [armies]
+    # Rebuilds the tables shipped with the odds store (see odds.py) from scratch
+    from .odds import get_odds_store
+    solver = sys.argv[1] if len(sys.argv) > 1 else "sparse"
+    armies = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+    store = get_odds_store()
+    store.publish_table("combact_by_sea", get_probabilities_combact_by_sea(armies, armies, solver=solver))
+    store.publish_table("combact", get_probabilities_ground_combact(armies, armies, solver=solver))
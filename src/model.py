@@ -1,27 +1,41 @@
-import os
 import math
-import json
-import pandas
-import pickle
 import networkx as nx
-import random
-import collections, itertools
+import numpy
 
 from . import constants, strategies
-from .markov import get_probabilities_ground_combact, get_probabilities_combact_by_sea
+from .odds import get_combat_odds, GROUND, BY_SEA, NAVAL
 from .territory import GroundArea, SeaArea
+from .board import BoardState
+from . import registry
+from .frontier import AttackFrontier, SeaAttackQueue
+from .snapshot import take_snapshot, restore_snapshot, clone_model
+from .rollout import Lookahead
+from .cards import load_cards, full_deck, empty_hand, draw, add, materialize
+from .tris import get_tris_table, reinforces_from_tris, tris_name, get_reinforcements_score
 from .player import Player
+from .events import EventLog, GAME, COMBACT, REINFORCEMENT
+from .dice import make_dice
+from .profiling import PhaseProfile, run_phase, SCORING, REINFORCEMENT as REINFORCEMENT_PHASE, TRIS, NAVAL_COMBACT, \
+    COMBACT_BY_SEA, LOOKAHEAD, GROUND_COMBACT, ELIMINATION, MOVEMENT, DRAW, BATTLES, CANDIDATE_ATTACKS, NODES_VISITED
 from . import markov
 
 from operator import itemgetter
-from functools import cmp_to_key
 
 from mesa import Agent, Model
 from mesa.time import RandomActivation
-from mesa.batchrunner import BatchRunner
 from mesa.datacollection import DataCollector
 from mesa.space import NetworkGrid
 
+# A candidate attack: ids of the two ground areas, armies that must stay on the attacker's
+# area and probability that the attacker wins
+ATTACK_DTYPE = numpy.dtype([
+    ("attacker", numpy.int64),
+    ("defender", numpy.int64),
+    ("armies_to_leave", numpy.int64),
+    ("prob_win", numpy.float64),
+    ("power_place", numpy.bool_)
+])
+
 def get_winner(model):
     winner, _ = model.winner()
     return winner
@@ -40,17 +54,35 @@ def get_player_goal(model):
 class SPQRisiko(Model):
     """A SPQRisiko model with some number of players"""
 
-    def __init__(self, n_players, points_limit, strategy, goal):
+    def __init__(self, n_players, points_limit, strategy, goal, fast_combact=False, seed=None, events=None, debug=False,
+                 rollouts=0, rollout_turns=0, profile=False, dice_buffer=0):
+        # Every random draw of the game comes from self.random (see dice.py). Model.__new__ only
+        # seeds it with a seed given by keyword, so it is seeded again here
         super().__init__()
+        if seed is not None:
+            self.reset_randomizer(seed)
+        # The dice of the combacts, drawn by numpy in blocks of dice_buffer if > 0
+        self.dice = make_dice(self.random, dice_buffer)
+        # Silent unless an EventLog with some sink is given (see events.py)
+        self.events = events if events is not None else EventLog()
+        # Draw the end state of every battle at once instead of rolling the dice (see Player.fast_combact)
+        self.fast_combact = fast_combact
+        # Check the incremental counters against full scans of the board at every turn
+        self.debug = debug
+        # Players choose where to put their reinforcements and how much to attack by playing
+        # rollouts times every choice on, for rollout_turns turns of the next players (see rollout.py)
+        self.lookahead = Lookahead(rollouts, rollout_turns) if rollouts > 0 else None
+        # Time of every phase and counters of the work done, None unless asked (see profiling.py)
+        self.profile = PhaseProfile() if profile else None
         self.players_goals = ["BE", "LA", "PP"]  # Definition of acronyms on `strategies.py`
         self.current_turn = 0
         self.journal = []  # Keep track of main events
-        self.reinforces_by_goal = {}
-        self.tris_by_goal = {}
         # How many agent players wiil be
         self.n_players = n_players if n_players <= constants.MAX_PLAYERS else constants.MAX_PLAYERS
         # How many computer players will be
         self.n_computers = constants.MAX_PLAYERS - n_players
+        # Types of cards (the deck, the trash and the hands are counts of every type, see cards.py)
+        self.cards = load_cards()
         # Creation of player, goals and computer agents
         goals = []
         if goal == "Random":
@@ -69,34 +101,43 @@ class SPQRisiko(Model):
             for i in range(self.n_players, self.n_players + self.n_computers)]
         self.points_limit = points_limit  # limit at which one player wins
         self.deck = self.create_deck()
-        self.random.shuffle(self.deck)
-        self.trashed_cards = []
-        self.precompute_tris_reinforces_by_goal()
-        # Initialize map
-        self.G, self.territories_dict = self.create_graph_map()
-        self.grid = NetworkGrid(self.G)
-        self.datacollector = DataCollector(model_reporters={
-                                              "Winner": get_winner,
-                                              "Turn": get_winner_turn,
-                                              "Strategy": get_player_strategy,
-                                              "Goal": get_player_goal
-                                            })
+        self.trashed_cards = empty_hand(self.cards)
+        # Every tris and its score for every goal, shared with every other model (see tris.py)
+        self.tris_table = get_tris_table()
+        self.reinforces_by_goal = self.tris_table.reinforces_by_goal
+        self.tris_by_goal = self.tris_table.tris_by_goal
+        # Initialize map: the parsed map, its graph and its adjacency are shared with every
+        # other model (see registry.py), only the areas and the board belong to this game
+        self.map_config = registry.get_map()
+        self.territories_dict = self.map_config.territories_dict
+        # Neighbours of every area, split into ground and sea areas (see adjacency.py)
+        self.adjacency = self.map_config.adjacency
+        # Owner, armies, power places and trireme of every area (see board.py)
+        self.board = BoardState(self.map_config.graph.number_of_nodes(), self.n_players,
+                                self.players + self.computers, self.adjacency)
+        self.board.empires.profile = self.profile
+        model_reporters = {
+            "Winner": get_winner,
+            "Turn": get_winner_turn,
+            "Strategy": get_player_strategy,
+            "Goal": get_player_goal
+        }
+        if self.profile is not None:
+            model_reporters.update(PhaseProfile.reporters())
+        self.datacollector = DataCollector(model_reporters=model_reporters)
         # Schedule
         self.schedule = RandomActivation(self)
         # Subgraphs
         self.ground_areas = []
         self.sea_areas = []
+        # Created on first use (see grid)
+        self._grid = None
 
-        path = os.path.abspath((os.path.join(__file__, '..', '..')))
-        # Probabilities that the attacker wins on a ground combact
-        with open(path + '/matrices/atta_wins_combact.pkl', 'rb') as f:
-            self.atta_wins_combact = pickle.load(f)
-        # Probabilities that the attacker wins on a combact by sea
-        with open(path + '/matrices/atta_wins_combact_by_sea.pkl', 'rb') as f:
-            self.atta_wins_combact_by_sea = pickle.load(f)
+        # Probabilities that the attacker wins a combact, shared with every other model
+        self.odds = get_combat_odds()
 
         territories = list(range(45))
-        random.shuffle(territories)
+        self.random.shuffle(territories)
 
         """
         If there're 4 players, Italia must be owned by the only computer player
@@ -107,8 +148,7 @@ class SPQRisiko(Model):
                            (self.territories_dict["territories"][15]), model=self)
             t.armies = 3
             t.owner = self.computers[0]
-            self.grid.place_agent(t, 15)
-            self.ground_areas.append(self.grid.get_cell_list_contents([15])[0])
+            self.ground_areas.append(t)
 
         """ 
         Connect nodes to territories and assign them to players
@@ -122,8 +162,7 @@ class SPQRisiko(Model):
             else:
                 t.armies = 3
                 t.owner = self.computers[i % self.n_computers]
-            self.grid.place_agent(t, node)
-            self.ground_areas.append(self.grid.get_cell_list_contents([node])[0])
+            self.ground_areas.append(t)
 
         """
         Add sea area
@@ -132,11 +171,13 @@ class SPQRisiko(Model):
             t = SeaArea(*itemgetter("id", "name", "type", "coords")
                         (self.territories_dict["sea_areas"][i]), model=self)
             t.trireme = [0 for _ in range(self.n_players)]
-            self.grid.place_agent(t, node)
-            self.sea_areas.append(self.grid.get_cell_list_contents([node])[0])
+            self.sea_areas.append(t)
 
         self.ground_areas.sort(key=lambda x: x.unique_id)
         self.sea_areas.sort(key=lambda x: x.unique_id)
+        # Every area by id
+        self.areas = self.ground_areas + self.sea_areas
+        self.isles = frozenset(t.unique_id for t in self.ground_areas if t.type != "ground")
 
         self.running = True
         # self.datacollector.collect(self)
@@ -151,131 +192,81 @@ class SPQRisiko(Model):
     def get_movable_armies_by_strategy(strategy, minimum, maximum):
         return round((maximum - minimum) * strategies.nomads_percentage[strategy] + minimum)
 
+    @property
+    def grid(self):
+        # NetworkGrid of the areas, only needed to draw the map (see server.py): it is built
+        # on a copy of the shared graph the first time it is asked for
+        if self._grid is None:
+            self._grid = NetworkGrid(nx.Graph(self.map_config.graph))
+            for area in self.areas:
+                self._grid.place_agent(area, area.unique_id)
+        return self._grid
+
+    @property
+    def G(self):
+        return self.grid.G
+
     @staticmethod
     def create_graph_map():
-        # Read map configuration from file
-        with open(os.path.join(os.path.dirname(__file__), "config/territories.json"), "r") as f:
-            territories_dict = json.load(f)
+        # A new graph of the map and the parsed map (the shared ones are in registry.py)
+        map_config = registry.get_map()
+        return nx.Graph(map_config.graph), map_config.territories_dict
 
-        graph_map = nx.Graph()
+    def snapshot(self):
+        # The state of the game, to restore it later (see snapshot.py)
+        return take_snapshot(self)
 
-        for territory in territories_dict["territories"]:
-            graph_map.add_node(territory["id"])
-        for sea in territories_dict['sea_areas']:
-            graph_map.add_node(sea['id'])
-        for edges in territories_dict["edges"]:
-            graph_map.add_edge(edges[0], edges[1])
+    def restore(self, snapshot, rng=True):
+        restore_snapshot(self, snapshot, rng)
 
-        return graph_map, territories_dict
-
-    @staticmethod
-    def create_deck(custom_numbers=None):
-        # Read deck from configuration file
-        deck = []
-        with open(os.path.join(os.path.dirname(__file__), "config/cards.json"), "r") as f:
-            cards = json.load(f)
+    def clone(self):
+        # A new model in the same state, to play on from here
+        return clone_model(self)
 
+    def create_deck(self, custom_numbers=None):
+        # Number of cards of every type
         # custom cards' numbers
         if custom_numbers:
-            # do something
-            return deck
-        for card in cards:
-            c = {
-                "type": card["type"],
-                "adds_on_tris": card["adds_on_tris"],
-                "image": card["image"]
-            }
-            for _ in range(card["number_in_deck"]):
-                deck.append(c)
-
-        return deck
+            return list(custom_numbers)
+        return full_deck(self.cards)
 
     def draw_a_card(self):
         # if deck is empty, refill from trashed cards
-        if len(self.deck) == 0:
-            if len(self.trashed_cards) == 0:
+        if sum(self.deck) == 0:
+            if sum(self.trashed_cards) == 0:
                 # We finished cards, players must do some tris to refill deck!
                 return None
-            self.deck.extend(self.trashed_cards)
-            self.trashed_cards = []
+            self.deck = self.trashed_cards
+            self.trashed_cards = empty_hand(self.cards)
 
-        # return last card from deck
-        return self.deck.pop()
+        # type of a random card of the deck
+        return draw(self.deck, self.random)
+
+    def get_cards(self, player):
+        # The hand of player as card dicts, for a view
+        return materialize(player.cards, self.cards)
 
     @staticmethod
     def reinforces_from_tris(cards):
-        # assert len(cards) == 3, "Wrong number of cards given to 'tris' method"
-        if len(cards) != 3:
-            return None
-        cards_in_tris = set([card["type"] for card in cards])
-        # assert len(cards_in_tris) == 3 or len(cards_in_tris) == 1, \
-        # Tris must be composed of three different cards or three of the same type
-        if len(cards_in_tris) != 3 and len(cards_in_tris) != 1:
-            return None
-        reinforces = {
-            "legionaries": 8 if len(cards_in_tris) == 1 else 10,
-            "centers": 0,
-            "triremes": 0
-        }
-        for card in cards:
-            for key, value in card["adds_on_tris"].items():
-                reinforces[key] += value
-        return reinforces
-
-    def precompute_tris_reinforces_by_goal(self):
-        # precompute tris and assign points based on strategy
-        all_possible_tris = [list(t) for t in itertools.combinations(self.deck, 3)]
-        all_reinforces = [SPQRisiko.reinforces_from_tris(tris) for tris in all_possible_tris]
-        # Remove None from list
-        real_tris = [all_possible_tris[i] for i in range(len(all_reinforces)) if all_reinforces[i]]
-        all_reinforces = [i for i in all_reinforces if i]
-        named_tris = {}
-        for i, tris in enumerate(real_tris):
-            name = self.get_tris_name(tris)
-            named_tris[name] = all_reinforces[i]
-            self.reinforces_by_goal[name] = {}
-            for goal, value in strategies.strategies.items():
-                self.reinforces_by_goal[name][goal] = self.get_reinforcements_score(all_reinforces[i], value["tris"])
-
-        # order tris name by score
-        for goal, value in strategies.strategies.items():
-            self.tris_by_goal[goal] = []
-            for tris in real_tris:
-                name = self.get_tris_name(tris)
-                if name not in self.tris_by_goal[goal]:
-                    self.tris_by_goal[goal].append(name)
-            self.tris_by_goal[goal] = sorted(self.tris_by_goal[goal], key=cmp_to_key(lambda a, b: self.reinforces_by_goal[b][goal] - self.reinforces_by_goal[a][goal]))
-
-        self.reinforces_by_goal["average"] = {}
-        for goal, value in strategies.strategies.items():
-            points, count = 0, 0
-            for tris in real_tris:
-                count += 1
-                points += self.reinforces_by_goal[self.get_tris_name(tris)][goal]
-            self.reinforces_by_goal["average"][goal] = float(points) / count
+        return reinforces_from_tris(cards)
 
     def count_players_sea_areas(self):
-        sea_areas = [0] * self.n_players
-
-        for sea in self.sea_areas:
-            m = max(sea.trireme)
-            players_max_trireme = [player for player, n_trireme in enumerate(sea.trireme) if n_trireme == m]
-            if len(players_max_trireme) == 1:
-                sea_areas[players_max_trireme[0]] += 1
-
-        return sea_areas
+        # Sea areas in which a player has more trireme than anyone else
+        return self.board.sea_areas_per_player([sea.unique_id for sea in self.sea_areas])
 
     def count_players_territories_power_places(self):
-        territories = [0] * self.n_players
-        power_places = [0] * self.n_players
-
-        for territory in self.ground_areas:
-            if not territory.owner.computer:
-                territories[territory.owner.unique_id] += 1
-                if territory.power_place:
-                    power_places[territory.owner.unique_id] += 1
-        
-        return territories, power_places
+        return self.board.territories_per_player(), self.board.power_places_per_player()
+
+    def check_scoreboard(self):
+        # The counters of the scoreboard must be the same of a full scan of the board
+        expected = (
+            self.maximum_empires_by_search(),
+            *self.count_players_territories_power_places(),
+            self.count_players_sea_areas())
+        empires, territories, sea_areas, power_places = self.board.scoreboard.scores()
+        if (empires, territories, power_places, sea_areas) != expected:
+            raise AssertionError("scoreboard {} differs from the board {}".format(
+                (empires, territories, power_places, sea_areas), expected))
 
     def get_weakest_power_place(self, player):
         weakest = None
@@ -305,76 +296,52 @@ class SPQRisiko(Model):
         territory.found = 1
         visited = [territory]
         distances = [0] * 57
+        nearest = None
+        nodes = 0
 
-        while len(visited) > 0:
+        while len(visited) > 0 and nearest is None:
             t = visited.pop(0)
+            nodes += 1
             if distances[t.unique_id] > 4:
                 break
-            for neighbor in self.grid.get_neighbors(t.unique_id):
-                neighbor = self.grid.get_cell_list_contents([neighbor])[0]
+            for neighbor in self.adjacency.neighbors[t.unique_id]:
+                neighbor = self.areas[neighbor]
                 if neighbor.found == 0:
                     neighbor.found = 1
                     distances[neighbor.unique_id] = distances[t.unique_id] + 1
                     visited.append(neighbor)
                     if neighbor.type == "ground" and neighbor.owner.unique_id == player.unique_id:
-                        return neighbor
+                        nearest = neighbor
+                        break
 
-        return None
+        if self.profile is not None:
+            self.profile.count(NODES_VISITED, nodes)
+        return nearest
 
     def get_largest_empire(self, player):
-        # It's another DFS visit in which we account for the membership of a node to a connected component
-        def __dfs_visit__(territory, ground_areas, cc_num):
-            territory.found = 1
-            ground_areas[territory.unique_id] = cc_num
-            for neighbor in self.grid.get_neighbors(territory.unique_id):
-                neighbor = self.grid.get_cell_list_contents([neighbor])[0]
-                if neighbor.type == "ground" and \
-                   neighbor.found == 0 and \
-                   neighbor.owner.unique_id == player.unique_id:
-
-                    __dfs_visit__(neighbor, ground_areas, cc_num)
-
-        cc_num = 0
-        ground_areas = [-1] * 45
-
-        for territory in self.ground_areas:
-            territory.found = 0
-
-        for territory in self.ground_areas:
-            if territory.type == "ground" and territory.found == 0 and territory.owner.unique_id == player.unique_id:
-                __dfs_visit__(territory, ground_areas, cc_num)
-                cc_num += 1
-        
-        stats = list(collections.Counter([t for t in ground_areas if t != -1]).most_common())
-        if stats != []:
-            return [self.ground_areas[idx] for idx, cc in enumerate(ground_areas) if cc == stats[0][0]]
-        return stats
+        # Ground areas of the largest connected component of the player (see empires.py),
+        # isles excluded
+        return [self.ground_areas[node] for node in self.board.empires.largest_empire(player.unique_id, self.isles)]
 
     def maximum_empires(self):
-        # It's a DFS visit in which we account for
-        # the length of every connected components
-        def __dfs_visit__(territory, d):
-            territory.found = 1
-            for neighbor in self.grid.get_neighbors(territory.unique_id):
-                neighbor = self.grid.get_cell_list_contents([neighbor])[0]
-                if neighbor.type == "ground" and \
-                   neighbor.found == 0 and \
-                   neighbor.owner.unique_id == territory.owner.unique_id:
-                    
-                    d = __dfs_visit__(neighbor, d)
-            return d + 1
-        
-        cc_lengths = [0] * self.n_players
-
-        for territory in self.ground_areas:
-            territory.found = 0
+        # Length of the largest connected component of every player
+        return [self.board.empires.largest_size(player) for player in range(self.n_players)]
 
+    def maximum_empires_by_search(self):
+        # Same of maximum_empires, visiting the whole board (used to check the empires tracker)
+        cc_lengths = [0] * self.n_players
+        found = [False] * len(self.ground_areas)
         for territory in self.ground_areas:
-            if not territory.owner.computer and territory.found == 0:
-                distance = __dfs_visit__(territory, 0)
-                if distance > cc_lengths[territory.owner.unique_id]:
-                    cc_lengths[territory.owner.unique_id] = distance
-        
+            if not territory.owner.computer and not found[territory.unique_id]:
+                owner = territory.owner.unique_id
+                found[territory.unique_id] = True
+                component = [territory.unique_id]
+                for node in component:
+                    for neighbor in self.adjacency.ground_neighbors[node]:
+                        if not found[neighbor] and self.ground_areas[neighbor].owner.unique_id == owner:
+                            found[neighbor] = True
+                            component.append(neighbor)
+                cc_lengths[owner] = max(cc_lengths[owner], len(component))
         return cc_lengths
 
     # Controlla se `player` ha vinto oppure se c'è un vincitore tra tutti
@@ -396,345 +363,387 @@ class SPQRisiko(Model):
 
     def get_territories_by_player(self, player: Player, ground_type="ground"):
         if ground_type == "ground":
-            return [t for t in self.ground_areas if t.owner.unique_id == player.unique_id]
+            return [self.ground_areas[node] for node in self.board.nodes_of(player.unique_id)]
         elif ground_type == "sea":
             return [t for t in self.sea_areas if t.trireme[self.players.index(player)] > 0 or max(t.trireme) == 0]
 
     def get_sea_area_near_ground_area(self, player):
         sea_areas = []
         for sea_area in self.sea_areas:
-            for neighbor in self.grid.get_neighbors(sea_area.unique_id):
-                neighbor = self.grid.get_cell_list_contents([neighbor])[0]
-                if  isinstance(neighbor, GroundArea) and \
-                    neighbor.owner.unique_id == player.unique_id:
+            for neighbor in self.adjacency.ground_neighbors[sea_area.unique_id]:
+                neighbor = self.ground_areas[neighbor]
+                if neighbor.owner.unique_id == player.unique_id:
 
                     sea_areas.append(sea_area)
         return sea_areas
 
     def n_power_places(self):
-        n = 0
-        for area in self.ground_areas:
-            if area.power_place:
-                n += 1
-        return n
-
-    def update_atta_wins_combact_matrix(self, attacker_armies, defender_armies, mat_type='combact'):
-        print(attacker_armies, defender_armies, self.atta_wins_combact.shape, self.atta_wins_combact_by_sea.shape)
-        if mat_type == 'combact':
-            if attacker_armies > self.atta_wins_combact.shape[0] and defender_armies > self.atta_wins_combact.shape[1]:
-                self.atta_wins_combact = get_probabilities_ground_combact(attacker_armies, defender_armies)
-            elif attacker_armies > self.atta_wins_combact.shape[0]:
-                self.atta_wins_combact = get_probabilities_ground_combact(attacker_armies, self.atta_wins_combact.shape[1])
-            elif defender_armies > self.atta_wins_combact.shape[1]:
-                self.atta_wins_combact = get_probabilities_ground_combact(self.atta_wins_combact.shape[0], defender_armies)
-        elif mat_type == 'combact_by_sea':
-            if attacker_armies > self.atta_wins_combact_by_sea.shape[0] and defender_armies > self.atta_wins_combact_by_sea.shape[1]:
-                self.atta_wins_combact_by_sea = get_probabilities_combact_by_sea(attacker_armies, defender_armies)
-            elif attacker_armies > self.atta_wins_combact_by_sea.shape[0]:
-                self.atta_wins_combact_by_sea = get_probabilities_combact_by_sea(attacker_armies, self.atta_wins_combact_by_sea.shape[1])
-            elif defender_armies > self.atta_wins_combact_by_sea.shape[1]:
-                self.atta_wins_combact_by_sea = get_probabilities_combact_by_sea(self.atta_wins_combact_by_sea.shape[0], defender_armies)
+        return self.board.n_power_places()
 
     def step(self):
         self.current_turn += 1
+        self.events.turn = self.current_turn
         for player in self.players:
             if not player.eliminated:
-                can_draw = False
-                territories, power_places = self.count_players_territories_power_places()
-                player_territories = self.get_territories_by_player(player, "ground")
-                sea_areas = self.count_players_sea_areas()
-                empires = self.maximum_empires()
-
-                # 1) Aggiornamento del punteggio
-                player.update_victory_points(empires, territories, sea_areas, power_places)
-
-                # 1.1) Controllo vittoria
-                if self.winner(player):
-                    self.running = False
-                    print(player)
-                    print(get_winner(self))
-                    print(get_winner_turn(self))
-                    self.datacollector.collect(self)
-                    self.log("{} has won!".format(player.color))
+                if self.play_turn(player):
                     return True
-
-                # 2) Fase dei rinforzi
-                print('\nREINFORCES')
-                player.update_ground_reinforces_power_places()
-                reinforces = Player.get_ground_reinforces(player_territories)
-                self.log("{} earns {} legionaries (he owns {} territories)".format(player.color, reinforces, territories[player.unique_id]))
-                player.put_reinforces(self, reinforces)
-                # player.sacrifice_trireme(sea_area_from, ground_area_to)
-
-                # use card combination
-                # displace ground, naval and/or power places on the ground
-                tris = player.get_best_tris(self)
-
-                if tris:
-                    reinforces = player.play_tris(self, tris)
-                    self.log("{} play tris {}".format(player.color, self.get_tris_name(tris)))
-                    player.put_reinforces(self, reinforces)
-                    # TODO: log where reinforces are put
-
-                # 3) Movimento navale
-                # player.naval_movement(sea_area_from, sea_area_to, n_trireme)
-
-                # 4) Combattimento navale
-                print('\nNAVAL COMBACT!!')
-                # Get all sea_areas that the current player can attack
-                attackable_sea_areas = []
-                for sea_area in self.get_territories_by_player(player, ground_type='sea'):
-                    # Choose the adversary that has the lower probability of winning the combact
-                    min_trireme = min(sea_area.trireme)
-                    if min_trireme > 0:
-                        adv_min_trireme = sea_area.trireme.index(min_trireme)
-                        # Check if the atta_wins_combact probabilities matrix needs to be recomputed 
-                        # self.update_atta_wins_combact_matrix(sea_area.trireme[player.unique_id], sea_area.trireme[adv_min_trireme])
-                        row = sea_area.trireme[player.unique_id]
-                        col = sea_area.trireme[adv_min_trireme]
-                        m = max(row, col)
-                        ratio = 100 / m
-                        if ratio < 1:
-                            row = min(round(ratio * row), 100)
-                            col = min(round(ratio * col), 100)
-                        if  player.unique_id != adv_min_trireme and \
-                            self.atta_wins_combact[row - 1, col - 1] >= strategies.probs_win[player.strategy]:
-                            
-                            attackable_sea_areas.append([sea_area, adv_min_trireme])
-
-                for sea_area, adv in attackable_sea_areas:
-                    # Randomly select how many attack and defense trireme
-                    attacker_trireme = sea_area.trireme[player.unique_id]
-                    # The defender must always use the maximux number of armies to defend itself
-                    # n_defense_trireme = sea_area.trireme[adversary.unique_id] if sea_area.trireme[adversary.unique_id] <= 3 else 3
-                    # Let's combact biatch!!
-                    print('Start battle!')
-                    print('Trireme in ' + sea_area.name + ': ', sea_area.trireme)
-                    print('Player ' + str(player.unique_id) + ' attacks Player ' + str(adv) + ' on ' + sea_area.name)
-                    player.naval_combact(
-                        sea_area, 
-                        adv, 
-                        attacker_trireme, 
-                        strategies.probs_win[player.strategy],
-                        self.atta_wins_combact
-                    )
-
-                # 5) Attacchi via mare
-                print('\nCOMBACT BY SEA!!')
-                
-                for ground_area in self.ground_areas:
-                    ground_area.already_attacked_by_sea = False
-
-                attacks = self.get_attackable_ground_areas_by_sea(player)
-                # attacks.sort(key=lambda x: x["prob_win"], reverse=True)
-
-                while 0 < len(attacks):
-                    attack = attacks[0]
-                    # if not attack['defender'].already_attacked_by_sea:
-                    attack['defender'].already_attacked_by_sea = True
-                    attacker_armies = attack["attacker"].armies - attack["armies_to_leave"]            
-                    print('Battle: {} (player {}) with {} VS {} (player {}) with {}'.format(
-                            attack["attacker"].name, player.unique_id, attacker_armies,
-                            attack["defender"].name, attack["defender"].owner.unique_id, attack["defender"].armies
-                    ))
-                    conquered, min_moveable_armies = player.combact_by_sea(
-                                                        attack["attacker"], 
-                                                        attack["defender"], 
-                                                        attacker_armies
-                                                    )
-                    if conquered:
-                        # Move armies from attacker area to conquered
-                        max_moveable_armies = attack["attacker"].armies - attack["armies_to_leave"]
-                        nomads = SPQRisiko.get_movable_armies_by_strategy(player.strategy, min_moveable_armies, max_moveable_armies)
-                        attack["attacker"].armies -= nomads
-                        attack["defender"].armies = nomads
-                        can_draw = True
-                    # Remove from possible attacks all of those containing as defender the conquered territory
-                    # and update the probability
-                    attacks = self.update_attacks_by_sea(player, attacks)
-
-                # 6) Attacchi terrestri
-                print('\nGROUND COMBACT!!')
-                
-                attacks = []
-                attacks = self.get_attackable_ground_areas(player)
-                # attacks.sort(key=lambda x: x["prob_win"], reverse=True)
-
-                while 0 < len(attacks):
-                    attack = attacks[0]
-                    attacker_armies = attack["attacker"].armies - 1                
-                    print('Battle: {} (player {}) with {} VS {} (player {}) with {}'.format(
-                            attack["attacker"].name, player.unique_id, attacker_armies,
-                            attack["defender"].name, attack["defender"].owner.unique_id, attack["defender"].armies
-                    ))
-                    conquered, min_moveable_armies = player.combact(
-                                                            attack["attacker"], 
-                                                            attack["defender"], 
-                                                            attacker_armies, 
-                                                            strategies.probs_win[player.strategy],
-                                                            self.atta_wins_combact
-                                                    )
-                    if conquered:
-                        # Move armies from attacker area to conquered
-                        max_moveable_armies = attack["attacker"].armies - 1
-                        nomads = SPQRisiko.get_movable_armies_by_strategy(player.strategy, min_moveable_armies, max_moveable_armies)
-                        attack["attacker"].armies -= nomads
-                        attack["defender"].armies = nomads
-                        can_draw = True
-                        self.log("{} conquered {} from {} and it moves {} armies there out of {}".format(
-                            player.color, attack["defender"].name, attack["attacker"].name, nomads, max_moveable_armies))
-                    # Re-sort newly attackable areas with newer probabilities
-                    attacks = self.get_attackable_ground_areas(player)
-                    # attacks.sort(key=lambda x: x["prob_win"], reverse=True)
-                
-                # Controllo se qualche giocatore è stato eliminato
-                for adv in self.players:
-                    if adv.unique_id != player.unique_id and not adv.eliminated:
-                        territories = self.get_territories_by_player(adv)
-                        if len(territories) == 0:
-                            self.log("{} has been eliminated by {}".format(adv.color, player.color))
-                            player.cards.extend(adv.cards)
-                            adv.cards = []
-                            adv.eliminated = True
-                            for sea_area in self.get_territories_by_player(adv, ground_type="sea"):
-                                sea_area.trireme[adv.unique_id] = 0
-
-                # 7) Spostamento strategico di fine turno
-                player.move_armies_by_goal(self)
-
-                # 8) Presa della carta
-                # Il giocatore può dimenticarsi di pescare la carta ahah sarebbe bello fare i giocatori smemorati
-                if can_draw and random.random() <= 1:
-                    card = self.draw_a_card()
-                    if card:
-                        player.cards.append(card)
         self.schedule.step()
         return False
 
+    def phase_runner(self):
+        # The function running a phase, timing it if the model has a profile
+        return self.profile.run if self.profile is not None else run_phase
+
+    def play_turn(self, player):
+        # The phases of the turn of player, True if it wins
+        if self.debug:
+            self.check_scoreboard()
+        phase = self.phase_runner()
+        # 1) Aggiornamento del punteggio e controllo vittoria
+        if phase(SCORING, self.scoring_phase, player):
+            return True
+        # 2) Fase dei rinforzi
+        phase(REINFORCEMENT_PHASE, self.reinforcement_phase, player)
+        phase(TRIS, self.tris_phase, player)
+        # 3) Movimento navale
+        # player.naval_movement(sea_area_from, sea_area_to, n_trireme)
+        # 4) Combattimento navale
+        phase(NAVAL_COMBACT, self.naval_combact_phase, player)
+        # 5) Attacchi via mare
+        conquered_by_sea = phase(COMBACT_BY_SEA, self.combact_by_sea_phase, player)
+        # 6) Attacchi terrestri
+        aggressivity = None
+        if self.lookahead is not None and not player.computer:
+            # The one that has done best in the rollouts (see rollout.py)
+            aggressivity = phase(LOOKAHEAD, self.lookahead.choose_aggressivity, self, player, conquered_by_sea)
+        conquered = phase(GROUND_COMBACT, self.ground_combact_phase, player, aggressivity)
+        self.end_phase(player, conquered_by_sea or conquered)
+        return False
+
+    def scoring_phase(self, player):
+        empires, territories, sea_areas, power_places = self.board.scoreboard.scores()
+
+        # 1) Aggiornamento del punteggio
+        player.update_victory_points(empires, territories, sea_areas, power_places)
+
+        # 1.1) Controllo vittoria
+        if self.winner(player):
+            self.running = False
+            self.events.info(GAME, "Player {} wins at turn {}", player.unique_id, self.current_turn)
+            self.datacollector.collect(self)
+            self.log("{} has won!".format(player.color))
+            return True
+        return False
+
+    def reinforcement_phase(self, player):
+        self.events.debug(REINFORCEMENT, 'REINFORCES')
+        player.update_ground_reinforces_power_places()
+        territories = self.board.scoreboard.territories[player.unique_id]
+        reinforces = Player.get_ground_reinforces(territories)
+        self.log("{} earns {} legionaries (he owns {} territories)".format(player.color, reinforces, territories))
+        if self.lookahead is not None and not player.computer:
+            # Where the rollouts have done best (see rollout.py)
+            self.lookahead.put_reinforces(self, player, reinforces)
+        else:
+            player.put_reinforces(self, reinforces)
+        # player.sacrifice_trireme(sea_area_from, ground_area_to)
+
+    def tris_phase(self, player):
+        # use card combination
+        # displace ground, naval and/or power places on the ground
+        tris = player.get_best_tris(self)
+
+        if tris:
+            reinforces = player.play_tris(self, tris)
+            self.log("{} play tris {}".format(player.color, tris))
+            player.put_reinforces(self, reinforces)
+            # TODO: log where reinforces are put
+
+    def naval_combact_phase(self, player):
+        self.events.debug(COMBACT, 'NAVAL COMBACT!!')
+        # Get all sea_areas that the current player can attack
+        attackable_sea_areas = []
+        for sea_area in self.get_territories_by_player(player, ground_type='sea'):
+            # Choose the adversary that has the lower probability of winning the combact
+            min_trireme = min(sea_area.trireme)
+            if min_trireme > 0:
+                adv_min_trireme = sea_area.trireme.index(min_trireme)
+                prob_win = self.odds.prob_win(NAVAL, sea_area.trireme[player.unique_id], sea_area.trireme[adv_min_trireme])
+                if  player.unique_id != adv_min_trireme and \
+                    prob_win >= strategies.probs_win[player.strategy]:
+                    
+                    attackable_sea_areas.append([sea_area, adv_min_trireme])
+
+        for sea_area, adv in attackable_sea_areas:
+            # Randomly select how many attack and defense trireme
+            attacker_trireme = sea_area.trireme[player.unique_id]
+            # The defender must always use the maximux number of armies to defend itself
+            # n_defense_trireme = sea_area.trireme[adversary.unique_id] if sea_area.trireme[adversary.unique_id] <= 3 else 3
+            # Let's combact biatch!!
+            self.events.debug(COMBACT, 'Start battle!')
+            self.events.debug(COMBACT, 'Trireme in {}: {}', sea_area.name, sea_area.trireme)
+            self.events.debug(COMBACT, 'Player {} attacks Player {} on {}', player.unique_id, adv, sea_area.name)
+            player.naval_combact(
+                sea_area, 
+                adv, 
+                attacker_trireme, 
+                strategies.probs_win[player.strategy]
+            )
+        if self.profile is not None:
+            self.profile.count(BATTLES, len(attackable_sea_areas))
+
+    def combact_by_sea_phase(self, player):
+        # True if player has conquered some area
+        self.events.debug(COMBACT, 'COMBACT BY SEA!!')
+        conquered_any = False
+
+        for ground_area in self.ground_areas:
+            ground_area.already_attacked_by_sea = False
+
+        attacks = self.get_attackable_ground_areas_by_sea(player)
+        # attacks.sort(key=lambda x: x["prob_win"], reverse=True)
+        # Updated after every battle instead of sorted again (see frontier.py)
+        queue = SeaAttackQueue(self, player, attacks)
+        # In debug mode, also the old list of attacks, to check the queue against it
+        reference = attacks.copy() if self.debug else None
+        attack = self.next_sea_attack(queue, reference)
+        battles = 0
+
+        while attack is not None:
+            attacker = self.ground_areas[attack["attacker"]]
+            defender = self.ground_areas[attack["defender"]]
+            armies_to_leave = int(attack["armies_to_leave"])
+            # if not defender.already_attacked_by_sea:
+            defender.already_attacked_by_sea = True
+            attacker_armies = attacker.armies - armies_to_leave
+            self.events.debug(COMBACT, 'Battle: {} (player {}) with {} VS {} (player {}) with {}',
+                    attacker.name, player.unique_id, attacker_armies,
+                    defender.name, defender.owner.unique_id, defender.armies)
+            conquered, min_moveable_armies = player.combact_by_sea(
+                                                attacker, 
+                                                defender, 
+                                                attacker_armies
+                                            )
+            battles += 1
+            if conquered:
+                # Move armies from attacker area to conquered
+                max_moveable_armies = attacker.armies - armies_to_leave
+                nomads = SPQRisiko.get_movable_armies_by_strategy(player.strategy, min_moveable_armies, max_moveable_armies)
+                attacker.armies -= nomads
+                defender.armies = nomads
+                conquered_any = True
+            # Remove from possible attacks all of those containing as defender the conquered territory
+            # and update the probability
+            queue.update()
+            if reference is not None:
+                reference = self.update_attacks_by_sea(player, reference)
+            attack = self.next_sea_attack(queue, reference)
+        if self.profile is not None:
+            self.profile.count(BATTLES, battles)
+            self.profile.count(CANDIDATE_ATTACKS, queue.scored)
+        return conquered_any
+
+    def ground_combact_phase(self, player, aggressivity=None):
+        # True if player has conquered some area. aggressivity: lowest probability to win of
+        # an attack, the one of the strategy if None
+        self.events.debug(COMBACT, 'GROUND COMBACT!!')
+        conquered_any = False
+        if aggressivity is None:
+            aggressivity = strategies.probs_win[player.strategy]
+        
+        # Candidate attacks, rescored around the areas of every battle (see frontier.py)
+        frontier = AttackFrontier(self, player, aggressivity)
+        attack = self.next_ground_attack(player, frontier)
+        battles = 0
+
+        while attack is not None:
+            attacker = self.ground_areas[attack[0]]
+            defender = self.ground_areas[attack[1]]
+            attacker_armies = attacker.armies - 1
+            self.events.debug(COMBACT, 'Battle: {} (player {}) with {} VS {} (player {}) with {}',
+                    attacker.name, player.unique_id, attacker_armies,
+                    defender.name, defender.owner.unique_id, defender.armies)
+            conquered, min_moveable_armies = player.combact(
+                                                    attacker, 
+                                                    defender, 
+                                                    attacker_armies, 
+                                                    aggressivity
+                                            )
+            battles += 1
+            if conquered:
+                # Move armies from attacker area to conquered
+                max_moveable_armies = attacker.armies - 1
+                nomads = SPQRisiko.get_movable_armies_by_strategy(player.strategy, min_moveable_armies, max_moveable_armies)
+                attacker.armies -= nomads
+                defender.armies = nomads
+                conquered_any = True
+                self.log("{} conquered {} from {} and it moves {} armies there out of {}".format(
+                    player.color, defender.name, attacker.name, nomads, max_moveable_armies))
+            # Re-sort newly attackable areas with newer probabilities
+            frontier.update(attacker.unique_id, defender.unique_id)
+            attack = self.next_ground_attack(player, frontier)
+        if self.profile is not None:
+            self.profile.count(BATTLES, battles)
+            self.profile.count(CANDIDATE_ATTACKS, frontier.scored)
+        return conquered_any
+
+    def end_phase(self, player, can_draw):
+        phase = self.phase_runner()
+        phase(ELIMINATION, self.elimination_phase, player)
+        # 7) Spostamento strategico di fine turno
+        phase(MOVEMENT, player.move_armies_by_goal, self)
+        phase(DRAW, self.draw_phase, player, can_draw)
+
+    def elimination_phase(self, player):
+        # Controllo se qualche giocatore è stato eliminato
+        for adv in self.players:
+            if adv.unique_id != player.unique_id and not adv.eliminated:
+                territories = self.get_territories_by_player(adv)
+                if len(territories) == 0:
+                    self.log("{} has been eliminated by {}".format(adv.color, player.color))
+                    add(player.cards, adv.cards)
+                    adv.cards = empty_hand(self.cards)
+                    adv.eliminated = True
+                    for sea_area in self.get_territories_by_player(adv, ground_type="sea"):
+                        sea_area.trireme[adv.unique_id] = 0
+
+    def draw_phase(self, player, can_draw):
+        # 8) Presa della carta
+        # Il giocatore può dimenticarsi di pescare la carta ahah sarebbe bello fare i giocatori smemorati
+        if can_draw and self.random.random() <= 1:
+            card = self.draw_a_card()
+            if card is not None:
+                player.cards[card] += 1
+
+    def next_ground_attack(self, player, frontier):
+        attack = frontier.best()
+        if self.debug:
+            # The same first attack of a full search
+            attacks = self.get_attackable_ground_areas(player, frontier.aggressivity)
+            expected = (int(attacks[0]["attacker"]), int(attacks[0]["defender"])) if len(attacks) > 0 else None
+            if attack != expected:
+                raise AssertionError("attack frontier chose {} instead of {}".format(attack, expected))
+        return attack
+
+    def next_sea_attack(self, queue, reference=None):
+        i = queue.first()
+        attack = queue.attacks[i] if i is not None else None
+        if reference is not None:
+            # The same first attack of update_attacks_by_sea
+            chosen = tuple(attack[["attacker", "defender", "armies_to_leave"]].tolist()) if attack is not None else None
+            expected = tuple(reference[0][["attacker", "defender", "armies_to_leave"]].tolist()) if len(reference) > 0 else None
+            if chosen != expected:
+                raise AssertionError("sea attack queue chose {} instead of {}".format(chosen, expected))
+        return attack
+
     def update_attacks_by_sea(self, player, future_attacks):
-        attack_num = 0
-        last_attacker = future_attacks[0]['attacker']
-        del future_attacks[0]
-        while attack_num < len(future_attacks):
-            attack = future_attacks[attack_num]
-            if attack['defender'].owner.unique_id == player.unique_id:
-                print('Since the defender has been conquered, I delete it')
-                del future_attacks[attack_num]
-            elif attack['defender'].already_attacked_by_sea:
-                print('Since the defender has already been attacked by sea, I delete it')
-                del future_attacks[attack_num]
-            elif attack['attacker'].unique_id == last_attacker.unique_id:
-                print('The attacker may attack again')
+        last_attacker = self.ground_areas[future_attacks[0]['attacker']]
+        future_attacks = future_attacks[1:].copy()
+        keep = numpy.ones(len(future_attacks), dtype=bool)
+        for attack_num, attack in enumerate(future_attacks):
+            attacker = self.ground_areas[attack['attacker']]
+            defender = self.ground_areas[attack['defender']]
+            if defender.owner.unique_id == player.unique_id:
+                self.events.debug(COMBACT, 'Since the defender has been conquered, I delete it')
+                keep[attack_num] = False
+            elif defender.already_attacked_by_sea:
+                self.events.debug(COMBACT, 'Since the defender has already been attacked by sea, I delete it')
+                keep[attack_num] = False
+            elif attacker.unique_id == last_attacker.unique_id:
+                self.events.debug(COMBACT, 'The attacker may attack again')
                 # Maybe it could change the armies to leave due to garrisons
-                armies_to_leave = self.get_armies_to_leave(attack['attacker'])
-                if attack['attacker'].armies - armies_to_leave >= min(3, attack['defender'].armies):
-                    prob_win = self.atta_wins_combact_by_sea[attack['attacker'].armies - armies_to_leave - 1, attack['defender'].armies - 1]
+                armies_to_leave = self.get_armies_to_leave(attacker)
+                if attacker.armies - armies_to_leave >= min(3, defender.armies):
+                    prob_win = self.odds.prob_win(BY_SEA, attacker.armies - armies_to_leave, defender.armies)
                     if prob_win >= strategies.probs_win[player.strategy]:
-                        print('The attacker can attack again')
+                        self.events.debug(COMBACT, 'The attacker can attack again')
                         attack['prob_win'] = prob_win
-                        attack_num += 1
                     else:
-                        print('Since the attacker has a lower prob to win, I delete it')
-                        del future_attacks[attack_num]
+                        self.events.debug(COMBACT, 'Since the attacker has a lower prob to win, I delete it')
+                        keep[attack_num] = False
                 else:
-                    print('Since the attacker hasn\'t the min required armies, I delete it')
-                    del future_attacks[attack_num]
-            else:
-                attack_num += 1    
+                    self.events.debug(COMBACT, 'Since the attacker hasn\'t the min required armies, I delete it')
+                    keep[attack_num] = False
+        return SPQRisiko.sort_attacks(player, future_attacks[keep])
+
+    @staticmethod
+    def make_attacks(player, odds, kind, attackers, defenders, armies_to_leave, aggressivity=None):
+        """ Candidate attacks as a structured array (see ATTACK_DTYPE) of those in which
+        the player has at least the probability to win required by its strategy (or aggressivity),
+        in the order in which it will try them. All the probabilities are gathered at once """
+        if aggressivity is None:
+            aggressivity = strategies.probs_win[player.strategy]
+        attacks = numpy.zeros(len(attackers), dtype=ATTACK_DTYPE)
+        if len(attackers) == 0:
+            return attacks
+        attacks["attacker"] = [t.unique_id for t in attackers]
+        attacks["defender"] = [t.unique_id for t in defenders]
+        attacks["armies_to_leave"] = armies_to_leave
+        attacks["power_place"] = [t.power_place for t in defenders]
+        attacks["prob_win"] = odds.prob_win_batch(
+            kind,
+            [t.armies for t in attackers] - attacks["armies_to_leave"],
+            [t.armies for t in defenders])
+        return SPQRisiko.sort_attacks(player, attacks[attacks["prob_win"] >= aggressivity])
+
+    @staticmethod
+    def sort_attacks(player, attacks):
+        # Stable sort, by decreasing power place (PP goal only) and probability to win
         if player.goal == "PP":
-            future_attacks.sort(key=lambda x: (x['defender'].power_place, x['prob_win']), reverse=True)
-        else: 
-            future_attacks.sort(key=lambda x: x['prob_win'], reverse=True)
-        return future_attacks
-                
+            order = numpy.lexsort((-attacks["prob_win"], ~attacks["power_place"]))
+        else:
+            order = numpy.argsort(-attacks["prob_win"], kind="stable")
+        return attacks[order]
+
     def get_attackable_ground_areas_by_sea(self, player):
-        attacks = []
+        attackers, defenders, armies_to_leave = [], [], []
         for ground_area in self.get_territories_by_player(player):
-            for neighbor in self.grid.get_neighbors(ground_area.unique_id):
-                neighbor = self.grid.get_cell_list_contents([neighbor])[0]
+            for neighbor in self.adjacency.sea_neighbors[ground_area.unique_id]:
+                neighbor = self.areas[neighbor]
                 # A player can attack a ground area through sea, only if it posesses a number of
                 # trireme greater than the possible adversary. 
-                if isinstance(neighbor, SeaArea) and neighbor.trireme[player.unique_id] > min(neighbor.trireme):
-                    for sea_area_neighbor in self.grid.get_neighbors(neighbor.unique_id):
-                        sea_area_neighbor = self.grid.get_cell_list_contents([sea_area_neighbor])[0]
-                        if isinstance(sea_area_neighbor, GroundArea) and \
-                           ground_area.unique_id != sea_area_neighbor.unique_id and \
+                if neighbor.trireme[player.unique_id] > min(neighbor.trireme):
+                    for sea_area_neighbor in self.adjacency.ground_neighbors[neighbor.unique_id]:
+                        sea_area_neighbor = self.ground_areas[sea_area_neighbor]
+                        if ground_area.unique_id != sea_area_neighbor.unique_id and \
                            sea_area_neighbor.owner.unique_id != player.unique_id and \
                            (sea_area_neighbor.owner.computer or neighbor.trireme[player.unique_id] > neighbor.trireme[sea_area_neighbor.owner.unique_id]):
                             
-                            armies_to_leave = self.get_armies_to_leave(ground_area)
-                            if ground_area.armies - armies_to_leave >= min(3, sea_area_neighbor.armies):
-                                # self.update_atta_wins_combact_matrix(ground_area.armies - armies_to_leave, sea_area_neighbor.armies, mat_type='combact_by_sea')
-                                row = ground_area.armies - armies_to_leave
-                                col = sea_area_neighbor.armies
-                                m = max(row, col)
-                                ratio = 100 / m
-                                if ratio < 1:
-                                    row = min(round(ratio * row), 100)
-                                    col = min(round(ratio * col), 100)
-                                prob_win = self.atta_wins_combact_by_sea[row - 1, col - 1]
-                                if prob_win >= strategies.probs_win[player.strategy]:
-                                    attacks.append({
-                                        "defender": sea_area_neighbor,
-                                        "attacker": ground_area,
-                                        "armies_to_leave": armies_to_leave,
-                                        "prob_win": prob_win
-                                    })
-        if player.goal == "PP":
-            attacks.sort(key=lambda x: (x['defender'].power_place, x['prob_win']), reverse=True)
-        else: 
-            attacks.sort(key=lambda x: x['prob_win'], reverse=True)
-        return attacks
+                            leave = self.get_armies_to_leave(ground_area)
+                            if ground_area.armies - leave >= min(3, sea_area_neighbor.armies):
+                                attackers.append(ground_area)
+                                defenders.append(sea_area_neighbor)
+                                armies_to_leave.append(leave)
+        return SPQRisiko.make_attacks(player, self.odds, BY_SEA, attackers, defenders, armies_to_leave)
 
     def get_armies_to_leave(self, ground_area):
-        ground_area_neighbors = self.grid.get_neighbors(ground_area.unique_id)
-        for ground_area_neighbor in ground_area_neighbors:
-            ground_area_neighbor = self.grid.get_cell_list_contents([ground_area_neighbor])[0]
-            if isinstance(ground_area_neighbor, GroundArea) and \
-               ground_area_neighbor.owner.unique_id != ground_area.owner.unique_id:
+        for ground_area_neighbor in self.adjacency.ground_neighbors[ground_area.unique_id]:
+            ground_area_neighbor = self.ground_areas[ground_area_neighbor]
+            if ground_area_neighbor.owner.unique_id != ground_area.owner.unique_id:
                 
                 return 2
         
         return 1
     
     def get_attackable_ground_areas_from(self, ground_area):
-        attacks = []
+        # Territories that can be attacked from ground_area, before looking at the odds
+        defenders = []
         if ground_area.armies > 1:
-            for neighbor in self.grid.get_neighbors(ground_area.unique_id):
-                neighbor = self.grid.get_cell_list_contents([neighbor])[0]
-                if neighbor.type == "ground" and \
-                    neighbor.owner.unique_id != ground_area.owner.unique_id and \
+            for neighbor in self.adjacency.ground_neighbors[ground_area.unique_id]:
+                neighbor = self.ground_areas[neighbor]
+                if neighbor.owner.unique_id != ground_area.owner.unique_id and \
                     ground_area.armies - 1 >= min(3, neighbor.armies):
                     
-                    # self.update_atta_wins_combact_matrix(ground_area.armies - 1, neighbor.armies)
-                    row = ground_area.armies - 1
-                    col = neighbor.armies
-                    m = max(row, col)
-                    ratio = 100 / m
-                    if ratio < 1:
-                        row = min(round(ratio * row), 100)
-                        col = min(round(ratio * col), 100)
-                    prob_win = self.atta_wins_combact[row - 1, col - 1]
-                    if prob_win >= strategies.probs_win[ground_area.owner.strategy]:
-                        attacks.append({
-                            "defender": neighbor,
-                            "attacker": ground_area,
-                            "prob_win": prob_win
-                        })
-        return attacks
+                    defenders.append(neighbor)
+        return defenders
     
-    def get_attackable_ground_areas(self, player):
-        attacks = []
+    def get_attackable_ground_areas(self, player, aggressivity=None):
+        attackers, defenders = [], []
         for ground_area in self.get_territories_by_player(player):
-            attackables = self.get_attackable_ground_areas_from(ground_area)
-            if attackables != []:
-                for attackable in attackables:
-                    attacks.append(attackable)
-        if player.goal == "PP":
-            attacks.sort(key=lambda x: (x['defender'].power_place, x['prob_win']), reverse=True)
-        else: 
-            attacks.sort(key=lambda x: x['prob_win'], reverse=True)
-        return attacks
+            for defender in self.get_attackable_ground_areas_from(ground_area):
+                attackers.append(ground_area)
+                defenders.append(defender)
+        return SPQRisiko.make_attacks(player, self.odds, GROUND, attackers, defenders, 1, aggressivity)
 
     # Get non attackable areas wiht at least 2 armies and with an ally neighbor
     def non_attackable_areas(self, player, territories=None):
@@ -743,13 +752,13 @@ class SPQRisiko(Model):
             territories = self.get_territories_by_player(player)
         for ground_area in territories:
             if ground_area.armies > 1:
-                attackable, has_ally_neighbor = False, False
-                for neighbor in self.grid.get_neighbors(ground_area.unique_id):
-                    neighbor = self.grid.get_cell_list_contents([neighbor])[0]
-                    if neighbor.type == "ground" and neighbor.owner.unique_id != player.unique_id:
+                attackable = False
+                # Any neighbour (even a sea area) which is not an adversary's
+                has_ally_neighbor = len(self.adjacency.neighbors[ground_area.unique_id]) > 0
+                for neighbor in self.adjacency.ground_neighbors[ground_area.unique_id]:
+                    if self.ground_areas[neighbor].owner.unique_id != player.unique_id:
                         attackable = True
                         break
-                    has_ally_neighbor = True
 
                 if not attackable and has_ally_neighbor:
                     non_attackables.append(ground_area)
@@ -757,23 +766,22 @@ class SPQRisiko(Model):
         return non_attackables
 
     def is_not_attackable(self, area):
-        for neighbor in self.grid.get_neighbors(area.unique_id):
-            neighbor = self.grid.get_cell_list_contents([neighbor])[0]
-            if isinstance(neighbor, GroundArea) and neighbor.owner.unique_id != area.owner.unique_id:
+        for neighbor in self.adjacency.ground_neighbors[area.unique_id]:
+            if self.ground_areas[neighbor].owner.unique_id != area.owner.unique_id:
                 return False
         return True
 
     def get_strongest_ally_neighbor(self, area):
         strongest = None
-        for neighbor in self.grid.get_neighbors(area.unique_id):
-            neighbor = self.grid.get_cell_list_contents([neighbor])[0]
-            if isinstance(neighbor, GroundArea) and (not strongest or strongest.armies < neighbor.armies):
+        for neighbor in self.adjacency.ground_neighbors[area.unique_id]:
+            neighbor = self.ground_areas[neighbor]
+            if not strongest or strongest.armies < neighbor.armies:
                 strongest = neighbor
         return strongest
 
     def is_neighbor_of(self, area1, area2):
-        for neighbor in self.grid.get_neighbors(area1.unique_id):
-            neighbor = self.grid.get_cell_list_contents([neighbor])[0]
+        for neighbor in self.adjacency.neighbors[area1.unique_id]:
+            neighbor = self.areas[neighbor]
             if neighbor.owner.unique_id == area2.unique_id:
                 return True
 
@@ -781,6 +789,7 @@ class SPQRisiko(Model):
 
     def log(self, log):
         self.journal.append("Turn {}: ".format(self.current_turn) + log)
+        self.events.info(GAME, log)
 
     def run_model(self, n):
         for _ in range(n):
@@ -790,40 +799,14 @@ class SPQRisiko(Model):
     def get_tris_name(self, tris):
         if len(tris) != 3:
             raise Exception("tris name parameter error")
-        return "-".join([card[0] for card in sorted(set([card["type"] for card in tris]))])
+        return tris_name([card["type"] for card in tris])
 
     def get_reinforcements_score(self, reinforces, multipliers):
-        m, r = multipliers, reinforces
-        return m[0]*r["legionaries"] + m[1]*r["triremes"] + m[2]*r["centers"]
+        return get_reinforcements_score(reinforces, multipliers)
 
     def get_n_armies_by_player(self, player=None):
+        armies = self.board.armies_per_owner()
         if player is not None:
-            return sum([t.armies for t in self.get_territories_by_player(player)])
+            return armies[player.unique_id]
         else:
-            sum_a = 0
-            for player in self.players:
-                sum_a += sum([t.armies for t in self.get_territories_by_player(player)])
-            return sum_a / len(self.players)
-
-# parameter lists for each parameter to be tested in batch run
-# n_players, points_limit, strategy, goal
-br_params = {"n_players": [3],
-             "points_limit": [150],
-             "strategy": ["Random"],
-             "goal": ["PP", "BE", "LA"]}
-
-br = BatchRunner(SPQRisiko,
-                 br_params,
-                 iterations=200,
-                 max_steps=1000,
-                 model_reporters={"Data Collector": lambda m: m.datacollector})
-
-if __name__ == '__main__':
-    br.run_all()
-    br_df = br.get_model_vars_dataframe()
-    br_step_data = pandas.DataFrame()
-    for i in range(len(br_df["Data Collector"])):
-        if isinstance(br_df["Data Collector"][i], DataCollector):
-            i_run_data = br_df["Data Collector"][i].get_model_vars_dataframe()
-            br_step_data = br_step_data.append(i_run_data, ignore_index=True)
-    br_step_data.to_csv("diff_strat_same_goal_150.csv")
\ No newline at end of file
+            return sum(armies[:self.n_players]) / len(self.players)
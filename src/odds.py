@@ -0,0 +1,275 @@
+import os
+import math
+import json
+import numpy
+import tempfile
+
+from .markov import get_atta_wins_by_recurrence, extend_atta_wins_by_recurrence
+
+""" On-disk store of the atta_wins tables (the probability that the attacker wins a battle
+starting from (a, d), at [a-1, d-1]). Every table is a .npy file opened as a read-only
+memory map, so all the models of a process share the same array and all the processes
+share the same pages. The tables shipped with the code (matrices, with the header odds.json
+recording the store version and the shape of every table) are only read by the games: a
+table is extended in blocks, computing only the new rows and columns, whenever a query
+falls outside of it, and the extended table is written to the cache (matrices/cache, not
+tracked), with a header of its own. Only python -m src.markov replaces the shipped tables """
+
+STORE_VERSION = 1
+STORE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'matrices'))
+# Tables grow to the next multiple of BLOCK_SIZE armies
+BLOCK_SIZE = 50
+# Directory of STORE_PATH (not tracked) where the extended tables are written
+CACHE_DIR = "cache"
+
+# Kind of table: whether it is a combact by sea
+TABLES = {
+    "combact": False,
+    "combact_by_sea": True
+}
+
+
+class OddsStore(object):
+
+    def __init__(self, path: str = STORE_PATH, block_size: int = BLOCK_SIZE, cache_path: str = None):
+        # path: the tables shipped with the code, only read; cache_path: where the tables
+        # extended by the games are written
+        self.path = path
+        self.cache_path = cache_path if cache_path is not None else os.path.join(path, CACHE_DIR)
+        self.block_size = block_size
+        self.tables = {}
+        self.metadata = self.read_metadata()
+
+    def metadata_path(self):
+        return os.path.join(self.path, "odds.json")
+
+    def table_path(self, kind, cached: bool = False):
+        return os.path.join(self.cache_path if cached else self.path, "atta_wins_{}.npy".format(kind))
+
+    def header_path(self, kind):
+        # Every table of the cache has its own header, so processes extending different tables
+        # never overwrite each other's
+        return os.path.join(self.cache_path, "atta_wins_{}.json".format(kind))
+
+    def read_metadata(self):
+        try:
+            with open(self.metadata_path(), "r") as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            metadata = None
+        if not metadata or metadata.get("version") != STORE_VERSION:
+            metadata = {"version": STORE_VERSION, "tables": {}}
+        return metadata
+
+    def read_header(self, kind):
+        try:
+            with open(self.header_path(kind), "r") as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return header if header.get("version") == STORE_VERSION else None
+
+    def header(self, kind, table):
+        return {"version": STORE_VERSION, "by_sea": TABLES[kind], "dtype": str(table.dtype)}
+
+    def write_atomically(self, directory, path, write):
+        # Readers keep on mapping the old file until they reopen it
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            # mkstemp creates the file readable by its owner only
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def load(self, kind):
+        # The largest of the table of the cache and of the one shipped with the code, None if neither is there
+        tables = []
+        if self.read_header(kind) is not None and os.path.exists(self.table_path(kind, cached=True)):
+            tables.append(numpy.load(self.table_path(kind, cached=True), mmap_mode="r"))
+        header = self.metadata["tables"].get(kind)
+        if header is not None and os.path.exists(self.table_path(kind)):
+            table = numpy.load(self.table_path(kind), mmap_mode="r")
+            if list(table.shape) == header["shape"]:
+                tables.append(table)
+        return max(tables, key=lambda table: table.size) if tables else None
+
+    def table(self, kind: str):
+        # The current table, computing its first block if there is none
+        if kind not in self.tables:
+            table = self.load(kind)
+            if table is None:
+                table = self.create_table(kind)
+            self.tables[kind] = table
+        return self.tables[kind]
+
+    def create_table(self, kind):
+        table = get_atta_wins_by_recurrence(self.block_size, self.block_size, TABLES[kind])
+        return self.save_table(kind, table)
+
+    def save_table(self, kind, table):
+        # Writes table to the cache, unless another process has written a larger one in the meanwhile
+        try:
+            os.makedirs(self.cache_path, exist_ok=True)
+            current = self.load(kind)
+            if current is not None and current.shape[0] >= table.shape[0] and current.shape[1] >= table.shape[1]:
+                return current
+            self.write_atomically(self.cache_path, self.table_path(kind, cached=True), lambda f: numpy.save(f, table))
+            header = json.dumps(self.header(kind, table), indent=2).encode()
+            self.write_atomically(self.cache_path, self.header_path(kind), lambda f: f.write(header))
+            table = numpy.load(self.table_path(kind, cached=True), mmap_mode="r")
+        except OSError:
+            # Read-only cache: keep the table in memory for this process only
+            table.setflags(write=False)
+        return table
+
+    def publish_table(self, kind, table):
+        # Replaces the table shipped with the code (see markov.py), the games only read it
+        self.metadata = self.read_metadata()
+        self.metadata["tables"][kind] = {"shape": list(table.shape), "by_sea": TABLES[kind], "dtype": str(table.dtype)}
+        self.write_atomically(self.path, self.table_path(kind), lambda f: numpy.save(f, table))
+        metadata = json.dumps(self.metadata, indent=2).encode()
+        self.write_atomically(self.path, self.metadata_path(), lambda f: f.write(metadata))
+        self.tables.pop(kind, None)
+
+    def ensure(self, kind: str, attacker_armies: int, defender_armies: int):
+        # A table with at least attacker_armies rows and defender_armies columns
+        table = self.table(kind)
+        A, D = table.shape
+        if attacker_armies <= A and defender_armies <= D:
+            return table
+        # Another process may have extended the table in the meanwhile
+        del self.tables[kind]
+        table = self.table(kind)
+        A, D = table.shape
+        if attacker_armies > A or defender_armies > D:
+            new_A = max(A, -(-attacker_armies // self.block_size) * self.block_size)
+            new_D = max(D, -(-defender_armies // self.block_size) * self.block_size)
+            table = extend_atta_wins_by_recurrence(table, new_A, new_D, TABLES[kind])
+            table = self.tables[kind] = self.save_table(kind, table)
+        return table
+
+_stores = {}
+
+def get_odds_store(path: str = STORE_PATH):
+    # One store per path and process, shared by every model
+    if path not in _stores:
+        _stores[path] = OddsStore(path)
+    return _stores[path]
+
+
+""" Every battle goes through CombatOdds: exact probabilities from the store up to
+EXACT_LIMIT armies (a table is grown in blocks the first time a battle exceeds it),
+a normal approximation beyond. With both sides throwing three dice the defender bears
+a fraction MU of the armies lost, with a variance SIGMA2 per army lost, so after the
+A + D losses that end the battle the attacker has won if the defender lost at least D:
+
+    P(win) ~ Phi((MU * (A + D) - D + c) / sqrt(SIGMA2 * (A + D)))
+
+where c accounts for the last rolls, thrown with fewer dice. Against the exact tables
+(see validate_approximation) the error is below 0.0032 for 100 <= A, D <= 1000 and below
+0.0017 for 500 <= A, D <= 1000, on both ground and by sea combacts """
+
+GROUND = "ground"
+BY_SEA = "by_sea"
+NAVAL = "naval"
+
+# A naval combact follows the same rules of a ground combact
+KIND_TABLES = {
+    GROUND: "combact",
+    BY_SEA: "combact_by_sea",
+    NAVAL: "combact"
+}
+
+EXACT_LIMIT = 1000
+
+MU = (12348 + 2 * 10017 + 3 * 6420) / 46656 / 3
+SIGMA2 = ((12348 + 4 * 10017 + 9 * 6420) / 46656 - (3 * MU) ** 2) / 3
+# Offsets fitted on the exact tables
+APPROXIMATION_OFFSET = {
+    "combact": 0.38,
+    "combact_by_sea": 0.48
+}
+
+
+class CombatOdds(object):
+
+    def __init__(self, store: OddsStore = None, exact_limit: int = EXACT_LIMIT):
+        self.store = store if store is not None else get_odds_store()
+        self.exact_limit = exact_limit
+        self.tables = {}
+        for kind, table in KIND_TABLES.items():
+            self.tables[kind] = self.store.table(table).view(numpy.ndarray)
+
+    def prob_win(self, kind: str, attacker_armies: int, defender_armies: int):
+        # Probability that the attacker wins a battle of the given kind
+        if attacker_armies <= 0:
+            return 0.0
+        if defender_armies <= 0:
+            return 1.0
+        table = self.tables[kind]
+        if attacker_armies > table.shape[0] or defender_armies > table.shape[1]:
+            if attacker_armies > self.exact_limit or defender_armies > self.exact_limit:
+                return self.approximate_prob_win(kind, attacker_armies, defender_armies)
+            table = self.grow(kind, attacker_armies, defender_armies)
+        return table.item(attacker_armies - 1, defender_armies - 1)
+
+    def prob_win_batch(self, kind: str, attacker_armies, defender_armies):
+        # prob_win of many battles of the same kind, gathered from the table at once
+        attacker_armies = numpy.asarray(attacker_armies, dtype=numpy.int64)
+        defender_armies = numpy.asarray(defender_armies, dtype=numpy.int64)
+        probs = numpy.zeros(attacker_armies.shape)
+        if attacker_armies.size == 0:
+            return probs
+        # As prob_win, an attacker without armies loses whatever the defender has
+        probs[(attacker_armies > 0) & (defender_armies <= 0)] = 1.0
+        battles = (attacker_armies > 0) & (defender_armies > 0)
+        beyond = battles & ((attacker_armies > self.exact_limit) | (defender_armies > self.exact_limit))
+        exact = battles & ~beyond
+        if exact.any():
+            table = self.tables[kind]
+            max_attacker, max_defender = attacker_armies[exact].max(), defender_armies[exact].max()
+            if max_attacker > table.shape[0] or max_defender > table.shape[1]:
+                table = self.grow(kind, max_attacker, max_defender)
+            probs[exact] = table[attacker_armies[exact] - 1, defender_armies[exact] - 1]
+        if beyond.any():
+            probs[beyond] = [
+                self.approximate_prob_win(kind, a, d)
+                for a, d in zip(attacker_armies[beyond], defender_armies[beyond])]
+        return probs
+
+    def grow(self, kind, attacker_armies, defender_armies):
+        table = self.store.ensure(KIND_TABLES[kind], attacker_armies, defender_armies).view(numpy.ndarray)
+        for other, other_table in KIND_TABLES.items():
+            if other_table == KIND_TABLES[kind]:
+                self.tables[other] = table
+        return table
+
+    @staticmethod
+    def approximate_prob_win(kind: str, attacker_armies: int, defender_armies: int):
+        if attacker_armies <= 0:
+            return 0.0
+        if defender_armies <= 0:
+            return 1.0
+        losses = attacker_armies + defender_armies
+        z = (MU * losses - defender_armies + APPROXIMATION_OFFSET[KIND_TABLES[kind]]) / math.sqrt(2 * SIGMA2 * losses)
+        return 0.5 * (1 + math.erf(z))
+
+    def validate_approximation(self, kind: str, armies=range(100, 1001, 25)):
+        # Largest error of the approximation on a grid of exact battles
+        table = self.grow(kind, max(armies), max(armies))
+        return max(
+            abs(self.approximate_prob_win(kind, a, d) - table.item(a - 1, d - 1))
+            for a in armies for d in armies)
+
+
+_combat_odds = {}
+
+def get_combat_odds(path: str = STORE_PATH):
+    # One CombatOdds per store, shared by every model
+    if path not in _combat_odds:
+        _combat_odds[path] = CombatOdds(get_odds_store(path))
+    return _combat_odds[path]
@@ -1,11 +1,13 @@
 import math
-import random
 import operator
-import itertools
 
 from .strategies import strategies, probs_win
 from . import constants
-from .markov import get_probabilities_ground_combact
+from .odds import GROUND, NAVAL
+from .markov import get_battle_outcomes
+from .events import COMBACT, REINFORCEMENT, SCORING
+from .profiling import DICE_ROUNDS
+from .cards import empty_hand
 from .territory import GroundArea, SeaArea
 from mesa import Agent
 
@@ -21,7 +23,8 @@ class Player(Agent):
         self.color = constants.COLORS[unique_id %
                                       constants.MAX_PLAYERS]  # one color per id
         self.goal = goal
-        self.cards = []
+        # Number of cards of every type (see cards.py)
+        self.cards = empty_hand(model.cards)
         self.strategy = strategy
         super().__init__(unique_id,  model)
 
@@ -46,13 +49,14 @@ class Player(Agent):
         # print('sea_areas_per_players', sea_areas_per_players)
         # print('power_places: ', power_places)
 
+        events = self.model.events
         m = max(cc_lengths)
         if m >= 4:
             players_max_empire = [
                 player for player, n_territories
                 in enumerate(cc_lengths) if n_territories == m]
             if len(players_max_empire) == 1 and players_max_empire[0] == self.unique_id:
-                print('Player ' + str(self.unique_id) + ' gets one victory point for having the maximum empire')
+                events.debug(SCORING, 'Player {} gets one victory point for having the maximum empire', self.unique_id)
                 self.victory_points += 1
 
         m = max(territories_per_players)
@@ -60,7 +64,7 @@ class Player(Agent):
             player for player, n_territories
             in enumerate(territories_per_players) if n_territories == m]
         if len(players_max_territories) == 1 and players_max_territories[0] == self.unique_id:
-            print('Player ' + str(self.unique_id) + ' gets one victory point for having the max number of ground areas')
+            events.debug(SCORING, 'Player {} gets one victory point for having the max number of ground areas', self.unique_id)
             self.victory_points += 1
 
         m = max(sea_areas_per_players)
@@ -68,20 +72,20 @@ class Player(Agent):
             player for player, n_sea_areas
             in enumerate(sea_areas_per_players) if n_sea_areas == m]
         if len(players_max_sea_areas) == 1 and players_max_sea_areas[0] == self.unique_id:
-            print('Player ' + str(self.unique_id) + ' gets one victory point for having the max number of sea areas')
+            events.debug(SCORING, 'Player {} gets one victory point for having the max number of sea areas', self.unique_id)
             self.victory_points += 1
 
         if power_places[self.unique_id] > 0:
-            print('Player ' + str(self.unique_id) + ' gets ' + str(power_places[self.unique_id]) + ' victory points from power places')
+            events.debug(SCORING, 'Player {} gets {} victory points from power places', self.unique_id, power_places[self.unique_id])
         
         self.victory_points += power_places[self.unique_id]
-        print('Victory points: ', self.victory_points)
+        events.debug(SCORING, 'Victory points: {}', self.victory_points)
 
     @staticmethod
-    def get_ground_reinforces(territories):
-        if len(territories) > 11:
-            ground_reinforces = math.floor(len(territories) / 3)
-        elif len(territories) >= 3:
+    def get_ground_reinforces(n_territories: int):
+        if n_territories > 11:
+            ground_reinforces = math.floor(n_territories / 3)
+        elif n_territories >= 3:
             ground_reinforces = 3
         else:
             ground_reinforces = 1
@@ -92,7 +96,7 @@ class Player(Agent):
         for territory in self.model.ground_areas:
             # territory = self.model.grid.get_cell_list_contents([territory['id']])[0]
             if territory.owner == self.unique_id and territory.power_place:
-                print('Player ' + str(self.unique_id) + ' got one legionary for power place in ' + territory.name)
+                self.model.events.debug(REINFORCEMENT, 'Player {} got one legionary for power place in {}', self.unique_id, territory.name)
                 territory.armies += 1
 
     def sacrifice_trireme(
@@ -116,56 +120,55 @@ class Player(Agent):
         sea_area: SeaArea, 
         adv, 
         attacker_trireme, 
-        aggressivity,
-        atta_wins):
+        aggressivity):
 
-        row = attacker_trireme
-        col = sea_area.trireme[adv]
-        m = max(row, col)
-        ratio = 100 / m
-        if ratio < 1:
-            row = min(round(ratio * row), 100)
-            col = min(round(ratio * col), 100)
+        if self.model.fast_combact:
+            return self.fast_naval_combact(sea_area, adv, attacker_trireme, aggressivity)
 
+        odds = self.model.odds
+        dice = self.model.dice
+        events = self.model.events
+        verbose = events.enabled(COMBACT)
+        rounds = 0
         while min(3, attacker_trireme) >= min(3, sea_area.trireme[adv]) and \
-                atta_wins[attacker_trireme - 1, sea_area.trireme[adv] - 1] >= aggressivity and \
+                odds.prob_win(NAVAL, attacker_trireme, sea_area.trireme[adv]) >= aggressivity and \
                 attacker_trireme > 0 and \
                 sea_area.trireme[adv] > 0:
             
-            attacker_dice_outcome = sorted([random.randint(1,6) for _ in range(min(3, attacker_trireme))], reverse=True)
-            defender_dice_outcome = sorted([random.randint(1,6) for _ in range(min(3, sea_area.trireme[adv]))], reverse=True)
-
-            print('Player ' + str(self.unique_id) + ' attacks with ' + str(attacker_trireme) + ' trireme.')
-            print('Player ' + str(adv) + ' defends with ' + str(sea_area.trireme[adv]) + ' trireme.')
-            print('Attacker outcome: ', attacker_dice_outcome)
-            print('Defender outcome: ', defender_dice_outcome)
+            rounds += 1
+            attacker_dice_outcome = dice.roll(min(3, attacker_trireme))
+            defender_dice_outcome = dice.roll(min(3, sea_area.trireme[adv]))
+
+            if verbose:
+                events.debug(COMBACT, 'Player {} attacks with {} trireme.', self.unique_id, attacker_trireme)
+                events.debug(COMBACT, 'Player {} defends with {} trireme.', adv, sea_area.trireme[adv])
+                events.debug(COMBACT, 'Attacker outcome: {}', attacker_dice_outcome)
+                events.debug(COMBACT, 'Defender outcome: {}', defender_dice_outcome)
             
             outcomes = list(map(operator.gt, attacker_dice_outcome, defender_dice_outcome))
             for outcome in outcomes:
                 if outcome:
                     sea_area.trireme[adv] -= 1
-                    print('Defender lose one army')
+                    if verbose:
+                        events.debug(COMBACT, 'Defender lose one army')
                 else:
                     sea_area.trireme[self.unique_id] -= 1
                     attacker_trireme -= 1
-                    print('Attacker lose one army')
-            
-            row = attacker_trireme
-            col = sea_area.trireme[adv]
-            m = max(row, col)
-            ratio = 100 / m
-            if ratio < 1:
-                row = min(round(ratio * row), 100)
-                col = min(round(ratio * col), 100)
+                    if verbose:
+                        events.debug(COMBACT, 'Attacker lose one army')
 
+        if self.model.profile is not None:
+            self.model.profile.count(DICE_ROUNDS, rounds)
+        if not verbose:
+            return
         if sea_area.trireme[adv] <= 0:
-            print('Defender has lost all of its trireme!')
+            events.debug(COMBACT, 'Defender has lost all of its trireme!')
         elif attacker_trireme <= 0:
-            print('Attacker lost the battle!')
-        elif atta_wins[attacker_trireme - 1, sea_area.trireme[adv] - 1] < aggressivity:
-            print('The attacker has a probability of ' + str(atta_wins[attacker_trireme - 1, sea_area.trireme[adv] - 1]) + ', and is less than ' + str(aggressivity))
+            events.debug(COMBACT, 'Attacker lost the battle!')
+        elif odds.prob_win(NAVAL, attacker_trireme, sea_area.trireme[adv]) < aggressivity:
+            events.debug(COMBACT, 'The attacker has a probability of {}, and is less than {}', odds.prob_win(NAVAL, attacker_trireme, sea_area.trireme[adv]), aggressivity)
         elif min(3, attacker_trireme) < min(3, sea_area.trireme[adv]):
-            print('Attacker must attack with a number of trireme that are greater or equal to the number of defender\'s trireme. Combact done!')
+            events.debug(COMBACT, 'Attacker must attack with a number of trireme that are greater or equal to the number of defender\'s trireme. Combact done!')
     
     def combact_by_sea(
         self, 
@@ -173,34 +176,47 @@ class Player(Agent):
         ground_area_to: GroundArea,
         attacker_armies: int):
 
+        if self.model.fast_combact:
+            return self.fast_combact(ground_area_from, ground_area_to, attacker_armies, by_sea=True)
+
         conquered = False
+        dice = self.model.dice
+        events = self.model.events
+        verbose = events.enabled(COMBACT)
 
+        rounds = 0
         while attacker_armies > 0 and ground_area_to.armies > 0:
             
-            attacker_dice_outcome = sorted([random.randint(1,6) for _ in range(min(3, attacker_armies))], reverse=True)
-            defender_dice_outcome = sorted([random.randint(1,6) for _ in range(min(3, ground_area_to.armies))], reverse=True)
-
-            print('Player ' + str(self.unique_id) + ' attacks with ' + str(attacker_armies) + ' armies. Maximux armies: ' + str(ground_area_from.armies))
-            print('Player ' + str(ground_area_to.owner.unique_id) + ' defends with ' + str(ground_area_to.armies) + ' armies.')
-            print('Attacker outcome: ', attacker_dice_outcome)
-            print('Defender outcome: ', defender_dice_outcome)
+            rounds += 1
+            attacker_dice_outcome = dice.roll(min(3, attacker_armies))
+            defender_dice_outcome = dice.roll(min(3, ground_area_to.armies))
+
+            if verbose:
+                events.debug(COMBACT, 'Player {} attacks with {} armies. Maximux armies: {}', self.unique_id, attacker_armies, ground_area_from.armies)
+                events.debug(COMBACT, 'Player {} defends with {} armies.', ground_area_to.owner.unique_id, ground_area_to.armies)
+                events.debug(COMBACT, 'Attacker outcome: {}', attacker_dice_outcome)
+                events.debug(COMBACT, 'Defender outcome: {}', defender_dice_outcome)
             
             outcomes = list(map(operator.gt, attacker_dice_outcome, defender_dice_outcome))
             for outcome in outcomes:
                 if outcome:
                     ground_area_to.armies -= 1
-                    print('Defender lose one army')
+                    if verbose:
+                        events.debug(COMBACT, 'Defender lose one army')
                 else:
                     ground_area_from.armies -= 1
                     attacker_armies -= 1
-                    print('Attacker lose one army')
+                    if verbose:
+                        events.debug(COMBACT, 'Attacker lose one army')
 
+        if self.model.profile is not None:
+            self.model.profile.count(DICE_ROUNDS, rounds)
         if ground_area_to.armies <= 0:
-            print('Defender has lost the area!')
+            events.debug(COMBACT, 'Defender has lost the area!')
             ground_area_to.owner = ground_area_from.owner
             conquered = True
         elif attacker_armies <= 0:
-            print('Attacker lost the battle!')
+            events.debug(COMBACT, 'Attacker lost the battle!')
 
         return conquered, min(3, attacker_armies)
 
@@ -209,99 +225,132 @@ class Player(Agent):
         ground_area_from:GroundArea,
         ground_area_to: GroundArea,
         attacker_armies: int,
-        aggressivity,
-        atta_wins):
+        aggressivity):
 
-        conquered = False
+        if self.model.fast_combact:
+            return self.fast_combact(ground_area_from, ground_area_to, attacker_armies, aggressivity=aggressivity)
 
-        row = attacker_armies
-        col = ground_area_to.armies
-        m = max(row, col)
-        ratio = 100 / m
-        if ratio < 1:
-            row = min(round(ratio * row), 100)
-            col = min(round(ratio * col), 100)
+        conquered = False
+        odds = self.model.odds
+        dice = self.model.dice
+        events = self.model.events
+        verbose = events.enabled(COMBACT)
 
+        rounds = 0
         while min(3, attacker_armies) >= min(3, ground_area_to.armies) and \
-                atta_wins[row - 1, col - 1] >= aggressivity and \
+                odds.prob_win(GROUND, attacker_armies, ground_area_to.armies) >= aggressivity and \
                 attacker_armies > 0 and \
                 ground_area_to.armies > 0:
             
-            attacker_dice_outcome = sorted([random.randint(1,6) for _ in range(min(3, attacker_armies))], reverse=True)
-            defender_dice_outcome = sorted([random.randint(1,6) for _ in range(min(3, ground_area_to.armies))], reverse=True)
-
-            print('Player ' + str(self.unique_id) + ' attacks with ' + str(attacker_armies) + ' armies. Maximux armies: ' + str(ground_area_from.armies))
-            print('Player ' + str(ground_area_to.owner.unique_id) + ' defends with ' + str(ground_area_to.armies) + ' armies.')
-            print('Attacker outcome: ', attacker_dice_outcome)
-            print('Defender outcome: ', defender_dice_outcome)
+            rounds += 1
+            attacker_dice_outcome = dice.roll(min(3, attacker_armies))
+            defender_dice_outcome = dice.roll(min(3, ground_area_to.armies))
+
+            if verbose:
+                events.debug(COMBACT, 'Player {} attacks with {} armies. Maximux armies: {}', self.unique_id, attacker_armies, ground_area_from.armies)
+                events.debug(COMBACT, 'Player {} defends with {} armies.', ground_area_to.owner.unique_id, ground_area_to.armies)
+                events.debug(COMBACT, 'Attacker outcome: {}', attacker_dice_outcome)
+                events.debug(COMBACT, 'Defender outcome: {}', defender_dice_outcome)
             
             outcomes = list(map(operator.gt, attacker_dice_outcome, defender_dice_outcome))
             for outcome in outcomes:
                 if outcome:
                     ground_area_to.armies -= 1
-                    print('Defender lose one army')
+                    if verbose:
+                        events.debug(COMBACT, 'Defender lose one army')
                 else:
                     ground_area_from.armies -= 1
                     attacker_armies -= 1
-                    print('Attacker lose one army')
-            
-            row = attacker_armies
-            col = ground_area_to.armies
-            m = max(row, col)
-            ratio = 100 / m
-            if ratio < 1:
-                row = min(round(ratio * row), 100)
-                col = min(round(ratio * col), 100)
+                    if verbose:
+                        events.debug(COMBACT, 'Attacker lose one army')
 
+        if self.model.profile is not None:
+            self.model.profile.count(DICE_ROUNDS, rounds)
         if ground_area_to.armies <= 0:
-            print('Defender has lost the area!')
+            events.debug(COMBACT, 'Defender has lost the area!')
             ground_area_to.owner = ground_area_from.owner
             conquered = True
         elif attacker_armies <= 0:
-            print('Attacker lost the battle!')
-        elif atta_wins[attacker_armies - 1, ground_area_to.armies - 1] < aggressivity:
-            print('The attacker has a probability of ' + str(atta_wins[attacker_armies - 1, ground_area_to.armies - 1]) + ', and is less than ' + str(aggressivity))
+            events.debug(COMBACT, 'Attacker lost the battle!')
+        elif not verbose:
+            pass
+        elif odds.prob_win(GROUND, attacker_armies, ground_area_to.armies) < aggressivity:
+            events.debug(COMBACT, 'The attacker has a probability of {}, and is less than {}', odds.prob_win(GROUND, attacker_armies, ground_area_to.armies), aggressivity)
         elif min(3, attacker_armies) < min(3, ground_area_to.armies):
-            print('Attacker must attack with a number of armies that are greater or equal to the number of defender\'s armies. Combact done!')
+            events.debug(COMBACT, 'Attacker must attack with a number of armies that are greater or equal to the number of defender\'s armies. Combact done!')
 
         return conquered, min(3, attacker_armies)
 
+    """
+    Fast combact: instead of rolling the dice round by round, the end state of the battle
+    is drawn at once from the absorption distribution of the same chain (see
+    markov.BattleOutcomes), in which the attacker also stops when it would have to throw
+    fewer dice than the defender or when its probability to win drops below its
+    aggressivity. The end states have the same distribution of the dice loops above
+    """
+
+    def fast_combact(
+        self,
+        ground_area_from: GroundArea,
+        ground_area_to: GroundArea,
+        attacker_armies: int,
+        aggressivity=None,
+        by_sea=False):
+
+        outcomes = get_battle_outcomes(by_sea=by_sea, aggressivity=aggressivity)
+        atta_end, defe_end = outcomes.sample(attacker_armies, ground_area_to.armies, self.model.random.random())
+        events = self.model.events
+        events.debug(COMBACT, 'Player {} attacks with {} armies and is left with {}', self.unique_id, attacker_armies, atta_end)
+        events.debug(COMBACT, 'Player {} defends with {} armies and is left with {}', ground_area_to.owner.unique_id, ground_area_to.armies, defe_end)
+        ground_area_from.armies -= attacker_armies - atta_end
+        ground_area_to.armies = defe_end
+
+        conquered = False
+        if defe_end <= 0:
+            events.debug(COMBACT, 'Defender has lost the area!')
+            ground_area_to.owner = ground_area_from.owner
+            conquered = True
+        elif atta_end <= 0:
+            events.debug(COMBACT, 'Attacker lost the battle!')
+
+        return conquered, min(3, atta_end)
+
+    def fast_naval_combact(self,
+        sea_area: SeaArea,
+        adv,
+        attacker_trireme,
+        aggressivity):
+
+        outcomes = get_battle_outcomes(aggressivity=aggressivity)
+        atta_end, defe_end = outcomes.sample(attacker_trireme, sea_area.trireme[adv], self.model.random.random())
+        events = self.model.events
+        events.debug(COMBACT, 'Player {} attacks with {} trireme and is left with {}', self.unique_id, attacker_trireme, atta_end)
+        events.debug(COMBACT, 'Player {} defends with {} trireme and is left with {}', adv, sea_area.trireme[adv], defe_end)
+        sea_area.trireme[self.unique_id] -= attacker_trireme - atta_end
+        sea_area.trireme[adv] = defe_end
+
     def play_tris(self, model, tris):
-        reinforces = model.reinforces_from_tris(tris)
+        # tris: name of the tris
+        reinforces = dict(model.tris_table.reinforces[tris])
         # remove cards from player and put in trash deck
-        for card in tris:
-            card = self.cards.pop([i for i, n in enumerate(self.cards) if n["type"] == card["type"]][0])
-            model.trashed_cards.append(card)
+        for i, n in enumerate(model.tris_table.counts[tris]):
+            self.cards[i] -= n
+            model.trashed_cards[i] += n
         return reinforces
 
     def get_best_tris(self, model):
-        if len(self.cards) < 3:
+        # Name of the tris to play, if any
+        if sum(self.cards) < 3:
             return None
-        best_tris = None
-        # Get all possible reinforces combination from tris from cards
-        all_tris = [list(t) for t in itertools.combinations(self.cards, 3)]
-        all_reinforces = [model.reinforces_from_tris(tris) for tris in all_tris]
-
-        # Remove None from list
-        real_tris = [all_tris[i] for i in range(len(all_reinforces)) if all_reinforces[i]]
-        all_reinforces = [i for i in all_reinforces if i]
-        if len(all_reinforces) == 0:
+        # The tris with the highest score for the goal among those of the hand (see tris.py)
+        name = model.tris_table.best_tris(self.cards, self.goal)
+        if name is None:
             return None
 
-        named_tris = []
-        for tris in real_tris:
-            named_tris.append(model.get_tris_name(tris))
-        highest_score = 0
-        i = -1
-        for i, name in enumerate(named_tris):
-            score = model.reinforces_by_goal[name][self.goal]
-            if highest_score < score:
-                index = i
-                highest_score = score
-
-        best_tris = real_tris[i]
         # Play tris if it is a convenient tris (it is in the first half of tris ordered by score)
-        return best_tris if model.tris_by_goal[self.goal].index(model.get_tris_name(tris)) <= len(model.tris_by_goal[self.goal]) / 2 else None
+        if model.tris_table.rank(name, self.goal) > len(model.tris_by_goal[self.goal]) / 2:
+            return None
+        return name
 
     def move_armies_by_goal(self, model):
         if self.goal == "PP":  # Reinforce power place territory by moving armies to it
@@ -347,9 +396,9 @@ class Player(Agent):
     # "Neutral" -> random
     def move_armies_strategy_based(self, model, area_from):
         attackable_neighbors = []
-        for neighbor in model.grid.get_neighbors(area_from.unique_id):
-            neighbor = model.grid.get_cell_list_contents([neighbor])[0]
-            if isinstance(neighbor, GroundArea) and neighbor.owner.unique_id != area_from.owner.unique_id:
+        for neighbor in model.adjacency.ground_neighbors[area_from.unique_id]:
+            neighbor = model.ground_areas[neighbor]
+            if neighbor.owner.unique_id != area_from.owner.unique_id:
                 if not model.is_not_attackable(neighbor, self):
                     attackable_neighbors.append(neighbor)
         if len(attackable_neighbors) == 0:
@@ -359,7 +408,7 @@ class Player(Agent):
         if self.strategy == "Aggressive":
             area_to = attackable_neighbors[0]
         elif self.strategy == "Neutral":
-            area_to = random.choice(attackable_neighbors)
+            area_to = model.random.choice(attackable_neighbors)
         else:
             area_to = attackable_neighbors[-1]
 
@@ -414,7 +463,7 @@ class Player(Agent):
                             territories[i % len(territories)].trireme[self.unique_id] += armies
                             armies -= armies
 
-                print('Player ' + str(self.unique_id) + ' gets ' + str(armies) + ' triremes')
+                model.events.debug(REINFORCEMENT, 'Player {} gets {} triremes', self.unique_id, armies)
         else:
             territories = model.get_territories_by_player(self, "ground")
             if len(territories) > 0:
@@ -495,9 +544,8 @@ class Player(Agent):
                         border = []
                         # Get all the territories on the border
                         for ground_area in max_empire:
-                            for neighbor in model.grid.get_neighbors(ground_area.unique_id):
-                                neighbor = model.grid.get_cell_list_contents([neighbor])[0]
-                                if  isinstance(neighbor, GroundArea) and neighbor.owner.unique_id != self.unique_id:
+                            for neighbor in model.adjacency.ground_neighbors[ground_area.unique_id]:
+                                if model.ground_areas[neighbor].owner.unique_id != self.unique_id:
                                     border.append(ground_area)
                                     break
                         if border != []:
@@ -517,7 +565,7 @@ class Player(Agent):
                                     border[i % len(border)].armies += armies
                                     armies -= armies 
 
-                    print('Player ' + str(self.unique_id) + ' gets ' + str(armies) + ' armies')
+                    model.events.debug(REINFORCEMENT, 'Player {} gets {} armies', self.unique_id, armies)
                 else:  # Put Power place by goal
                     # at max 12 power places
                     if model.n_power_places() >= 12:
@@ -539,4 +587,4 @@ class Player(Agent):
                                     highest_armies_territory = terr
                             if highest_armies_territory:
                                 highest_armies_territory.power_place = True
-                    print('Player ' + str(self.unique_id) + ' gets a power place')
\ No newline at end of file
+                    model.events.debug(REINFORCEMENT, 'Player {} gets a power place', self.unique_id)
\ No newline at end of file
@@ -0,0 +1,129 @@
+import sys
+import time
+import argparse
+import functools
+
+""" Opt-in instrumentation of SPQRisiko.step: the wall time of every phase of the turns and
+counters of the work done in them. A model built with profile=True has a PhaseProfile,
+which runs every phase through PhaseProfile.run and adds its timings and counters to the
+DataCollector (so they are collected with the winner at the end of the game); without it
+(the default) model.profile is None, the phases are called directly and the hot loops
+only check model.profile once, when they are done, to add what they have counted.
+
+    python -m src.profiling --games 10 --n-players 4
+
+plays some games with a profile and prints the summary of all of them """
+
+# Phases of a turn, in order
+SCORING = "scoring"
+REINFORCEMENT = "reinforcement"
+TRIS = "tris"
+NAVAL_COMBACT = "naval_combact"
+COMBACT_BY_SEA = "combact_by_sea"
+LOOKAHEAD = "lookahead"
+GROUND_COMBACT = "ground_combact"
+ELIMINATION = "elimination"
+MOVEMENT = "movement"
+DRAW = "draw"
+PHASES = (SCORING, REINFORCEMENT, TRIS, NAVAL_COMBACT, COMBACT_BY_SEA, LOOKAHEAD, GROUND_COMBACT,
+          ELIMINATION, MOVEMENT, DRAW)
+
+# Counters
+BATTLES = "battles"
+# Rounds of dice (fast combacts draw the end of a battle at once and roll none)
+DICE_ROUNDS = "dice_rounds"
+# Attacks whose probability to win has been (re)computed
+CANDIDATE_ATTACKS = "candidate_attacks"
+# Areas visited by the searches on the map (find_nearest, splits of the empires)
+NODES_VISITED = "nodes_visited"
+COUNTERS = (BATTLES, DICE_ROUNDS, CANDIDATE_ATTACKS, NODES_VISITED)
+
+
+def run_phase(phase: str, f, *args):
+    # How phases are run without a profile
+    return f(*args)
+
+
+def get_phase_time(phase: str, model):
+    return model.profile.times[phase]
+
+
+def get_counter(counter: str, model):
+    return model.profile.counters[counter]
+
+
+class PhaseProfile(object):
+
+    def __init__(self):
+        # Seconds spent in every phase and how many times it has been run
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def run(self, phase: str, f, *args):
+        start = time.perf_counter()
+        try:
+            return f(*args)
+        finally:
+            self.times[phase] += time.perf_counter() - start
+            self.calls[phase] += 1
+
+    def count(self, counter: str, n: int = 1):
+        self.counters[counter] += n
+
+    def merge(self, other):
+        # Add the timings and the counters of other (of another game) to these
+        for phase in PHASES:
+            self.times[phase] += other.times[phase]
+            self.calls[phase] += other.calls[phase]
+        for counter in COUNTERS:
+            self.counters[counter] += other.counters[counter]
+
+    @staticmethod
+    def reporters():
+        # Model reporters of the DataCollector, picklable as the model is
+        reporters = {"Time " + phase: functools.partial(get_phase_time, phase) for phase in PHASES}
+        reporters.update({"Count " + counter: functools.partial(get_counter, counter) for counter in COUNTERS})
+        return reporters
+
+    def summary(self):
+        total = sum(self.times.values())
+        lines = ["{:<16} {:>8} {:>12} {:>12} {:>7}".format("phase", "calls", "total ms", "mean us", "share")]
+        for phase in PHASES:
+            calls, seconds = self.calls[phase], self.times[phase]
+            if calls == 0:
+                continue
+            lines.append("{:<16} {:>8} {:>12.2f} {:>12.1f} {:>6.1f}%".format(
+                phase, calls, seconds * 1e3, seconds / calls * 1e6, 100 * seconds / total if total else 0.0))
+        lines.append("{:<16} {:>8} {:>12.2f}".format("total", "", total * 1e3))
+        lines.append("")
+        for counter in COUNTERS:
+            lines.append("{:<18} {:>12}".format(counter, self.counters[counter]))
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    from .model import SPQRisiko
+    parser = argparse.ArgumentParser(description="Time the phases of some SPQRisiko games")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--n-players", type=int, default=4)
+    parser.add_argument("--points-limit", type=int, default=50)
+    parser.add_argument("--strategy", default="Random")
+    parser.add_argument("--goal", default="Random")
+    parser.add_argument("--max-steps", type=int, default=1000)
+    parser.add_argument("--fast-combact", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    profile = PhaseProfile()
+    for i in range(args.games):
+        model = SPQRisiko(args.n_players, args.points_limit, args.strategy, args.goal,
+                          fast_combact=args.fast_combact, seed=args.seed + i, profile=True)
+        while model.running and model.current_turn < args.max_steps:
+            model.step()
+        profile.merge(model.profile)
+    print(profile.summary())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
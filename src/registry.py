@@ -0,0 +1,89 @@
+import os
+import json
+import networkx as nx
+
+from .adjacency import AdjacencyIndex
+
+""" Configuration files parsed once per process and shared by every model: the map
+(config/territories.json) with its graph and its adjacency index, and the cards
+(config/cards.json). Entries are keyed by the path of the file and its modification time
+and size, so an edited file is read again. What is handed out is read-only (dicts are
+FrozenDicts, lists are tuples and the graph is frozen): only the state of a game is
+allocated by every model. Copies of them (copy.deepcopy of a model) are the shared
+objects themselves """
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config")
+MAP_PATH = os.path.join(CONFIG_PATH, "territories.json")
+CARDS_PATH = os.path.join(CONFIG_PATH, "cards.json")
+
+
+class FrozenDict(dict):
+
+    # A dict that can't be changed
+    def readonly(self, *args, **kwargs):
+        raise TypeError("configurations are read-only")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+def freeze(value):
+    # A read-only copy of a parsed JSON document
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(v)) for key, v in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def config_key(path: str):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+class MapConfig(object):
+
+    def __init__(self, territories_dict: dict):
+        self.territories_dict = freeze(territories_dict)
+        graph = nx.Graph()
+        for territory in territories_dict["territories"]:
+            graph.add_node(territory["id"])
+        for sea in territories_dict['sea_areas']:
+            graph.add_node(sea['id'])
+        for edges in territories_dict["edges"]:
+            graph.add_edge(edges[0], edges[1])
+        self.graph = nx.freeze(graph)
+        self.ground_nodes = tuple(t["id"] for t in territories_dict["territories"])
+        self.sea_nodes = tuple(s["id"] for s in territories_dict["sea_areas"])
+        self.adjacency = AdjacencyIndex.from_graph(self.graph, self.ground_nodes)
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+_configs = {}
+
+def load(path: str, parse):
+    # parse(document) of the JSON file at path, computed once per version of the file
+    key = (parse, config_key(path))
+    if key not in _configs:
+        with open(path, "r") as f:
+            _configs[key] = parse(json.load(f))
+    return _configs[key]
+
+
+def get_map(path: str = MAP_PATH):
+    return load(path, MapConfig)
+
+
+def get_cards(path: str = CARDS_PATH):
+    # The types of cards, as in cards.json
+    return load(path, freeze)
@@ -0,0 +1,164 @@
+import hashlib
+
+from . import strategies
+from .dice import make_dice
+from .events import EventLog
+
+""" Lookahead for the players: instead of the greedy choice of their strategy, some
+choices of a turn are made by trying every candidate on a copy of the game, playing
+the rest of the turn (and optionally the turns of the next players) some times with
+different dice, and taking the candidate that leaves the player best placed on average.
+The choices are where to put the legionaries earned at the beginning of the turn (where
+put_reinforces would put them, or all of them on one of the areas on the border) and
+the lowest probability to win of the ground attacks (the one of every strategy).
+Rollouts are played on a clone of the game (see snapshot.py) set back to the position
+of the choice before every rollout, with fast combacts and no events; the greedy
+strategies play every other choice. The copy draws from its own generator, so the random
+draws of the real game are not touched and a choice only changes the game through the
+candidate it takes. That generator (and its dice) is seeded again at every choice from the
+state of the generator of the real game and the player, so the rollouts of a choice only
+depend on the position: a game played again from a snapshot, or a clone of it, makes the
+same choices """
+
+
+def single_max(values: list):
+    # Index of the maximum of values if only one has it, None otherwise
+    m = max(values)
+    players = [i for i, value in enumerate(values) if value == m]
+    return players[0] if len(players) == 1 else None
+
+
+def scoring_points(player: int, scores):
+    # Points that player gets at its next scoring (see Player.update_victory_points)
+    empires, territories, sea_areas, power_places = scores
+    points = power_places[player]
+    if max(empires) >= 4 and single_max(empires) == player:
+        points += 1
+    if single_max(territories) == player:
+        points += 1
+    if single_max(sea_areas) == player:
+        points += 1
+    return points
+
+
+def standing(game, player: int):
+    # Victory points of player (with those of its next scoring) ahead of the best adversary,
+    # ground areas break the ties
+    scores = game.board.scoreboard.scores()
+    territories = scores[1]
+    values = [p.victory_points + scoring_points(p.unique_id, scores) + 0.01 * territories[p.unique_id]
+              for p in game.players]
+    return values[player] - max(value for i, value in enumerate(values) if i != player)
+
+
+class Lookahead(object):
+
+    def __init__(self, rollouts: int, turns: int = 0, candidates: int = 6):
+        # rollouts: continuations played for every candidate of a choice, turns: turns of the
+        # next players played after the rest of the turn, candidates: areas of the border tried
+        # for the reinforcements
+        self.rollouts = rollouts
+        self.turns = turns
+        self.candidates = candidates
+        # The copy of the game in which rollouts are played and the game it is a copy of
+        self.game = None
+        self.source = None
+        # Rollouts played so far
+        self.n_rollouts = 0
+
+    def sandbox(self, model, snapshot, player: int):
+        # The copy of model, in the position of snapshot, with its generator seeded for a choice of player
+        if self.game is None or self.source is not model:
+            game = model.clone()
+            game.lookahead = None
+            game.events = EventLog()
+            # Rollouts are timed with the phase of the real game that plays them
+            game.profile = None
+            game.board.empires.profile = None
+            game.debug = False
+            game.fast_combact = True
+            self.game, self.source = game, model
+        self.game.restore(snapshot, rng=False)
+        # hash() of the state isn't the same in every process (that of None is its address)
+        digest = hashlib.sha256(repr((snapshot.random_state, player)).encode()).digest()
+        self.game.random.seed(int.from_bytes(digest[:8], "little"))
+        self.game.dice = make_dice(self.game.random, model.dice.size)
+        return self.game
+
+    def best_plan(self, model, player, plans: list, play):
+        # The plan with the best mean standing of player over the rollouts, the first one on ties.
+        # play(game, player, plan) plays the rest of the turn of player (of game) with plan
+        if len(plans) == 1:
+            return plans[0]
+        snapshot = model.snapshot()
+        game = self.sandbox(model, snapshot, player.unique_id)
+        best, best_value = None, None
+        for plan in plans:
+            value = 0.0
+            for _ in range(self.rollouts):
+                game.restore(snapshot, rng=False)
+                game_player = game.players[player.unique_id]
+                play(game, game_player, plan)
+                self.play_on(game, game_player)
+                value += standing(game, player.unique_id)
+            self.n_rollouts += self.rollouts
+            if best_value is None or value > best_value:
+                best, best_value = plan, value
+        return best
+
+    def copy(self):
+        # A new lookahead with the same settings, for a clone of the game
+        return Lookahead(self.rollouts, self.turns, self.candidates)
+
+    def play_on(self, game, player):
+        # Turns of the next players, until one wins
+        players = game.players
+        i = player.unique_id
+        for _ in range(self.turns):
+            i = (i + 1) % len(players)
+            if not players[i].eliminated and game.play_turn(players[i]):
+                return
+
+    @staticmethod
+    def border(model, player):
+        # Ground areas of player with an adversary among their neighbours, strongest first
+        areas = []
+        for area in model.get_territories_by_player(player):
+            for neighbor in model.adjacency.ground_neighbors[area.unique_id]:
+                if model.ground_areas[neighbor].owner.unique_id != player.unique_id:
+                    areas.append(area)
+                    break
+        areas.sort(key=lambda area: area.armies, reverse=True)
+        return areas
+
+    @staticmethod
+    def reinforce(model, player, armies: int, plan):
+        # Put the legionaries as put_reinforces does (plan is None) or all of them on the area plan
+        if plan is None:
+            player.put_reinforces(model, armies)
+        else:
+            model.ground_areas[plan].armies += armies
+
+    def put_reinforces(self, model, player, armies: int):
+        plans = [None] + [area.unique_id for area in self.border(model, player)[:self.candidates]]
+
+        def play(game, game_player, plan):
+            Lookahead.reinforce(game, game_player, armies, plan)
+            game.tris_phase(game_player)
+            game.naval_combact_phase(game_player)
+            conquered_by_sea = game.combact_by_sea_phase(game_player)
+            conquered = game.ground_combact_phase(game_player)
+            game.end_phase(game_player, conquered_by_sea or conquered)
+
+        self.reinforce(model, player, armies, self.best_plan(model, player, plans, play))
+
+    def choose_aggressivity(self, model, player, conquered_by_sea: bool):
+        # The lowest probability to win of the ground attacks, the one of the strategy first
+        own = strategies.probs_win[player.strategy]
+        plans = [own] + sorted(set(strategies.probs_win.values()) - {own})
+
+        def play(game, game_player, aggressivity):
+            conquered = game.ground_combact_phase(game_player, aggressivity)
+            game.end_phase(game_player, conquered_by_sea or conquered)
+
+        return self.best_plan(model, player, plans, play)
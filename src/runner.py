@@ -0,0 +1,240 @@
+import os
+import csv
+import sys
+import argparse
+import hashlib
+import itertools
+import numpy
+import multiprocessing
+
+from . import constants
+from .model import SPQRisiko
+from .batched import BatchedGames
+from .store import ResultStore, STORE_PATH, canonical, run_key
+
+""" Batch runs of SPQRisiko over a grid of parameters, spread over a pool of processes.
+Every run gets its own seed, derived from a master seed, its combination of the parameters
+and its iteration, and every random draw of a game comes from the generator seeded with it
+(see dice.py), so a run is identified by its parameters and its seed and a sweep gives the
+same results whatever the number of processes and the other combinations in it. Runs are
+kept in a result store (see store.py): the ones an earlier sweep has already computed, with
+the same code, are read from it and only the missing ones are played. Results are written
+to a CSV, if any, in the order of the runs, one row per run, with the DataCollector's model
+variables of the final step (empty if nobody has won).
+With engine="batched" the iterations of every combination are played in lockstep by
+BatchedGames (see batched.py), one combination per process, with the seed of its first run.
+The games of a batch draw from the same generator, so they depend on the size of the batch:
+batched runs are only read from the store by sweeps with the same iterations, and a batch
+played again with other iterations replaces the one in the store """
+
+# parameter lists for each parameter to be tested in batch run
+# n_players, points_limit, strategy, goal, rollouts and rollout turns of the lookahead (0: greedy players),
+# size of the blocks of numpy dice (0: rolled one at a time)
+br_params = {"n_players": [3],
+             "points_limit": [150],
+             "strategy": ["Random"],
+             "goal": ["PP", "BE", "LA"],
+             "rollouts": [0],
+             "rollout_turns": [0],
+             "dice_buffer": [0]}
+
+REPORTERS = ["Winner", "Turn", "Strategy", "Goal"]
+
+
+def derive_seeds(master_seed: int, params: dict, iterations: int):
+    # Independent seeds, the i-th one only depends on master_seed, the combination params and i
+    combination = int.from_bytes(hashlib.sha256(canonical(params).encode()).digest()[:8], "little")
+    sequence = numpy.random.SeedSequence(master_seed, spawn_key=(combination,))
+    return [int(child.generate_state(1)[0]) for child in sequence.spawn(iterations)]
+
+
+def get_runs(params: dict, iterations: int, master_seed: int):
+    # Every combination of the parameters repeated `iterations` times, with its seed
+    names = sorted(params)
+    combinations = [dict(zip(names, values)) for values in itertools.product(*(params[name] for name in names))]
+    runs = [(i, c, seed) for c in combinations for i, seed in enumerate(derive_seeds(master_seed, c, iterations))]
+    return [(run_id, iteration, c, seed) for run_id, (iteration, c, seed) in enumerate(runs)]
+
+
+def run_model(run, max_steps: int, series: bool = False):
+    # The row of a run and, with series, the victory points of the players at the end of every turn
+    run_id, iteration, params, seed = run
+    model = SPQRisiko(**params, seed=seed)
+    points = [] if series else None
+    for _ in range(max_steps):
+        if not model.running:
+            break
+        model.step()
+        if series:
+            points.append([player.victory_points for player in model.players])
+    row = {"Run": run_id, "Iteration": iteration, "Seed": seed, "Steps": model.current_turn}
+    row.update(params)
+    for name in REPORTERS:
+        values = model.datacollector.model_vars.get(name)
+        row[name] = str(values[-1]) if values else ""
+    return row, points
+
+
+def _run_model(args):
+    return run_model(*args)
+
+
+def run_batch(runs: list, max_steps: int):
+    # The runs of one combination of the parameters, as rows of run_model
+    _, _, params, seed = runs[0]
+    if params["rollouts"] > 0:
+        raise ValueError("the batched engine has no lookahead players, rollouts must be 0")
+    games = BatchedGames(len(runs), params["n_players"], params["points_limit"], params["strategy"], params["goal"],
+                         seed=seed)
+    rows = []
+    for (run_id, iteration, params, _), result in zip(runs, games.run(max_steps).results()):
+        row = {"Run": run_id, "Iteration": iteration, "Seed": seed, "Steps": result["Turn"]}
+        row.update(params)
+        won = result["Winner"] is not None
+        row["Winner"] = constants.COLORS[result["Winner"]] if won else ""
+        for name in REPORTERS[1:]:
+            row[name] = str(result[name]) if won else ""
+        rows.append(row)
+    return rows
+
+
+def _run_batch(args):
+    return run_batch(*args)
+
+
+def get_options(engine: str, max_steps: int, iterations: int, iteration: int):
+    # Options of the runner that change the result of a run: a batched run also depends on
+    # the number of games of its batch and on its place in it
+    options = {"engine": engine, "max_steps": max_steps}
+    if engine == "batched":
+        options.update(iterations=iterations, iteration=iteration)
+    return options
+
+
+def get_outcome(row: dict):
+    # Outcome of a row for the store, None where nobody has won
+    outcome = {"Steps": row["Steps"], "Turn": int(row["Turn"]) if row["Turn"] != "" else None}
+    for name in ("Winner", "Strategy", "Goal"):
+        outcome[name] = row[name] if row[name] != "" else None
+    return outcome
+
+
+def get_row(run, seed: int, outcome: dict):
+    # Row of a run from its outcome in the store
+    run_id, iteration, params, _ = run
+    row = {"Run": run_id, "Iteration": iteration, "Seed": seed, "Steps": outcome["Steps"]}
+    row.update(params)
+    for name in REPORTERS:
+        row[name] = str(outcome[name]) if outcome[name] is not None else ""
+    return row
+
+
+def run_experiments(
+        params: dict,
+        iterations: int,
+        max_steps: int,
+        output: str = None,
+        master_seed: int = 0,
+        processes: int = None,
+        engine: str = "model",
+        store: str = STORE_PATH,
+        series: bool = False):
+
+    if output is None and store is None:
+        raise ValueError("the results need a CSV or a store")
+    if series and engine == "batched":
+        raise ValueError("the batched engine has no time series")
+    runs = get_runs(params, iterations, master_seed)
+    if engine == "batched":
+        # Runs of the same combination are consecutive, played with the seed of the first one
+        batches = [runs[i:i + iterations] for i in range(0, len(runs), iterations)]
+    else:
+        batches = [[run] for run in runs]
+    seeds = [batch[0][3] for batch in batches]
+    options = [[get_options(engine, max_steps, iterations, run[1]) for run in batch] for batch in batches]
+    keys = [[run_key(run[2], seed, o) for run, o in zip(batch, batch_options)]
+            for batch, seed, batch_options in zip(batches, seeds, options)]
+    results = ResultStore(store) if store is not None else None
+    cached = results.get([key for batch_keys in keys for key in batch_keys], series) if results is not None else {}
+    missing = [batch for batch, batch_keys in zip(batches, keys) if any(key not in cached for key in batch_keys)]
+
+    fieldnames = ["Run", "Iteration", "Seed", "Steps"] + sorted(params) + REPORTERS
+    f = open(output, "w", newline="") if output is not None else None
+    # No processes if every run is in the store
+    pool = multiprocessing.Pool(processes) if missing else None
+    try:
+        writer = csv.DictWriter(f, fieldnames=fieldnames) if f is not None else None
+        if writer is not None:
+            writer.writeheader()
+        if pool is None:
+            computed = iter(())
+        elif engine == "batched":
+            computed = ([(row, None) for row in rows] for rows in pool.imap(
+                _run_batch, ((batch, max_steps) for batch in missing), chunksize=1))
+        else:
+            computed = ([result] for result in pool.imap(
+                _run_model, ((batch[0], max_steps, series) for batch in missing), chunksize=1))
+        for batch, seed, batch_options, batch_keys in zip(batches, seeds, options, keys):
+            if all(key in cached for key in batch_keys):
+                rows = [get_row(run, seed, cached[key]) for run, key in zip(batch, batch_keys)]
+            else:
+                rows = []
+                if results is not None and engine == "batched":
+                    # The games of the batch played with other iterations
+                    results.delete(batch[0][2], seed, {"engine": engine, "max_steps": max_steps})
+                for run, o, key, (row, points) in zip(batch, batch_options, batch_keys, next(computed)):
+                    if results is not None:
+                        results.put(key, run[2], seed, o, get_outcome(row), points)
+                    rows.append(row)
+            if writer is not None:
+                writer.writerows(rows)
+                f.flush()
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if f is not None:
+            f.close()
+        if results is not None:
+            results.close()
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a sweep of SPQRisiko games in parallel")
+    parser.add_argument("--n-players", type=int, nargs="+", default=br_params["n_players"])
+    parser.add_argument("--points-limit", type=int, nargs="+", default=br_params["points_limit"])
+    parser.add_argument("--strategy", nargs="+", default=br_params["strategy"])
+    parser.add_argument("--goal", nargs="+", default=br_params["goal"])
+    parser.add_argument("--rollouts", type=int, nargs="+", default=br_params["rollouts"],
+                        help="rollouts of every choice of the players, 0 for the greedy strategies")
+    parser.add_argument("--rollout-turns", type=int, nargs="+", default=br_params["rollout_turns"])
+    parser.add_argument("--dice-buffer", type=int, nargs="+", default=br_params["dice_buffer"],
+                        help="dice drawn by numpy in blocks of this size, 0 to roll them one at a time")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--max-steps", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="master seed of the sweep")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="CSV of the runs of the sweep")
+    parser.add_argument("--store", default=STORE_PATH, help="result store of the runs (see store.py)")
+    parser.add_argument("--no-store", action="store_true", help="play every run, without reading or adding to a store")
+    parser.add_argument("--series", action="store_true",
+                        help="also keep the victory points of the players turn after turn in the store")
+    parser.add_argument("--engine", choices=["model", "batched"], default="model",
+                        help="play every game with SPQRisiko, or the iterations of a combination in lockstep")
+    args = parser.parse_args(argv)
+
+    params = {
+        "n_players": args.n_players,
+        "points_limit": args.points_limit,
+        "strategy": args.strategy,
+        "goal": args.goal,
+        "rollouts": args.rollouts,
+        "rollout_turns": args.rollout_turns,
+        "dice_buffer": args.dice_buffer
+    }
+    run_experiments(params, args.iterations, args.max_steps, args.output, args.seed, args.processes, args.engine,
+                    None if args.no_store else args.store, args.series)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
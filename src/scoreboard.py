@@ -0,0 +1,64 @@
+from .empires import NO_OWNER
+
+""" Counters of everything that gives victory points, kept up to date by the board on
+every change instead of counting them at every turn: ground areas and power places
+of every owner, the player with the most trireme in every sea area (if only one) and
+the sea areas of every player. Empires come from the EmpireTracker of the board.
+SPQRisiko(debug=True) checks them against the full scans at every turn """
+
+
+class Scoreboard(object):
+
+    def __init__(self, n_owners: int, n_players: int, empires):
+        self.n_players = n_players
+        self.empires = empires
+        self.territories = [0] * n_owners
+        self.power_places = [0] * n_owners
+        self.sea_areas = [0] * n_players
+        # Player with the most trireme of every sea area, missing if more players have the most
+        self.sea_majority = {}
+
+    def move(self, old_owner: int, new_owner: int, power_place: bool):
+        # A ground area changed owner
+        if old_owner != NO_OWNER:
+            self.territories[old_owner] -= 1
+            self.power_places[old_owner] -= power_place
+        if new_owner != NO_OWNER:
+            self.territories[new_owner] += 1
+            self.power_places[new_owner] += power_place
+
+    def set_power_place(self, owner: int, old: bool, new: bool):
+        if owner != NO_OWNER:
+            self.power_places[owner] += int(new) - int(old)
+
+    def update_sea_area(self, node: int, trireme: list):
+        # The trireme of a sea area changed
+        m = max(trireme)
+        players_max_trireme = [player for player, n_trireme in enumerate(trireme) if n_trireme == m]
+        majority = players_max_trireme[0] if len(players_max_trireme) == 1 else NO_OWNER
+        old_majority = self.sea_majority.pop(node, NO_OWNER)
+        if old_majority != NO_OWNER:
+            self.sea_areas[old_majority] -= 1
+        if majority != NO_OWNER:
+            self.sea_majority[node] = majority
+            self.sea_areas[majority] += 1
+
+    def snapshot(self):
+        # Copy of the counters, for restore
+        return list(self.territories), list(self.power_places), list(self.sea_areas), dict(self.sea_majority)
+
+    def restore(self, state):
+        territories, power_places, sea_areas, sea_majority = state
+        self.territories[:] = territories
+        self.power_places[:] = power_places
+        self.sea_areas[:] = sea_areas
+        self.sea_majority = dict(sea_majority)
+
+    def scores(self):
+        # Largest empire, ground areas, sea areas and power places of every player
+        return (
+            [self.empires.largest_size(player) for player in range(self.n_players)],
+            self.territories[:self.n_players],
+            list(self.sea_areas),
+            self.power_places[:self.n_players]
+        )
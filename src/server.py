@@ -3,6 +3,7 @@ from mesa.visualization.UserParam import UserSettableParameter
 from mesa.visualization.modules import NetworkModule, ChartModule, BarChartModule, TextElement
 import os
 from .model import SPQRisiko
+from .events import console_log
 from .territory import GroundArea, SeaArea
 
 
@@ -91,7 +92,9 @@ model_params = {
     'strategy': UserSettableParameter('choice', "Which strategy should players play?",
                                           value="Random", choices=["Aggressive", "Passive", "Neutral", "Random"]),
     'goal': UserSettableParameter('choice', "Which goal should players follow?",
-                                          value="Random", choices=["Random", "PP", "BE", "LA"])
+                                          value="Random", choices=["Random", "PP", "BE", "LA"]),
+    # Models are silent by default: the server prints the game to the console
+    'events': console_log()
 }
 
 server = ModularServer(SPQRisiko, [network, journal], 'S.P.Q.Risiko',
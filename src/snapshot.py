@@ -0,0 +1,93 @@
+import copy
+import random
+from collections import namedtuple
+
+from mesa.time import RandomActivation
+
+from .board import BoardState
+
+""" Snapshots of the state of a game, to go back to a position or to play on from it more
+times (what-if rollouts, checkpoints of long runs, experiments branching from the same
+position). A snapshot only holds what changes during a game: the board (owners, armies,
+power places and trireme, with the empires and the victory point counters), the victory
+points, cards and elimination of every player, the deck and the trash, the turn and
+the state of the random generator of the model and of its dice (see dice.py). Everything
+else (map, cards, odds, tris) is shared by the models and never copied.
+The journal and the collected data are cut back to where they were, the events log is
+not touched """
+
+Snapshot = namedtuple("Snapshot", [
+    "board", "players", "deck", "trashed_cards", "current_turn", "running", "steps",
+    "journal", "model_vars", "random_state", "dice_state"])
+
+
+def take_snapshot(model):
+    return Snapshot(
+        model.board.snapshot(),
+        tuple((p.victory_points, p.eliminated, tuple(p.cards)) for p in model.players + model.computers),
+        tuple(model.deck),
+        tuple(model.trashed_cards),
+        model.current_turn,
+        model.running,
+        (model.schedule.steps, model.schedule.time),
+        len(model.journal),
+        {name: len(values) for name, values in model.datacollector.model_vars.items()},
+        model.random.getstate(),
+        model.dice.getstate())
+
+
+def restore_snapshot(model, snapshot, rng=True):
+    # Back to the state of snapshot, taken from model or from a clone of it. The random
+    # generators are left as they are if not rng
+    model.board.restore(snapshot.board)
+    for player, (victory_points, eliminated, cards) in zip(model.players + model.computers, snapshot.players):
+        player.victory_points = victory_points
+        player.eliminated = eliminated
+        player.cards = list(cards)
+    model.deck = list(snapshot.deck)
+    model.trashed_cards = list(snapshot.trashed_cards)
+    model.current_turn = snapshot.current_turn
+    model.running = snapshot.running
+    model.schedule.steps, model.schedule.time = snapshot.steps
+    del model.journal[snapshot.journal:]
+    for name, values in model.datacollector.model_vars.items():
+        del values[snapshot.model_vars.get(name, 0):]
+    if rng:
+        model.random.setstate(snapshot.random_state)
+        model.dice.setstate(snapshot.dice_state)
+
+
+def copy_agent(agent, model):
+    # Shallow copy of a player or of an area (faster than copy.copy), moved to model
+    other = object.__new__(type(agent))
+    other.__dict__.update(agent.__dict__)
+    other.model = model
+    return other
+
+
+def clone_model(model):
+    # A new model in the same state of model, sharing its configuration, its events log and its profile.
+    # Only the board, the players, the areas, the schedule and the lookahead are new objects
+    other = object.__new__(type(model))
+    other.__dict__.update(model.__dict__)
+    other.random = random.Random()
+    other.dice = model.dice.copy(other.random)
+    other._grid = None
+    if model.lookahead is not None:
+        other.lookahead = model.lookahead.copy()
+    other.players = [copy_agent(player, other) for player in model.players]
+    other.computers = [copy_agent(computer, other) for computer in model.computers]
+    other.board = BoardState(model.board.n_nodes, model.n_players, other.players + other.computers, model.adjacency)
+    other.board.ground[:] = model.board.ground
+    other.board.empires.profile = model.board.empires.profile
+    other.ground_areas = [copy_agent(area, other) for area in model.ground_areas]
+    other.sea_areas = [copy_agent(area, other) for area in model.sea_areas]
+    other.areas = other.ground_areas + other.sea_areas
+    for area in other.areas:
+        area.board = other.board
+    other.schedule = RandomActivation(other)
+    other.journal = list(model.journal)
+    other.datacollector = copy.copy(model.datacollector)
+    other.datacollector.model_vars = {name: list(values) for name, values in model.datacollector.model_vars.items()}
+    restore_snapshot(other, take_snapshot(model))
+    return other
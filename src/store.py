@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import argparse
+
+""" Local store of the results of the runs of SPQRisiko (see runner.py), a SQLite database.
+Every run is keyed by a hash of its parameters, its seed, the options of the runner that
+change its result (engine, max_steps...) and the version of the code: a hash of the
+sources and of the configuration files of the package, so that a run is computed again
+whenever anything that could change it has changed. A run has its outcome (the columns
+of the CSVs of the runner) and optionally its time series, the victory points of every
+player at the end of every turn. Aggregates are computed by SQLite (see
+ResultStore.aggregate), without reading the runs:
+
+    python -m src.store --by goal points_limit --where n_players=3
+
+prints the runs, the games won and the mean turn of the win of every goal and limit """
+
+SCHEMA_VERSION = 1
+STORE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'results', 'runs.sqlite'))
+SOURCES_PATH = os.path.dirname(os.path.abspath(__file__))
+# Queries of many keys are split in chunks of at most this many (bound of SQLite's parameters)
+CHUNK_SIZE = 500
+
+# Columns of the outcome of a run, by their name in the rows of the runner
+OUTCOMES = {
+    "Steps": "steps",
+    "Winner": "winner",
+    "Turn": "turn",
+    "Strategy": "winner_strategy",
+    "Goal": "winner_goal"
+}
+# Options of the runner that can be queried as the parameters
+OPTIONS = ("engine", "max_steps")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    key TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    params TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    options TEXT NOT NULL,
+    steps INTEGER,
+    winner TEXT,
+    turn INTEGER,
+    winner_strategy TEXT,
+    winner_goal TEXT,
+    has_series INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS runs_version ON runs (version);
+CREATE TABLE IF NOT EXISTS series (
+    key TEXT NOT NULL,
+    turn INTEGER NOT NULL,
+    player INTEGER NOT NULL,
+    victory_points INTEGER NOT NULL,
+    PRIMARY KEY (key, turn, player)
+) WITHOUT ROWID;
+"""
+
+
+def source_files(path: str = SOURCES_PATH):
+    # Sources and configuration files of the package, in a stable order
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith((".py", ".json")))
+    return files
+
+
+_versions = {}
+
+def get_code_version(path: str = SOURCES_PATH):
+    # Hash of the sources of the package, computed once per process
+    if path not in _versions:
+        digest = hashlib.sha256(str(SCHEMA_VERSION).encode())
+        for name in source_files(path):
+            digest.update(os.path.relpath(name, path).replace(os.sep, "/").encode())
+            with open(name, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        _versions[path] = digest.hexdigest()[:16]
+    return _versions[path]
+
+
+def canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def run_key(params: dict, seed: int, options: dict, version: str = None):
+    # Key of a run of params with seed, played with the options of the runner
+    document = {
+        "params": params,
+        "seed": seed,
+        "options": options,
+        "version": version if version is not None else get_code_version()
+    }
+    return hashlib.sha256(canonical(document).encode()).hexdigest()
+
+
+def column(name: str):
+    # SQL expression of an outcome (by its name in the rows) or of a parameter
+    if name in OUTCOMES:
+        return OUTCOMES[name]
+    if not name.replace("_", "").isalnum():
+        raise ValueError("invalid parameter name: {}".format(name))
+    return "json_extract({}, '$.{}')".format("options" if name in OPTIONS else "params", name)
+
+
+class ResultStore(object):
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def get(self, keys: list, series: bool = False):
+        # Outcomes of the runs of keys that are in the store (with a time series if series), by key
+        outcomes = {}
+        names = list(OUTCOMES)
+        query = "SELECT key, {} FROM runs WHERE key IN ({{}})".format(", ".join(OUTCOMES[n] for n in names))
+        if series:
+            query += " AND has_series"
+        for i in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[i:i + CHUNK_SIZE]
+            for key, *values in self.connection.execute(query.format(", ".join("?" * len(chunk))), chunk):
+                outcomes[key] = dict(zip(names, values))
+        return outcomes
+
+    def put(self, key: str, params: dict, seed: int, options: dict, outcome: dict, series: list = None):
+        # Adds (or replaces) a run, series are the victory points of the players turn after turn
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO runs (key, version, params, seed, options, {}, has_series) "
+                "VALUES (?, ?, ?, ?, ?, {}, ?)".format(", ".join(OUTCOMES.values()), ", ".join("?" * len(OUTCOMES))),
+                [key, get_code_version(), canonical(params), seed, canonical(options)] +
+                [outcome.get(name) for name in OUTCOMES] + [series is not None])
+            self.connection.execute("DELETE FROM series WHERE key = ?", (key,))
+            if series is not None:
+                self.connection.executemany(
+                    "INSERT INTO series (key, turn, player, victory_points) VALUES (?, ?, ?, ?)",
+                    ((key, turn, player, points)
+                     for turn, row in enumerate(series, 1) for player, points in enumerate(row)))
+
+    def delete(self, params: dict, seed: int, options: dict):
+        # Removes the runs of params with seed of the current version whose options include these
+        names = sorted(options)
+        keys = "SELECT key FROM runs WHERE version = ? AND params = ? AND seed = ?" + "".join(
+            " AND json_extract(options, '$.{}') = ?".format(name) for name in names)
+        values = [get_code_version(), canonical(params), seed] + [options[name] for name in names]
+        with self.connection:
+            self.connection.execute("DELETE FROM series WHERE key IN ({})".format(keys), values)
+            self.connection.execute("DELETE FROM runs WHERE key IN ({})".format(keys), values)
+
+    def series(self, key: str):
+        # Victory points of every player at the end of every turn of a run
+        series = []
+        for turn, player, points in self.connection.execute(
+                "SELECT turn, player, victory_points FROM series WHERE key = ? ORDER BY turn, player", (key,)):
+            if len(series) < turn:
+                series.append([])
+            series[-1].append(points)
+        return series
+
+    def aggregate(self, by: list, where: dict = None, version: str = None, all_versions: bool = False):
+        # Runs, games won and mean turn of the wins of every group of the runs of a version (of
+        # the current code by default) by the parameters or outcomes in by, where these are equal
+        # to the values in where
+        conditions, values = [], []
+        if not all_versions:
+            conditions.append("version = ?")
+            values.append(version if version is not None else get_code_version())
+        for name, value in (where or {}).items():
+            conditions.append("{} = ?".format(column(name)))
+            values.append(value)
+        groups = [column(name) for name in by]
+        query = "SELECT {} COUNT(*), COUNT(winner), AVG(CASE WHEN winner IS NOT NULL THEN turn END) FROM runs".format(
+            "".join(group + ", " for group in groups))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if groups:
+            query += " GROUP BY {0} ORDER BY {0}".format(", ".join(groups))
+        rows = []
+        for row in self.connection.execute(query, values):
+            rows.append(dict(zip(list(by) + ["runs", "won", "mean_turn"], row)))
+        return rows
+
+
+def parse_value(value: str):
+    # Values of --where are numbers if they look like numbers
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate the runs in the result store")
+    parser.add_argument("--store", default=STORE_PATH)
+    parser.add_argument("--by", nargs="*", default=[],
+                        help="parameters (goal, points_limit...), options (engine, max_steps) or outcomes "
+                             "(Winner, Strategy, Goal) to group by")
+    parser.add_argument("--where", nargs="*", default=[], metavar="NAME=VALUE")
+    parser.add_argument("--all-versions", action="store_true", help="also the runs of other versions of the code")
+    args = parser.parse_args(argv)
+
+    where = {}
+    for condition in args.where:
+        name, _, value = condition.partition("=")
+        where[name] = parse_value(value)
+    store = ResultStore(args.store)
+    try:
+        rows = store.aggregate(args.by, where, all_versions=args.all_versions)
+    finally:
+        store.close()
+    names = list(args.by) + ["runs", "won", "mean_turn"]
+    print("  ".join("{:>14}".format(name) for name in names))
+    for row in rows:
+        print("  ".join("{:>14}".format("" if row[name] is None else
+                                        "{:.2f}".format(row[name]) if isinstance(row[name], float) else str(row[name]))
+                        for name in names))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
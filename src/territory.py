@@ -1,4 +1,5 @@
 from . import constants
+from .board import TriremeRow
 # from .model import SPQRisiko
 from mesa import Agent
 
@@ -41,11 +42,46 @@ class GroundArea(Territory):
         model):
 
         Territory.__init__(self, unique_id, name, type, coords, model)
+        # The state lives in model.board (see board.py), these are views of its row
+        self.board = model.board
+        self.board.ground[unique_id] = True
         self.owner = None
         self.armies = 2
         self.power_place = False
         self.already_attacked_by_sea = False
 
+    @property
+    def owner(self):
+        return self.board.get_owner(self.unique_id)
+
+    @owner.setter
+    def owner(self, owner):
+        self.board.set_owner(self.unique_id, owner)
+
+    @property
+    def armies(self):
+        return self.board.armies.item(self.unique_id)
+
+    @armies.setter
+    def armies(self, armies):
+        self.board.set_armies(self.unique_id, armies)
+
+    @property
+    def power_place(self):
+        return self.board.power_place.item(self.unique_id)
+
+    @power_place.setter
+    def power_place(self, power_place):
+        self.board.set_power_place(self.unique_id, power_place)
+
+    @property
+    def already_attacked_by_sea(self):
+        return self.board.already_attacked_by_sea.item(self.unique_id)
+
+    @already_attacked_by_sea.setter
+    def already_attacked_by_sea(self, already_attacked_by_sea):
+        self.board.already_attacked_by_sea[self.unique_id] = already_attacked_by_sea
+
     def __str__(self):
         return super().__str__() + "Owner: {}\nArmies: {}\n".format(self.owner, self.armies)
 
@@ -63,11 +99,22 @@ class SeaArea(Territory):
         model):
     
         Territory.__init__(self, unique_id, name, type, coords, model)
+        self.board = model.board
         # Each position is a player
         # self.owners = [None] * model.n_players
         # In every sea area there must be only one combact per round 
         self.already_fought = False
         self.trireme = [0] * model.n_players 
+
+    @property
+    def trireme(self):
+        # A view of the row of the board, e.g. sea_area.trireme[player] += 1
+        return TriremeRow(self.board, self.unique_id)
+
+    @trireme.setter
+    def trireme(self, trireme):
+        if not isinstance(trireme, TriremeRow) or trireme.node != self.unique_id:
+            self.board.set_trireme_row(self.unique_id, trireme)
     
     def __str__(self):
         return super().__str__() + "Trireme: {}\n".format(self.trireme)
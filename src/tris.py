@@ -0,0 +1,110 @@
+import json
+import itertools
+
+from . import strategies
+from .cards import CARDS_PATH, load_cards
+from .registry import config_key
+
+""" Every tris that can be played with the cards of config/cards.json and its score for
+every goal, computed once per deck configuration and shared by every model (the deck
+only changes the number of combinations of every tris, not the tris).
+A tris is either three cards of the same type or three cards of different types, so
+there are only a few of them, identified by their name: the ordered initial letters of
+their types. The best tris of a hand is looked up from the number of cards of every type
+(hands are counts, see cards.py) """
+
+
+def reinforces_from_tris(cards):
+    # assert len(cards) == 3, "Wrong number of cards given to 'tris' method"
+    if len(cards) != 3:
+        return None
+    cards_in_tris = set([card["type"] for card in cards])
+    # assert len(cards_in_tris) == 3 or len(cards_in_tris) == 1, \
+    # Tris must be composed of three different cards or three of the same type
+    if len(cards_in_tris) != 3 and len(cards_in_tris) != 1:
+        return None
+    reinforces = {
+        "legionaries": 8 if len(cards_in_tris) == 1 else 10,
+        "centers": 0,
+        "triremes": 0
+    }
+    for card in cards:
+        for key, value in card["adds_on_tris"].items():
+            reinforces[key] += value
+    return reinforces
+
+
+def tris_name(types):
+    # Tris name is the ordered initial letters of cards type
+    return "-".join([t[0] for t in sorted(set(types))])
+
+
+def get_reinforcements_score(reinforces, multipliers):
+    m, r = multipliers, reinforces
+    return m[0]*r["legionaries"] + m[1]*r["triremes"] + m[2]*r["centers"]
+
+
+class TrisTable(object):
+
+    def __init__(self, cards: list, goals: dict):
+        # cards: the content of cards.json, goals: strategies.strategies
+        self.cards = {card["type"]: card for card in cards}
+        types = [card["type"] for card in cards]
+        # Cards of every tris (their types and how many of every type) and in how many ways
+        # it can be drawn from a full deck
+        self.tris = {}
+        self.counts = {}
+        self.combinations = {}
+        for indices in itertools.combinations_with_replacement(range(len(types)), 3):
+            if len(set(indices)) == 2:
+                continue
+            tris = [types[i] for i in indices]
+            if len(set(indices)) == 1:
+                k = cards[indices[0]]["number_in_deck"]
+                n = k * (k - 1) * (k - 2) // 6
+            else:
+                n = 1
+                for i in indices:
+                    n *= cards[i]["number_in_deck"]
+            if n > 0:
+                name = tris_name(tris)
+                self.tris[name] = tris
+                self.counts[name] = [indices.count(i) for i in range(len(types))]
+                self.combinations[name] = n
+
+        self.reinforces = {
+            name: reinforces_from_tris([self.cards[t] for t in tris]) for name, tris in self.tris.items()}
+        self.reinforces_by_goal = {
+            name: {goal: get_reinforcements_score(reinforces, value["tris"]) for goal, value in goals.items()}
+            for name, reinforces in self.reinforces.items()}
+        # Tris by decreasing score (ties in the order of a sorted deck)
+        self.tris_by_goal = {
+            goal: sorted(self.tris, key=lambda name: -self.reinforces_by_goal[name][goal]) for goal in goals}
+        # Mean score of every combination of three cards of the deck that is a tris
+        total = sum(self.combinations.values())
+        self.reinforces_by_goal["average"] = {
+            goal: float(sum(self.reinforces_by_goal[name][goal] * n for name, n in self.combinations.items())) / total
+            for goal in goals}
+
+    def best_tris(self, counts: list, goal: str):
+        # Name of the tris with the highest score for goal among those that can be made
+        # with a hand, None if none can be made
+        for name in self.tris_by_goal[goal]:
+            if all(n >= needed for n, needed in zip(counts, self.counts[name])):
+                return name
+        return None
+
+    def rank(self, name: str, goal: str):
+        # Position of a tris among those of goal, from the best one
+        return self.tris_by_goal[goal].index(name)
+
+
+_tables = {}
+
+def get_tris_table(path: str = CARDS_PATH):
+    # One table per version of the cards file and weights of the goals
+    goals = {goal: {"tris": list(value["tris"])} for goal, value in strategies.strategies.items()}
+    key = (config_key(path), json.dumps(goals, sort_keys=True))
+    if key not in _tables:
+        _tables[key] = TrisTable(load_cards(path), goals)
+    return _tables[key]
@@ -0,0 +1,144 @@
+import sys
+import json
+import math
+import time
+import numpy
+import argparse
+
+from .markov import get_battle_outcomes
+from .odds import get_combat_odds, GROUND, BY_SEA
+
+""" Monte Carlo check of the combact engines against the analytic tables.
+Battles are simulated with the same rules of the dice loops in player.py, but on numpy
+arrays of n battles at once, and their win rates compared with CombatOdds.prob_win.
+It also measures how many battles per second every engine resolves.
+
+    python -m src.validation --battles 1000000 --output validation.json
+
+exits with 1 if some win rate is out of its confidence interval """
+
+# Starting armies of the validated battles, for both the attacker and the defender
+ARMIES = (1, 2, 3, 4, 5, 7, 10, 15, 20)
+# Two-sided z-score of the confidence intervals: with 162 cells, a correct table still fails
+# one of them with a probability of about 0.1%
+Z_SCORE = 4.5
+
+
+def simulate_battles(A: int, D: int, n: int, rng, by_sea: bool = False, aggressivity=None):
+    """ End states of n independent battles started from (A, D). On a ground combact the
+    attacker stops when it would throw fewer dice than the defender and, if an aggressivity
+    is given, when its probability to win drops below it """
+    a = numpy.full(n, A)
+    d = numpy.full(n, D)
+    odds = get_combat_odds()
+    kind = BY_SEA if by_sea else GROUND
+    while True:
+        active = (a > 0) & (d > 0)
+        if not by_sea:
+            active &= numpy.minimum(3, a) >= numpy.minimum(3, d)
+        if aggressivity is not None:
+            active[active] &= odds.prob_win_batch(kind, a[active], d[active]) >= aggressivity
+        idx = numpy.nonzero(active)[0]
+        if len(idx) == 0:
+            return a, d
+        atta_dice = numpy.minimum(3, a[idx])
+        defe_dice = numpy.minimum(3, d[idx])
+        # Unused dice are zeros, sorted at the end
+        rolls = rng.integers(1, 7, size=(len(idx), 2, 3))
+        rolls[:, 0][numpy.arange(3) >= atta_dice[:, None]] = 0
+        rolls[:, 1][numpy.arange(3) >= defe_dice[:, None]] = 0
+        rolls = -numpy.sort(-rolls, axis=2)
+        compared = numpy.arange(3) < numpy.minimum(atta_dice, defe_dice)[:, None]
+        defe_losses = ((rolls[:, 0] > rolls[:, 1]) & compared).sum(axis=1)
+        atta_losses = ((rolls[:, 0] <= rolls[:, 1]) & compared).sum(axis=1)
+        a[idx] -= atta_losses
+        d[idx] -= defe_losses
+
+
+def check_accuracy(n: int, rng, armies=ARMIES):
+    # Empirical win rate of every battle compared with its table value
+    odds = get_combat_odds()
+    cells = []
+    for by_sea in (False, True):
+        kind = BY_SEA if by_sea else GROUND
+        for A in armies:
+            for D in armies:
+                _, d = simulate_battles(A, D, n, rng, by_sea=by_sea)
+                wins = float((d == 0).mean())
+                expected = odds.prob_win(kind, A, D)
+                half_width = Z_SCORE * math.sqrt(max(expected * (1 - expected), 1 / n) / n)
+                cells.append({
+                    "kind": kind,
+                    "attacker": A,
+                    "defender": D,
+                    "battles": n,
+                    "win_rate": wins,
+                    "expected": expected,
+                    "half_width": half_width,
+                    "passed": abs(wins - expected) <= half_width
+                })
+    return cells
+
+
+def measure_throughput(n: int, rng, A: int = 12, D: int = 5, aggressivity: float = 0.5):
+    # Battles per second of every engine, on the same ground battle
+    from .model import SPQRisiko
+    throughput = {}
+
+    start = time.perf_counter()
+    simulate_battles(A, D, n, rng, aggressivity=aggressivity)
+    throughput["numpy_dice"] = n / (time.perf_counter() - start)
+
+    outcomes = get_battle_outcomes(aggressivity=aggressivity)
+    draws = rng.random(n)
+    start = time.perf_counter()
+    for u in draws:
+        outcomes.sample(A, D, u)
+    throughput["sampled_end_state"] = n / (time.perf_counter() - start)
+
+    # The engines of player.py, including their bookkeeping on the areas
+    model = SPQRisiko(3, 50, "Aggressive", "LA")
+    attacker, defender = model.ground_areas[0], model.ground_areas[1]
+    battles = min(n, 20000)
+    for fast_combact in (False, True):
+        model.fast_combact = fast_combact
+        start = time.perf_counter()
+        for _ in range(battles):
+            attacker.armies, defender.armies = A + 1, D
+            model.players[0].combact(attacker, defender, A, aggressivity)
+        elapsed = time.perf_counter() - start
+        throughput["player_fast_combact" if fast_combact else "player_combact"] = battles / elapsed
+
+    return throughput
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate the combact engines against the markov tables")
+    parser.add_argument("--battles", type=int, default=100000, help="battles per (A, D) cell")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON report, stdout if missing")
+    args = parser.parse_args(argv)
+
+    rng = numpy.random.default_rng(args.seed)
+    start = time.perf_counter()
+    cells = check_accuracy(args.battles, rng)
+    report = {
+        "seed": args.seed,
+        "battles_per_cell": args.battles,
+        "accuracy": cells,
+        "failures": sum(not cell["passed"] for cell in cells),
+        "max_abs_error": max(abs(cell["win_rate"] - cell["expected"]) for cell in cells),
+        "validation_seconds": time.perf_counter() - start,
+        "battles_per_second": measure_throughput(args.battles, rng)
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    return 1 if report["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())